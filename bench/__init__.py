@@ -0,0 +1,9 @@
+"""
+CPU-only end-to-end benchmark.
+
+    python -m bench --seeds 3
+
+Runs the real ffmpeg stages against deterministic stand-ins for Llama, Flux,
+Whisper, Edge TTS and the YouTube uploader, in a throwaway BASE_DIR, and
+reports wall time, CPU seconds and bytes written per stage.
+"""
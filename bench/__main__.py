@@ -0,0 +1,171 @@
+"""
+python -m bench [--seeds N] [--keep] [--json out.json] [--compare base.json]
+
+Drives N synthetic seeds through every stage with stub model backends and
+real ffmpeg, then prints per-stage wall time, CPU seconds (this process plus
+its ffmpeg children), bytes written and overall videos per hour.
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# ── Fixtures ──────────────────────────────────────────────────────────────────
+def _make_fixtures(base: str, optic_count: int):
+    """Lens-flare overlays, one background song and a fresh schema."""
+    from bench.stubs import _ffmpeg
+    os.makedirs(f"{base}/optic", exist_ok=True)
+    os.makedirs(f"{base}/song/calm", exist_ok=True)
+    _ffmpeg("-f", "lavfi", "-i", "testsrc2=s=270x480:r=30:d=3",
+            "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", f"{base}/optic/1.mp4")
+    for i in range(2, optic_count + 1):
+        shutil.copy(f"{base}/optic/1.mp4", f"{base}/optic/{i}.mp4")
+    _ffmpeg("-f", "lavfi", "-i", "sine=frequency=220:duration=30",
+            "-c:a", "libmp3lame", "-q:a", "4", f"{base}/song/calm/bench.mp3")
+    subprocess.run([sys.executable, os.path.join(_REPO, "create.py")],
+                   check=True, stdout=subprocess.DEVNULL, env=os.environ.copy())
+
+
+def _seed_rss(db_path: str, n: int):
+    from bench.stubs import narration
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO RSS (rssGroup, rssText, rssStamp) VALUES ('bench', ?, datetime('now'))",
+        [(f"Synthetic story {i}. " + " ".join(narration(s) for s in range(1, 7)),) for i in range(n)],
+    )
+    conn.commit()
+    conn.close()
+
+
+# ── Measurement ───────────────────────────────────────────────────────────────
+def _cpu() -> float:
+    s = resource.getrusage(resource.RUSAGE_SELF)
+    c = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return s.ru_utime + s.ru_stime + c.ru_utime + c.ru_stime
+
+
+def _bytes_since(base: str, since: float) -> int:
+    total = 0
+    for sub in ("temp", "final"):
+        for root, _dirs, files in os.walk(os.path.join(base, sub)):
+            for f in files:
+                try:
+                    st = os.stat(os.path.join(root, f))
+                except OSError:
+                    continue
+                if st.st_mtime >= since:
+                    total += st.st_size
+    return total
+
+
+def _measure(base: str, fn) -> dict:
+    since, cpu0, t0 = time.time() - 1e-3, _cpu(), time.perf_counter()
+    fn()
+    return {"wall": time.perf_counter() - t0, "cpu": _cpu() - cpu0,
+            "bytes": _bytes_since(base, since)}
+
+
+# ── Run ───────────────────────────────────────────────────────────────────────
+def _stages():
+    from modules import clean, clip, feed, final, image, mix, subtitle, transition, upload, voice
+
+    def _feed():
+        while True:
+            batch = feed.feed_get_unprocessed_batch(feed.FEED_BATCH)
+            if not batch:
+                return
+            feed.feed_process_batch(batch)
+
+    return [("feed", _feed), ("image", image.run_image), ("voice", voice.run_voice),
+            ("clip", clip.run_clip), ("subtitle", subtitle.run_subtitle),
+            ("transition", transition.run_transition), ("mix", mix.run_mix),
+            ("final", final.run_final), ("upload", upload.run_upload), ("clean", clean.run_clean)]
+
+
+def _report(results: dict, n_done: int, n_seeds: int, baseline: dict | None):
+    total = {k: sum(r[k] for r in results.values()) for k in ("wall", "cpu", "bytes")}
+    base  = (baseline or {}).get("stages", {})
+    print(f"\n  {'Stage':<11} {'wall s':>8} {'CPU s':>8} {'CPU/wall':>8} {'MB written':>11}"
+          + (f" {'Δ wall':>8}" if base else ""))
+    print("  " + "─" * (50 + (9 if base else 0)))
+    for name, r in list(results.items()) + [("total", total)]:
+        ref   = base.get(name, {}).get("wall") if name != "total" else (baseline or {}).get("total", {}).get("wall")
+        delta = f" {(r['wall'] / ref - 1) * 100:>+7.1f}%" if base and ref else (" " * 9 if base else "")
+        ratio = r["cpu"] / r["wall"] if r["wall"] else 0
+        print(f"  {name:<11} {r['wall']:>8.2f} {r['cpu']:>8.2f} {ratio:>8.2f} "
+              f"{r['bytes'] / 1e6:>11.1f}{delta}")
+    vph = n_done / total["wall"] * 3600 if total["wall"] else 0
+    print(f"\n  {n_done}/{n_seeds} videos finished — {vph:.1f} videos/hour "
+          f"({os.cpu_count()} cores)\n")
+    return {"seeds": n_seeds, "done": n_done, "videos_per_hour": vph,
+            "cpu_count": os.cpu_count(), "stages": results, "total": total}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seeds", type=int, default=3, help="synthetic videos to render (default 3)")
+    parser.add_argument("--workdir", help="BASE_DIR to use (default: a fresh temp dir)")
+    parser.add_argument("--keep", action="store_true", help="keep the work dir afterwards")
+    parser.add_argument("--json", metavar="PATH", help="write the results as JSON")
+    parser.add_argument("--compare", metavar="PATH", help="show wall-time deltas against a previous --json")
+    args = parser.parse_args()
+
+    for tool in ("ffmpeg", "ffprobe", "ffmpeg-normalize"):
+        if not shutil.which(tool):
+            sys.exit(f"bench: {tool} not found on PATH")
+
+    base = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="ytbench-"))
+    os.makedirs(base, exist_ok=True)
+    # Everything below reads BASE_DIR at import time
+    os.environ["BASE_DIR"]           = base
+    os.environ["MAX_INFLIGHT_SEEDS"] = "0"
+    os.environ["MAX_SCRATCH_GB"]     = "0"
+    sys.path.insert(0, _REPO)
+    random.seed(0)
+
+    try:
+        from modules.config import OPTIC_COUNT
+        from modules.db import SEED_DONE
+        from pipeline import _migrate_db
+        from bench import stubs
+
+        _make_fixtures(base, OPTIC_COUNT)
+        _migrate_db()
+        _seed_rss(os.path.join(base, "main.db"), args.seeds)
+        stages = _stages()
+        stubs.install()
+
+        print(f"bench: {args.seeds} seeds in {base}")
+        results = {name: _measure(base, fn) for name, fn in stages}
+
+        conn   = sqlite3.connect(os.path.join(base, "main.db"))
+        n_done = conn.execute(f"SELECT COUNT(*) FROM SEED WHERE seedState = {SEED_DONE}").fetchone()[0]
+        conn.close()
+
+        baseline = json.load(open(args.compare)) if args.compare else None
+        summary  = _report(results, n_done, args.seeds, baseline)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(summary, f, indent=2)
+        if n_done < args.seeds:
+            args.keep = True
+            sys.exit(f"bench: only {n_done}/{args.seeds} seeds completed — see {base}/logs/pipeline.log")
+    finally:
+        if not args.keep and not args.workdir:
+            shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Deterministic local stand-ins for every model / network backend.
+
+Each stub produces just enough real media for the downstream ffmpeg stages:
+canned scene JSON, solid-colour PNGs, a sine-tone MP3 per scene and evenly
+spaced fake word timings.
+"""
+
+import asyncio
+import json
+import subprocess
+import sys
+import zlib
+
+_WORDS = ("the quick brown fox jumps over the lazy dog while a narrator "
+          "explains what really happened and why it matters").split()
+
+SECONDS_PER_WORD = 0.35
+
+
+def _ffmpeg(*args):
+    subprocess.run(["ffmpeg", "-y", "-loglevel", "error", *args], check=True)
+
+
+def _duration(path: str) -> float:
+    out = subprocess.check_output(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+         "-of", "default=noprint_wrappers=1:nokey=1", path]
+    )
+    return float(out.decode().strip())
+
+
+def narration(scene: int) -> str:
+    n = 12 + 3 * scene
+    return " ".join(_WORDS[(scene + i) % len(_WORDS)] for i in range(n)).capitalize() + "."
+
+
+# ── Llama ─────────────────────────────────────────────────────────────────────
+class StubLLM:
+    """create_chat_completion() answering whatever schema feed asks for."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def create_chat_completion(self, messages, response_format=None, grammar=None,
+                               stream=False, **_kw):
+        self.calls += 1
+        # install() makes feed pass the schema itself where a compiled grammar would go
+        schema = grammar or (response_format or {}).get("schema") or {}
+        props = schema.get("properties", {})
+        body = {}
+        if "scenes" in props:
+            body["scenes"] = [{"scene": i, "image": f"bench scene {i}, solid colour",
+                               "text": narration(i)} for i in range(1, 7)]
+        if "title" in props:
+            body["title"] = f"Benchmark video {self.calls}"
+        if "description" in props:
+            body["description"] = "Synthetic seed rendered by python -m bench."
+        if "genre" in props:
+            body["genre"] = "calm"
+        if stream:
+            return (c for c in [{"choices": [{"delta": {"content": json.dumps(body)}}]}])
+        return {"choices": [{"message": {"content": json.dumps(body)}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0}}
+
+
+# ── Flux ──────────────────────────────────────────────────────────────────────
+class _SolidImage:
+    def __init__(self, width: int, height: int, rgb: int):
+        self.width, self.height, self.rgb = width, height, rgb
+
+    def save(self, path: str, *_a, **_kw):
+        _ffmpeg("-f", "lavfi", "-i", f"color=c=0x{self.rgb:06x}:s={self.width}x{self.height}",
+                "-frames:v", "1", path)
+
+
+class _Result:
+    def __init__(self, images):
+        self.images = images
+
+
+class StubFlux:
+    """Pipeline call returning one solid-colour image per prompt.
+
+    encode_prompt() "embeds" a prompt as its colour, so the image module's
+    encode-then-denoise path and its embedding cache run unchanged.
+    """
+
+    _execution_device = "cpu"
+
+    def __init__(self):
+        self.calls = 0
+
+    @staticmethod
+    def _rgb(prompt: str) -> int:
+        return zlib.crc32(prompt.encode()) & 0xFFFFFF
+
+    def encode_prompt(self, prompt, prompt_2=None, device=None, **_kw):
+        import torch
+        prompts = prompt if isinstance(prompt, list) else [prompt]
+        rgb = torch.tensor([[self._rgb(p)] for p in prompts])
+        return rgb, rgb, None
+
+    def __call__(self, prompt=None, height=960, width=540, num_images_per_prompt=1,
+                 prompt_embeds=None, **_kw):
+        self.calls += 1
+        if prompt_embeds is not None:
+            colours = [int(v) for v in prompt_embeds[:, 0]]
+        else:
+            colours = [self._rgb(p) for p in (prompt if isinstance(prompt, list) else [prompt])]
+        return _Result([_SolidImage(width, height, c)
+                        for c in colours for _ in range(num_images_per_prompt)])
+
+
+# ── Whisper ───────────────────────────────────────────────────────────────────
+class StubWhisper:
+    """transcribe() spreading placeholder words evenly over the audio."""
+
+    def transcribe(self, path: str, **_kw):
+        dur   = _duration(path)
+        n     = max(1, int(dur / SECONDS_PER_WORD) - 2)
+        step  = dur / (n + 1)
+        words = [{"word": " " + _WORDS[i % len(_WORDS)], "start": (i + 0.5) * step,
+                  "end": (i + 1.4) * step} for i in range(n)]
+        return {"text": " ".join(w["word"] for w in words),
+                "segments": [{"words": words[i:i + 8]} for i in range(0, n, 8)]}
+
+
+# ── Edge TTS ──────────────────────────────────────────────────────────────────
+class _Communicate:
+    def __init__(self, text: str, voice: str = "", **_kw):
+        self.text = text
+
+    async def save(self, path: str):
+        dur = max(2.0, SECONDS_PER_WORD * len(self.text.split()))
+        await asyncio.to_thread(
+            _ffmpeg, "-f", "lavfi", "-i", f"sine=frequency=440:duration={dur:.2f}",
+            "-ac", "1", "-ar", "24000", "-c:a", "libmp3lame", "-q:a", "4", path,
+        )
+
+
+class StubEdgeTTS:
+    Communicate = _Communicate
+
+
+# ── YouTube ───────────────────────────────────────────────────────────────────
+def upload_video_to_youtube(file_path: str, title: str, description: str = "") -> str:
+    return f"bench-{zlib.crc32(file_path.encode()):08x}"
+
+
+def install() -> dict:
+    """Swap the stubs into every already-imported pipeline module."""
+    stubs   = {"llm": StubLLM(), "flux": StubFlux(), "whisper": StubWhisper()}
+    getters = {"_get_llm":        lambda: stubs["llm"],
+               "_get_flux_pipe":  lambda: stubs["flux"],
+               "_get_whisper":    lambda: stubs["whisper"],
+               "_grammar":        lambda schema: schema}
+    for name, mod in list(sys.modules.items()):
+        if mod is None or not (name == "modules" or name.startswith("modules.")):
+            continue
+        for attr, fn in getters.items():
+            if hasattr(mod, attr):
+                setattr(mod, attr, fn)
+        if hasattr(mod, "edge_tts"):
+            mod.edge_tts = StubEdgeTTS
+        if hasattr(mod, "upload_video_to_youtube"):
+            mod.upload_video_to_youtube = upload_video_to_youtube
+    return stubs
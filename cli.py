@@ -5,14 +5,17 @@ AI YouTube Video Generator — interactive CLI manager
 Usage
 -----
   python cli.py              # interactive menu
-  python cli.py add-rss      # add / validate an RSS feed
-  python cli.py check-rss    # validate all saved feeds
+  python cli.py add-rss      # validate an RSS feed and subscribe to it
+  python cli.py check-rss    # list subscriptions and stored RSS groups
   python cli.py add-json     # import entries from a JSON file
   python cli.py add-text     # manually type text → queue it
   python cli.py queue        # show pipeline queue status
   python cli.py run          # run the full pipeline now
   python cli.py run --output file   # run but skip YouTube upload
   python cli.py stop         # kill a running pipeline (remove lock)
+  python cli.py profile [id] # latency per stage / sub-step, critical path for one video
+
+run / stop / queue talk to a resident `pipeline.py --daemon` when one is up.
 """
 
 import argparse
@@ -25,6 +28,10 @@ import sys
 import textwrap
 from datetime import datetime
 
+from modules.admission import admission_state
+from modules.control   import send_command
+from modules.db        import FEED_EXTRACTORS, add_feed, ensure_feed_table, insert_rss, lease_holders
+
 # ── Bootstrap: load .env so BASE_DIR / DB_PATH are resolved ──────────────────
 try:
     from dotenv import load_dotenv
@@ -69,15 +76,17 @@ def _db():
     return conn
 
 
-def _insert_rss(group: str, text: str, stamp: str = None) -> int:
-    """Insert one entry into the RSS table and return its rssId."""
+def _insert_rss(group: str, text: str, stamp: str = None, link: str = None) -> int | None:
+    """Insert one entry into the RSS table and return its rssId.
+
+    Returns None when the same *link*, or the same or a near-identical text,
+    was already ingested.
+    """
     stamp = stamp or datetime.utcnow().isoformat(sep=" ", timespec="seconds")
     conn = _db()
-    cur  = conn.execute(
-        "INSERT INTO RSS (rssGroup, rssText, rssStamp) VALUES (?,?,?)",
-        (group, text, stamp),
-    )
-    rss_id = cur.lastrowid
+    rss_id, dup = insert_rss(conn, group, text, stamp, link)
+    if dup is not None:
+        print(yellow(f"  ⚠ Skipped — duplicate of RSS entry #{dup}"))
     conn.commit()
     conn.close()
     return rss_id
@@ -107,12 +116,18 @@ def _lock_pid() -> int | None:
         return None
 
 
+def _daemon(cmd: str = "status", **params) -> dict | None:
+    """Send *cmd* to a resident `pipeline.py --daemon`; None if none is listening."""
+    reply = send_command(BASE_DIR, cmd, **params)
+    return reply if reply and reply.get("ok") else None
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # RSS validation
 # ─────────────────────────────────────────────────────────────────────────────
 
 def _validate_rss_url(url: str) -> tuple[bool, str]:
-    """Return (ok, message). Requires feedparser."""
+    """Return (ok, message) after fetching *url* once. Requires feedparser."""
     try:
         import feedparser
     except ImportError:
@@ -165,7 +180,7 @@ def _pick(msg: str, options: list[str], default: str = "") -> str:
 # ── add-rss ──────────────────────────────────────────────────────────────────
 
 def cmd_add_rss(_args=None):
-    """Add and validate an RSS feed URL, then save it for the next pipeline run."""
+    """Validate an RSS feed URL and subscribe to it; the pipeline polls it from then on."""
     print(bold("\n── Add RSS Feed ──────────────────────────────────────"))
     url   = _prompt("RSS feed URL")
     if not url:
@@ -181,39 +196,44 @@ def cmd_add_rss(_args=None):
         if _prompt("Add anyway? (yes/no)", "no").lower() not in ("y", "yes"):
             return
 
-    group = _prompt("Group / source name", url.split("/")[2].replace("www.", ""))
-    # Fetch and store the raw feed text so the pipeline can process it
-    try:
-        import feedparser
-        feed = feedparser.parse(url)
-        saved = 0
-        for entry in feed.entries:
-            summary = entry.get("summary") or entry.get("description") or ""
-            title   = entry.get("title", "")
-            text    = f"{title}\n\n{summary}".strip()
-            if text:
-                _insert_rss(group, text, entry.get("published", ""))
-                saved += 1
-        print(green(f"  ✔ Saved {saved} entries from feed (group='{group}')"))
-    except ImportError:
-        # feedparser not available — save the URL itself as a reference
-        _insert_rss(group, url)
-        print(yellow("  ⚠ feedparser not installed; saved URL as-is."))
-    except Exception as e:
-        print(red(f"  Error fetching feed: {e}"))
+    group     = _prompt("Group / source name", url.split("/")[2].replace("www.", ""))
+    extractor = _pick("Article text from:", list(FEED_EXTRACTORS), "summary")
+    conn = _db()
+    ensure_feed_table(conn)
+    feed_id = add_feed(conn, url, group, extractor)
+    conn.commit()
+    conn.close()
+    print(green(f"  ✔ Subscribed as feed #{feed_id} (group='{group}', extractor='{extractor}')"))
+    print(dim("  New entries are picked up on the next pipeline run."))
 
 
 # ── check-rss ────────────────────────────────────────────────────────────────
 
 def cmd_check_rss(_args=None):
-    """Validate all RSS groups stored in the database."""
+    """Show feed subscriptions and the RSS groups stored in the database."""
     print(bold("\n── Check RSS Feeds ───────────────────────────────────"))
     conn = _db()
+    ensure_feed_table(conn)
+    conn.commit()
+    feeds = conn.execute(
+        "SELECT feedGroup, feedUrl, feedExtractor, feedInterval, feedNextPoll, feedLastPoll, "
+        "feedEnabled FROM FEED ORDER BY feedGroup"
+    ).fetchall()
     rows = conn.execute(
         "SELECT rssGroup, COUNT(*) as n, MAX(rssStamp) as latest FROM RSS GROUP BY rssGroup ORDER BY rssGroup"
     ).fetchall()
     conn.close()
 
+    print(f"  {'Feed':<16} {'Every':>7}  {'Last poll':<17}  {'Next poll':<17}  URL")
+    print("  " + "─" * 90)
+    for f in feeds:
+        last = datetime.fromtimestamp(f["feedLastPoll"]).strftime("%Y-%m-%d %H:%M") if f["feedLastPoll"] else "—"
+        nxt  = (datetime.fromtimestamp(f["feedNextPoll"]).strftime("%Y-%m-%d %H:%M")
+                if f["feedEnabled"] else "disabled")
+        print(f"  {f['feedGroup']:<16} {f['feedInterval'] / 60:>6.0f}m  {last:<17}  {nxt:<17}  "
+              f"{f['feedUrl']} [{f['feedExtractor']}]")
+    print()
+
     if not rows:
         print(yellow("  No RSS entries in database yet."))
         return
@@ -271,10 +291,10 @@ def cmd_add_json(_args=None):
             continue
         title = entry.get("title", "").strip()
         full  = f"{title}\n\n{text}".strip() if title else text
-        _insert_rss(group, full)
-        saved += 1
+        if _insert_rss(group, full):
+            saved += 1
 
-    print(green(f"  ✔ Imported {saved} entries (group='{group}')"))
+    print(green(f"  ✔ Imported {saved} new entries (group='{group}')"))
     print(dim(f"  Run  make run  or  python cli.py run  to process them."))
 
 
@@ -306,7 +326,8 @@ def cmd_add_text(_args=None):
     full  = f"{title}\n\n{text}".strip() if title else text
     group = _prompt("Group label", "manual")
     rss_id = _insert_rss(group, full)
-    print(green(f"  ✔ Queued as RSS entry #{rss_id} (group='{group}')"))
+    if rss_id:
+        print(green(f"  ✔ Queued as RSS entry #{rss_id} (group='{group}')"))
     print(dim(f"  Run  make run  or  python cli.py run  to process it."))
 
 
@@ -342,14 +363,42 @@ def cmd_queue(_args=None):
            LIMIT 20"""
     ).fetchall()
 
+    try:
+        workers = lease_holders(conn)
+    except sqlite3.OperationalError:   # DB predates leases
+        workers = {}
+    try:
+        adm = admission_state(conn, BASE_DIR, fresh=True)
+    except sqlite3.OperationalError:   # DB predates seedState
+        adm = None
     conn.close()
 
     # Lock status
-    if _pipeline_running():
+    daemon = _daemon("status")
+    if daemon:
+        activity = "busy" if daemon["busy"] else "waiting for work"
+        print(yellow(f"  ● Daemon is running (PID {daemon['pid']}) — {activity}, "
+                     f"{daemon['passes']} passes, last {daemon['last_pass'] or '—'}"))
+        models = daemon.get("models") or {}
+        if models:
+            print(dim("    models loaded: " + ", ".join(f"{m} (idle {int(t)}s)" for m, t in models.items())))
+    elif _pipeline_running():
         pid = _lock_pid()
         print(yellow(f"  ● Pipeline is running (PID {pid})"))
     else:
         print(dim("  ○ Pipeline is idle"))
+    if workers:
+        print(dim("    workers holding leases: " + ", ".join(f"{w} ({n})" for w, n in sorted(workers.items()))))
+    if adm:
+        gb    = 1024 ** 3
+        seeds = f"{adm['inflight']}/{adm['max_inflight'] or '∞'} seeds in flight"
+        disk  = (f"scratch {adm['scratch_bytes'] / gb:.1f}/"
+                 f"{adm['max_scratch_bytes'] / gb:.1f} GB" if adm["max_scratch_bytes"]
+                 else f"scratch {adm['scratch_bytes'] / gb:.1f} GB")
+        if adm["admit"]:
+            print(dim(f"    admission open — {seeds}, {disk}"))
+        else:
+            print(red(f"    admission paused — {seeds}, {disk}; no new seeds until clean frees space"))
 
     print()
     if rss_pending:
@@ -409,6 +458,12 @@ def cmd_run(args=None):
     output = getattr(args, "output", "api") if args else "api"
     print(bold(f"\n── Run Pipeline (output={output}) ────────────────────"))
 
+    daemon = _daemon("run", output=output)
+    if daemon:
+        state = "after the current pass" if daemon["busy"] else "now"
+        print(green(f"  ✔ Run requested from daemon (PID {daemon['pid']}) — starts {state}."))
+        return
+
     if _pipeline_running():
         pid = _lock_pid()
         print(yellow(f"  ⚠ Pipeline already running (PID {pid})."))
@@ -456,11 +511,189 @@ def cmd_retry(args=None):
     print(green(f"  ✔ Error cleared — seed {seed_id} will be retried on next pipeline run."))
 
 
+# ── profile ──────────────────────────────────────────────────────────────────
+
+_STAGE_ORDER = ["feed", "image", "voice", "clip", "subtitle",
+                "transition", "mix", "final", "upload", "clean"]
+
+
+def _fmt_ms(ms: float) -> str:
+    if ms < 1000:
+        return f"{ms:.0f}ms"
+    if ms < 60_000:
+        return f"{ms / 1000:.1f}s"
+    return f"{int(ms // 60_000)}m{int(ms % 60_000 / 1000):02d}s"
+
+
+def _pct(values: list, p: float) -> float:
+    """Nearest-rank percentile of *values* (p in 0–100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(p / 100 * len(ordered) + 0.5) - 1))]
+
+
+def _stage_key(stage: str) -> int:
+    return _STAGE_ORDER.index(stage) if stage in _STAGE_ORDER else len(_STAGE_ORDER)
+
+
+def _profile_recent(conn, last: int):
+    seeds = [r[0] for r in conn.execute(
+        "SELECT seedId FROM SPAN WHERE seedId IS NOT NULL "
+        "GROUP BY seedId ORDER BY MAX(endTs) DESC LIMIT ?", (last,)
+    ).fetchall()]
+    if not seeds:
+        print(yellow("  No spans recorded yet — run the pipeline first."))
+        return
+    marks = ",".join("?" * len(seeds))
+    rows = conn.execute(
+        f"""SELECT seedId, stage, name, parentId IS NULL AS root, SUM(durMs) AS ms, COUNT(*) AS n
+            FROM SPAN WHERE seedId IN ({marks}) AND stage IS NOT NULL
+            GROUP BY seedId, stage, name, root""",
+        seeds,
+    ).fetchall()
+
+    stages, steps = {}, {}
+    for r in rows:
+        if r["root"]:
+            stages.setdefault(r["stage"], []).append(r["ms"])
+        else:
+            steps.setdefault((r["stage"], r["name"]), []).append((r["ms"], r["n"]))
+
+    # Peak memory is process-wide: stages that overlapped another (--pipelined) leave it out
+    try:
+        peaks = {r[0]: (r[1], r[2]) for r in conn.execute(
+            f"""SELECT stage, MAX(json_extract(detail, '$.rss_mb')), MAX(json_extract(detail, '$.cuda_mb'))
+                FROM SPAN WHERE seedId IN ({marks}) AND parentId IS NULL AND stage IS NOT NULL
+                GROUP BY stage""",
+            seeds,
+        )}
+    except sqlite3.OperationalError:   # SQLite built without JSON functions
+        peaks = {}
+
+    def _mb(v):
+        return f"{v / 1024:.1f} GB" if v else "—"
+
+    print(f"  Last {len(seeds)} seeds: {dim(', '.join(map(str, seeds)))}\n")
+    print(f"  {bold('Per stage')} (wall time per seed, peak memory)")
+    print(f"  {'Stage':<12} {'seeds':>5}  {'p50':>8}  {'p95':>8}  {'mean':>8}  {'RSS':>8}  {'CUDA':>8}")
+    print("  " + "─" * 68)
+    for stage in sorted(stages, key=_stage_key):
+        v = stages[stage]
+        rss, cuda = peaks.get(stage, (None, None))
+        print(f"  {stage:<12} {len(v):>5}  {_fmt_ms(_pct(v, 50)):>8}  "
+              f"{_fmt_ms(_pct(v, 95)):>8}  {_fmt_ms(sum(v) / len(v)):>8}  {_mb(rss):>8}  {_mb(cuda):>8}")
+
+    print(f"\n  {bold('Per sub-step')} (total per seed)")
+    print(f"  {'Stage':<12} {'Step':<18} {'calls':>6}  {'p50':>8}  {'p95':>8}")
+    print("  " + "─" * 60)
+    for (stage, name) in sorted(steps, key=lambda k: (_stage_key(k[0]), k[1])):
+        v = steps[(stage, name)]
+        ms = [x[0] for x in v]
+        calls = sum(x[1] for x in v) / len(v)
+        print(f"  {stage:<12} {name:<18} {calls:>6.1f}  {_fmt_ms(_pct(ms, 50)):>8}  {_fmt_ms(_pct(ms, 95)):>8}")
+    print()
+
+
+def _profile_seed(conn, seed_id: int):
+    rows = conn.execute(
+        "SELECT stage, name, parentId IS NULL AS root, startTs, endTs, durMs, ok "
+        "FROM SPAN WHERE seedId=? ORDER BY startTs", (seed_id,)
+    ).fetchall()
+    if not rows:
+        print(yellow(f"  No spans recorded for seed {seed_id}."))
+        return
+
+    stages, steps = {}, {}
+    for r in rows:
+        if r["root"]:
+            st = stages.setdefault(r["stage"], {"start": r["startTs"], "end": r["endTs"],
+                                                "busy": 0.0, "units": 0, "failed": 0})
+            st["start"] = min(st["start"], r["startTs"])
+            st["end"]   = max(st["end"], r["endTs"])
+            st["busy"] += r["durMs"]
+            st["units"] += 1
+            st["failed"] += 0 if r["ok"] else 1
+        else:
+            sp = steps.setdefault((r["stage"], r["name"]), {"n": 0, "ms": 0.0, "max": 0.0})
+            sp["n"] += 1
+            sp["ms"] += r["durMs"]
+            sp["max"] = max(sp["max"], r["durMs"])
+
+    order = sorted(stages, key=lambda s: stages[s]["start"])
+    t0    = stages[order[0]]["start"]
+    wall  = (max(s["end"] for s in stages.values()) - t0) * 1000
+
+    print(f"  {bold('Seed')} {seed_id}   wall {_fmt_ms(wall)}\n")
+    print(f"  {'Stage':<12} {'units':>5}  {'busy':>8}  {'Step':<18} {'calls':>5}  {'total':>8}  {'max':>8}")
+    print("  " + "─" * 78)
+    for stage in order:
+        st = stages[stage]
+        fail = red(f"  ({st['failed']} failed)") if st["failed"] else ""
+        print(f"  {bold(f'{stage:<12}')} {st['units']:>5}  {_fmt_ms(st['busy']):>8}{fail}")
+        for (s, name), sp in sorted(steps.items(), key=lambda kv: -kv[1]["ms"]):
+            if s == stage:
+                print(f"  {'':<12} {'':>5}  {'':>8}  {name:<18} {sp['n']:>5}  "
+                      f"{_fmt_ms(sp['ms']):>8}  {_fmt_ms(sp['max']):>8}")
+
+    # Stages run one after another for a given seed, so the critical path is
+    # the stage chain plus the queueing gaps between them.
+    print(f"\n  {bold('Critical path')}")
+    print(f"  {'Stage':<12} {'starts at':>9}  {'waited':>8}  {'ran':>8}  {'share':>6}  timeline")
+    print("  " + "─" * 78)
+    prev_end, waited, width = t0, 0.0, 30
+    for stage in order:
+        st    = stages[stage]
+        wait  = max(0.0, st["start"] - prev_end) * 1000
+        ran   = (st["end"] - st["start"]) * 1000
+        waited += wait
+        lo    = int((st["start"] - t0) * 1000 / wall * width) if wall else 0
+        hi    = max(lo + 1, int((st["end"] - t0) * 1000 / wall * width)) if wall else 1
+        bar   = " " * lo + "█" * (hi - lo)
+        print(f"  {stage:<12} {_fmt_ms((st['start'] - t0) * 1000):>9}  {_fmt_ms(wait):>8}  "
+              f"{_fmt_ms(ran):>8}  {ran / wall * 100 if wall else 0:>5.1f}%  {cyan(bar)}")
+        prev_end = max(prev_end, st["end"])
+    print(f"\n  queued {_fmt_ms(waited)}  ·  running {_fmt_ms(wall - waited)}  ·  wall {_fmt_ms(wall)}\n")
+
+
+def cmd_profile(args=None):
+    """Show where pipeline time goes, per stage and per sub-step."""
+    print(bold("\n── Profile ───────────────────────────────────────────"))
+    seed_id = getattr(args, "seed_id", None) if args else None
+    last    = getattr(args, "last", 20) if args else 20
+    conn = _db()
+    try:
+        if seed_id is not None:
+            if not str(seed_id).isdigit():
+                print(red("  Invalid seed ID."))
+                return
+            _profile_seed(conn, int(seed_id))
+        else:
+            _profile_recent(conn, last)
+    except sqlite3.OperationalError:
+        print(yellow("  No SPAN table yet — run the pipeline once to create it."))
+    finally:
+        conn.close()
+
+
 # ── stop ─────────────────────────────────────────────────────────────────────
 
 def cmd_stop(_args=None):
     """Stop a running pipeline process."""
     print(bold("\n── Stop Pipeline ─────────────────────────────────────"))
+    daemon = _daemon("status")
+    if daemon:
+        print(yellow(f"  Daemon is running with PID {daemon['pid']}."))
+        choice = _prompt("Ask it to shut down? (yes/no)", "no")
+        if choice.lower() not in ("y", "yes"):
+            print("  Aborted.")
+            return
+        if _daemon("stop"):
+            print(green("  ✔ Shutdown requested — the daemon exits after its current pass."))
+        else:
+            print(red("  Daemon did not answer."))
+        return
+
     if not _pipeline_running():
         print(dim("  Pipeline is not running."))
         if os.path.exists(LOCK_FILE):
@@ -499,6 +732,7 @@ MENU = [
     ("4", "Enter text manually",   cmd_add_text),
     ("5", "Show queue",            cmd_queue),
     ("6", "Retry failed video",    cmd_retry),
+    ("p", "Profile recent videos", cmd_profile),
     ("7", "Run pipeline (api)",    lambda _: cmd_run(type("A", (), {"output": "api"})())),
     ("8", "Run pipeline (file)",   lambda _: cmd_run(type("A", (), {"output": "file"})())),
     ("9", "Stop running pipeline", cmd_stop),
@@ -554,17 +788,22 @@ def main():
               python cli.py run              # run full pipeline (uploads to YouTube)
               python cli.py run --output file  # run pipeline, save .mp4 locally only
               python cli.py stop             # stop a running pipeline
+              python cli.py profile 42       # where did seed 42's time go?
         """),
     )
     sub = parser.add_subparsers(dest="command", metavar="COMMAND")
 
-    sub.add_parser("add-rss",    help="Add and validate an RSS feed URL")
-    sub.add_parser("check-rss",  help="Validate all saved RSS groups")
+    sub.add_parser("add-rss",    help="Validate an RSS feed URL and subscribe to it")
+    sub.add_parser("check-rss",  help="List feed subscriptions and stored RSS groups")
     sub.add_parser("add-json",   help="Import entries from a JSON file")
     sub.add_parser("add-text",   help="Manually enter text to queue a video")
     sub.add_parser("queue",      help="Show pipeline queue and status")
     sub.add_parser("stop",       help="Stop a running pipeline process")
 
+    profile_p = sub.add_parser("profile", help="Per-stage latency breakdown (recent seeds or one seed)")
+    profile_p.add_argument("seed_id", nargs="?", help="Seed ID for a single-video breakdown + critical path")
+    profile_p.add_argument("--last", type=int, default=20, help="Number of recent seeds for p50/p95 (default 20)")
+
     retry_p = sub.add_parser("retry", help="Clear error state on a failed video so it is retried")
     retry_p.add_argument("seed_id", nargs="?", help="Seed ID to retry (prompted if omitted)")
 
@@ -589,6 +828,7 @@ def main():
         "queue":     cmd_queue,
         "run":       cmd_run,
         "retry":     cmd_retry,
+        "profile":   cmd_profile,
         "stop":      cmd_stop,
     }
 
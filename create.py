@@ -19,7 +19,7 @@ try:
     cursor_obj = connection_obj.cursor()
 
     # Drop existing tables if they exist
-    tables = ["RSS", "TASK", "SCENE", "SEED"]
+    tables = ["RSS", "TASK", "SCENE", "SEED", "FEED", "STAGE_COUNT", "SPAN"]
     for table in tables:
         cursor_obj.execute(f"DROP TABLE IF EXISTS {table}")
 
@@ -30,7 +30,13 @@ try:
             rssId INTEGER PRIMARY KEY AUTOINCREMENT,
             rssGroup TEXT NOT NULL,
             rssText TEXT NOT NULL,
-            rssStamp TIMESTAMP
+            rssStamp TIMESTAMP,
+            rssLink TEXT,
+            rssHash TEXT,
+            rssSimhash INTEGER,
+            rssDigest TEXT,
+            leaseOwner TEXT,
+            leaseExpiry REAL
         )
     """
     )
@@ -45,7 +51,10 @@ try:
             sceneImageDate TIMESTAMP,
             sceneAudioDate TIMESTAMP,
             sceneClipDate TIMESTAMP,
-            sceneSubtitleDate TIMESTAMP
+            sceneSubtitleDate TIMESTAMP,
+            taskState INTEGER NOT NULL DEFAULT 0,
+            leaseOwner TEXT,
+            leaseExpiry REAL
         )
     """
     )
@@ -80,11 +89,17 @@ try:
             seedRenderStamp TIMESTAMP,
             seedUploadStamp TIMESTAMP,
             seedErrorStep TEXT DEFAULT NULL,
-            seedErrorMsg  TEXT DEFAULT NULL
+            seedErrorMsg  TEXT DEFAULT NULL,
+            seedState INTEGER NOT NULL DEFAULT 0,
+            leaseOwner TEXT,
+            leaseExpiry REAL
         )
     """
     )
 
+    # Fresh tables: let pipeline.py's _migrate_db add counters, triggers, indexes
+    cursor_obj.execute("PRAGMA user_version = 0")
+
     # Commit the changes
     connection_obj.commit()
     print("All tables created successfully")
@@ -0,0 +1,99 @@
+"""
+Admission control for new seeds.
+
+Every seed between feed and final owns scratch files under temp/ until
+`run_clean` removes them after upload.  Feed only starts a new seed while
+both the number of seeds in flight and the bytes under temp/ are inside
+their budgets, so a stalled upload cannot fill the scratch disk.
+
+Stdlib only — read by pipeline.py on every tick and by cli.py.
+"""
+
+import os
+import sqlite3
+import time
+
+from .db import SEED_UPLOAD
+
+_GB = 1024 ** 3
+
+# Walking temp/ is cheap but not free; the scheduler asks every poll
+_SCRATCH_TTL = 10.0
+_scratch_cache = {}
+
+
+def budget() -> tuple[int, int]:
+    """(max seeds in flight, max scratch bytes); 0 disables a limit.
+
+    Read at call time so cli.py sees values from .env loaded after import.
+    """
+    seeds = int(os.getenv("MAX_INFLIGHT_SEEDS", "4"))
+    gb    = float(os.getenv("MAX_SCRATCH_GB", "20"))
+    return seeds, int(gb * _GB)
+
+
+def scratch_bytes(base_dir: str, fresh: bool = False) -> int:
+    """Total size of everything under BASE_DIR/temp (cached briefly)."""
+    root = os.path.join(base_dir, "temp")
+    hit  = _scratch_cache.get(root)
+    if hit and not fresh and time.monotonic() - hit[0] < _SCRATCH_TTL:
+        return hit[1]
+    total, stack = 0, [root]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for e in it:
+                    try:
+                        if e.is_dir(follow_symlinks=False):
+                            stack.append(e.path)
+                        elif e.is_file(follow_symlinks=False):
+                            total += e.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        pass   # removed by a concurrent clean
+        except OSError:
+            pass
+    _scratch_cache[root] = (time.monotonic(), total)
+    return total
+
+
+def inflight_seeds(conn: sqlite3.Connection) -> int:
+    """Seeds created by feed that have not been rendered to final/ yet."""
+    return conn.execute(
+        f"SELECT COUNT(*) FROM SEED WHERE seedState < {SEED_UPLOAD}"
+    ).fetchone()[0]
+
+
+def admission_state(conn: sqlite3.Connection, base_dir: str, fresh: bool = False) -> dict:
+    """Return the current budget usage and whether feed may start a seed."""
+    max_seeds, max_bytes = budget()
+    seeds = inflight_seeds(conn)
+    used  = scratch_bytes(base_dir, fresh)
+    reason = None
+    if max_seeds and seeds >= max_seeds:
+        reason = f"{seeds}/{max_seeds} seeds in flight"
+    elif max_bytes and used >= max_bytes:
+        reason = f"scratch {used / _GB:.1f}/{max_bytes / _GB:.1f} GB"
+    slots = 0 if reason else (max_seeds - seeds if max_seeds else None)
+    return {"admit": reason is None, "reason": reason, "slots": slots,
+            "inflight": seeds, "max_inflight": max_seeds,
+            "scratch_bytes": used, "max_scratch_bytes": max_bytes}
+
+
+def may_admit(db_path: str, base_dir: str) -> tuple[bool, str | None]:
+    """Convenience wrapper: (admit, reason) from a short-lived connection."""
+    conn = sqlite3.connect(db_path)
+    try:
+        st = admission_state(conn, base_dir)
+    finally:
+        conn.close()
+    return st["admit"], st["reason"]
+
+
+def admission_slots(db_path: str, base_dir: str) -> tuple[int | None, str | None]:
+    """(seeds feed may start now, reason when that is 0); None means no seed limit."""
+    conn = sqlite3.connect(db_path)
+    try:
+        st = admission_state(conn, base_dir)
+    finally:
+        conn.close()
+    return st["slots"], st["reason"]
@@ -0,0 +1,121 @@
+"""
+Size-bounded on-disk LRU caches for expensive, repeatable results.
+
+Entries are files named by a SHA-256 of everything that determines the
+result, so a key never has to be invalidated: change an input and it is a
+different key.  A hit touches the file's mtime; once the directory grows
+past its budget the least recently used files are removed.
+
+Stdlib only.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+
+def cache_key(*parts) -> str:
+    """Stable hex digest of *parts* (any JSON-serialisable values)."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(json.dumps(part, sort_keys=True, default=str).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class DiskLRU:
+    """Bytes stored under *root*, evicted least-recently-used past *max_bytes*.
+
+    Counts hits and misses for the log.  Safe to share between threads;
+    several processes may share *root* — each rescans it before evicting.
+    """
+
+    def __init__(self, root: str, max_bytes: int, name: str = "cache"):
+        self.root      = root
+        self.max_bytes = max_bytes
+        self.name      = name
+        self.hits      = 0
+        self.misses    = 0
+        self._lock     = threading.Lock()
+        self._size     = None    # bytes under root, learned on the first put
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key: str) -> bytes | None:
+        p = self.path(key)
+        try:
+            with open(p, "rb") as f:
+                data = f.read()
+        except OSError:
+            self.misses += 1
+            return None
+        try:
+            os.utime(p)
+        except OSError:
+            pass
+        self.hits += 1
+        return data
+
+    def get_path(self, key: str) -> str | None:
+        """Like get() for callers that link or copy the file: its path, or None."""
+        p = self.path(key)
+        try:
+            os.utime(p)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return p
+
+    def put(self, key: str, data: bytes):
+        p = self.path(key)
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+        try:
+            old = os.path.getsize(p)
+        except OSError:
+            old = 0
+        tmp = f"{p}.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, p)
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += len(data) - old
+            if self.max_bytes and self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self) -> list[tuple[float, int, str]]:
+        out = []
+        for dirpath, _dirs, files in os.walk(self.root):
+            for name in files:
+                p = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                out.append((st.st_mtime, st.st_size, p))
+        return out
+
+    def _evict(self):
+        """Drop the oldest entries until the cache is back under 90 % of its budget."""
+        entries = sorted(self._entries())
+        total   = sum(size for _, size, _ in entries)
+        target  = self.max_bytes * 0.9
+        for _mtime, size, p in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(p)
+                total -= size
+            except OSError:
+                pass
+        self._size = total
+
+    def stats(self) -> str:
+        looked = self.hits + self.misses
+        rate = f" ({self.hits / looked:.0%})" if looked else ""
+        return f"{self.hits} hit(s), {self.misses} miss(es){rate}"
@@ -1,46 +1,70 @@
 from .config import *
+from .db import SEED_CLEAN, SEED_DONE, advance_seed, seed_ids_in_state
+from .lease import leased
+from .trace import traced
+
+
+def clean_pending_seeds() -> list[int]:
+    """Seeds that have been uploaded and still own temp files."""
+    conn = sqlite3.connect(DB_PATH)
+    seeds = seed_ids_in_state(conn, SEED_CLEAN)
+    conn.close()
+    return seeds
+
+
+@leased("SEED", SEED_CLEAN)
+@traced("clean")
+def clean_seed(seed_id: int) -> int:
+    """Delete the temp files of one seed and its tasks; return items removed."""
+    conn = sqlite3.connect(DB_PATH)
+    task_ids = [r[0] for r in conn.execute(
+        "SELECT taskId FROM TASK WHERE seedId=?", (seed_id,)
+    ).fetchall()]
+    conn.close()
+
+    paths = [
+        f"{BASE_DIR}/temp/audio/{seed_id}.wav",
+        f"{BASE_DIR}/temp/video/{seed_id}.mp4",
+        f"{BASE_DIR}/temp/mix/{seed_id}.wav",
+        f"{BASE_DIR}/temp/mix/{seed_id}",
+        f"{BASE_DIR}/temp/image/{seed_id}",
+    ]
+    for task_id in task_ids:
+        paths += [
+            f"{BASE_DIR}/temp/clip/{task_id}",
+            f"{BASE_DIR}/temp/image/{task_id}",
+            f"{BASE_DIR}/temp/subtitle/{task_id}",
+            f"{BASE_DIR}/temp/audio/{task_id}",
+            f"{BASE_DIR}/temp/voice/{task_id}",
+        ]
+
+    deleted = 0
+    for p in paths:
+        try:
+            if os.path.isfile(p):
+                os.remove(p); deleted += 1
+            elif os.path.isdir(p):
+                shutil.rmtree(p); deleted += 1
+        except Exception as e:
+            log.warning(f"[clean] Could not remove {p}: {e}")
+
+    conn = sqlite3.connect(DB_PATH)
+    advance_seed(conn, seed_id, SEED_DONE)
+    conn.commit()
+    conn.close()
+    return deleted
 
 
 def run_clean():
     """Delete temporary files for all uploaded seeds."""
     log.info("═══ MODULE: CLEAN ═══")
-    conn = sqlite3.connect(DB_PATH)
-    rows = conn.execute(
-        """SELECT s.seedId, t.taskId FROM SEED s
-           LEFT JOIN TASK t ON s.seedId = t.seedId
-           WHERE s.seedUploadStamp != '0000-00-00 00:00:00'"""
-    ).fetchall()
-    conn.close()
+    seeds = clean_pending_seeds()
 
-    if not rows:
+    if not seeds:
         log.info("[clean] Nothing to clean")
         return
 
-    deleted = 0
-    for seed_id, task_id in rows:
-        paths = [
-            f"{BASE_DIR}/temp/audio/{seed_id}.wav",
-            f"{BASE_DIR}/temp/video/{seed_id}.mp4",
-            f"{BASE_DIR}/temp/mix/{seed_id}.wav",
-            f"{BASE_DIR}/temp/mix/{seed_id}",
-            f"{BASE_DIR}/temp/image/{seed_id}",
-        ]
-        if task_id is not None:
-            paths += [
-                f"{BASE_DIR}/temp/clip/{task_id}",
-                f"{BASE_DIR}/temp/image/{task_id}",
-                f"{BASE_DIR}/temp/subtitle/{task_id}",
-                f"{BASE_DIR}/temp/audio/{task_id}",
-                f"{BASE_DIR}/temp/voice/{task_id}",
-            ]
-        for p in paths:
-            try:
-                if os.path.isfile(p):
-                    os.remove(p); deleted += 1
-                elif os.path.isdir(p):
-                    shutil.rmtree(p); deleted += 1
-            except Exception as e:
-                log.warning(f"[clean] Could not remove {p}: {e}")
+    deleted = sum(clean_seed(seed_id) or 0 for seed_id in seeds)
 
     # Purge transition scratch space
     temp_temp = f"{BASE_DIR}/temp/temp/"
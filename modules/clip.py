@@ -1,4 +1,10 @@
 from .config import *
+from .db import TASK_CLIP, TASK_SUBTITLE, advance_task, task_ids_in_state
+from .lease import lease
+from .trace import check_output_cmd, run_cmd, span, traced
+
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 
 def _ffprobe_duration(path: str) -> float:
@@ -8,29 +14,34 @@ def _ffprobe_duration(path: str) -> float:
         "-of", "default=noprint_wrappers=1:nokey=1",
         path,
     ]
-    return float(subprocess.check_output(cmd).decode().strip())
+    return float(check_output_cmd(cmd).decode().strip())
 
 
-def clip_make_for_seed(seed_id: int):
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.execute("PRAGMA journal_mode = WAL")
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT taskId, sceneNumber FROM task WHERE sceneClipDate='0000-00-00 00:00:00' AND seedId=?",
-        (seed_id,),
-    )
-    tasks = cursor.fetchall()
-
-    for task_id, scene_number in tasks:
-        cursor.execute(
-            "SELECT sceneId FROM scene WHERE seedId=? AND sceneNumber=?",
-            (seed_id, scene_number),
-        )
-        row = cursor.fetchone()
-        if not row:
-            continue
-        scene_id = row[0]
+# ──────────────────────────────────────────────────────────────────────────────
+# PARALLEL RENDERING
+# One shared pool renders CLIP_WORKERS scenes at a time no matter how many
+# seeds are asking, so the scheduler's per-seed jobs never oversubscribe the
+# CPU.  Workers only run ffprobe/ffmpeg; the calling thread owns the SQLite
+# connection and advances each task as its clip lands.  Each job runs in a copy
+# of the caller's context, so its span nests under the caller's stage span.
+# ──────────────────────────────────────────────────────────────────────────────
+_pool      = None
+_pool_lock = threading.Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            log.info(f"[clip] Rendering {CLIP_WORKERS} clips at a time "
+                     f"({CLIP_FFMPEG_THREADS} ffmpeg threads each)")
+            _pool = ThreadPoolExecutor(max_workers=CLIP_WORKERS, thread_name_prefix="clip")
+        return _pool
 
+
+def _render_clip(seed_id: int, task_id: int, scene_id: int) -> str:
+    """Render one scene clip; runs on a pool thread and never touches the DB."""
+    with span("clip.render", seed_id=seed_id, task_id=task_id):
         voice_dir = f"{BASE_DIR}/temp/voice/{scene_id}"
         clip_dir  = f"{BASE_DIR}/temp/clip/{scene_id}"
         os.makedirs(voice_dir, exist_ok=True)
@@ -42,70 +53,108 @@ def clip_make_for_seed(seed_id: int):
         flare_path = f"{BASE_DIR}/optic/{random.randint(1, OPTIC_COUNT)}.mp4"
 
         if not os.path.exists(image_path):
-            log.error(f"[clip] Image not found: {image_path}")
+            raise FileNotFoundError(f"Image not found: {image_path}")
+
+        audio_dur   = math.ceil(_ffprobe_duration(audio_path))
+        total_dur   = audio_dur + CLIP_START_DELAY + CLIP_END_DELAY
+        flare_dur   = _ffprobe_duration(flare_path)
+        loop_frames = int(total_dur / flare_dur * 30 * flare_dur) + 30
+
+        threads = str(CLIP_FFMPEG_THREADS)
+        cmd = [
+            "ffmpeg", "-y",
+            "-filter_complex_threads", threads,
+            "-loop", "1", "-i", image_path,
+            "-i", flare_path,
+            "-i", audio_path,
+            "-filter_complex",
+            (
+                f"[0:v]scale=1080:1920,setsar=1,format=yuva420p,trim=duration={total_dur}[bg]; "
+                f"[1:v]scale=1080:1920,format=rgba,colorchannelmixer=aa=0.5[flare_scaled]; "
+                f"[flare_scaled]loop=loop=-1:size={loop_frames}:start=0[flare_loop]; "
+                f"[flare_loop]trim=duration={total_dur}[overlay]; "
+                "[bg][overlay]overlay=0:0:shortest=1[out]"
+            ),
+            "-map", "[out]",
+            "-map", "2:a",
+            "-af", f"adelay={CLIP_START_DELAY*1000}|{CLIP_START_DELAY*1000}",
+            "-c:v", "libx264", "-preset", "medium", "-crf", "23",
+            "-threads", threads,
+            "-c:a", "aac", "-b:a", "192k",
+            "-t", str(total_dur),
+            "-pix_fmt", "yuv420p",
+            "-r", "30",
+            video_path,
+        ]
+        run_cmd(cmd, check=True,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return video_path
+
+
+def clip_render_tasks(tasks: list[tuple[int, int, int]]) -> int:
+    """Render clips for (taskId, seedId, sceneNumber) tuples in parallel.
+
+    Returns the number of tasks advanced to the subtitle stage.
+    """
+    if not tasks:
+        return 0
+    with lease("TASK", [t[0] for t in tasks], TASK_CLIP) as won:
+        won = set(won)
+        return _render_leased([t for t in tasks if t[0] in won])
+
+
+def _render_leased(tasks: list) -> int:
+    if not tasks:
+        return 0
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.execute("PRAGMA journal_mode = WAL")
+    scene_ids = {
+        (seed_id, n): scene_id for scene_id, seed_id, n in conn.execute(
+            "SELECT sceneId, seedId, sceneNumber FROM scene WHERE seedId IN "
+            f"({','.join('?' * len({t[1] for t in tasks}))})",
+            sorted({t[1] for t in tasks}),
+        ).fetchall()
+    }
+
+    pool    = _executor()
+    futures = {}
+    for task_id, seed_id, scene_number in tasks:
+        scene_id = scene_ids.get((seed_id, scene_number))
+        if scene_id is None:
             continue
+        ctx = contextvars.copy_context()
+        futures[pool.submit(ctx.run, _render_clip, seed_id, task_id, scene_id)] = (task_id, scene_id)
 
+    done = 0
+    for fut in as_completed(futures):
+        task_id, scene_id = futures[fut]
         try:
-            audio_dur   = math.ceil(_ffprobe_duration(audio_path))
-            total_dur   = audio_dur + CLIP_START_DELAY + CLIP_END_DELAY
-            flare_dur   = _ffprobe_duration(flare_path)
-            loop_frames = int(total_dur / flare_dur * 30 * flare_dur) + 30
-
-            cmd = [
-                "ffmpeg", "-y",
-                "-loop", "1", "-i", image_path,
-                "-i", flare_path,
-                "-i", audio_path,
-                "-filter_complex",
-                (
-                    f"[0:v]scale=1080:1920,setsar=1,format=yuva420p,trim=duration={total_dur}[bg]; "
-                    f"[1:v]scale=1080:1920,format=rgba,colorchannelmixer=aa=0.5[flare_scaled]; "
-                    f"[flare_scaled]loop=loop=-1:size={loop_frames}:start=0[flare_loop]; "
-                    f"[flare_loop]trim=duration={total_dur}[overlay]; "
-                    "[bg][overlay]overlay=0:0:shortest=1[out]"
-                ),
-                "-map", "[out]",
-                "-map", "2:a",
-                "-af", f"adelay={CLIP_START_DELAY*1000}|{CLIP_START_DELAY*1000}",
-                "-c:v", "libx264", "-preset", "medium", "-crf", "23",
-                "-c:a", "aac", "-b:a", "192k",
-                "-t", str(total_dur),
-                "-pix_fmt", "yuv420p",
-                "-r", "30",
-                video_path,
-            ]
-            subprocess.run(cmd, check=True,
-                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            log.info(f"[clip] Created: {video_path}")
-
-            cursor.execute(
-                "UPDATE task SET sceneClipDate=datetime('now','localtime') WHERE taskId=?",
-                (task_id,),
-            )
+            log.info(f"[clip] Created: {fut.result()}")
+            advance_task(conn, task_id, TASK_SUBTITLE)
             conn.commit()
+            done += 1
         except Exception as e:
             log.error(f"[clip] Failed for scene {scene_id}: {e}")
     conn.close()
+    return done
+
+
+@traced("clip")
+def clip_make_for_seed(seed_id: int):
+    conn  = sqlite3.connect(DB_PATH)
+    tasks = task_ids_in_state(conn, TASK_CLIP, seed_id)
+    conn.close()
+    clip_render_tasks(tasks)
 
 
 def run_clip():
     """Run the Clip module for all pending seeds."""
     log.info("═══ MODULE: CLIP ═══")
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.execute("PRAGMA journal_mode = WAL")
-    cursor = conn.cursor()
-    cursor.execute(
-        """SELECT DISTINCT seedId FROM task
-           WHERE sceneImageDate!='0000-00-00 00:00:00'
-           AND sceneAudioDate!='0000-00-00 00:00:00'
-           AND sceneClipDate='0000-00-00 00:00:00'
-           AND sceneSubtitleDate='0000-00-00 00:00:00'"""
-    )
-    seeds = cursor.fetchall()
+    conn  = sqlite3.connect(DB_PATH)
+    tasks = task_ids_in_state(conn, TASK_CLIP)
     conn.close()
-    log.info(f"[clip] {len(seeds)} pending seeds")
-    for (seed_id,) in seeds:
-        try:
-            clip_make_for_seed(seed_id)
-        except Exception as e:
-            log.error(f"[clip] Seed {seed_id} failed: {e}")
+    log.info(f"[clip] {len(tasks)} pending scenes across "
+             f"{len({seed_id for _, seed_id, _ in tasks})} seeds")
+    with span("clip", stage="clip", seeds=len({t[1] for t in tasks}), scenes=len(tasks)):
+        done = clip_render_tasks(tasks)
+    log.info(f"[clip] {done}/{len(tasks)} clips rendered")
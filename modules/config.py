@@ -4,6 +4,10 @@
 import argparse
 import asyncio
 import base64
+import contextlib
+import functools
+import hashlib
+import itertools
 import json
 import logging
 import math
@@ -12,9 +16,11 @@ import random
 import re
 import shlex
 import shutil
+import socket
 import sqlite3
 import subprocess
 import sys
+import threading
 import time
 from datetime import datetime, timedelta
 from html import unescape
@@ -50,6 +56,19 @@ LLAMA_MODEL_PATH = os.getenv("LLAMA_MODEL_PATH",
 LLAMA_N_CTX      = int(os.getenv("LLAMA_N_CTX",  "4096"))
 LLAMA_N_GPU      = int(os.getenv("LLAMA_N_GPU",  "-1"))
 LLAMA_VERBOSE    = os.getenv("LLAMA_VERBOSE", "false").lower() == "true"
+# KV state after each prompt is kept so the next prompt sharing its prefix
+# (the fixed instructions) only evaluates the new tokens.  auto = RAM in the
+# resident daemon, disk otherwise (survives across cron runs); off disables.
+LLAMA_PREFIX_CACHE     = os.getenv("LLAMA_PREFIX_CACHE", "auto").lower()
+LLAMA_PREFIX_CACHE_MB  = int(os.getenv("LLAMA_PREFIX_CACHE_MB", "2048"))
+LLAMA_PREFIX_CACHE_DIR = os.getenv("LLAMA_PREFIX_CACHE_DIR", f"{BASE_DIR}/cache/llama")
+# Finished replies, keyed by model, prompt, schema and sampling settings.
+# LLM_CACHE=off (or pipeline.py --no-llm-cache) bypasses it.
+LLM_CACHE     = os.getenv("LLM_CACHE", "on").lower() not in ("off", "0", "false")
+LLM_CACHE_MB  = int(os.getenv("LLM_CACHE_MB", "256"))
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", f"{BASE_DIR}/cache/llm")
+# Threads, batch size, mmap/mlock … measured by `pipeline.py --tune-llm`
+LLAMA_PROFILE = os.getenv("LLAMA_PROFILE", f"{BASE_DIR}/cache/llama-profile.json")
 
 # ── Flux / HuggingFace image model ──────────────────────────────────────────
 # Any FLUX-compatible HuggingFace repo.  Examples:
@@ -64,6 +83,86 @@ FLUX_HEIGHT      = int(os.getenv("FLUX_HEIGHT",   "960"))
 FLUX_STEPS       = int(os.getenv("FLUX_STEPS",    "20"))
 FLUX_GUIDANCE    = float(os.getenv("FLUX_GUIDANCE", "3.5"))
 FLUX_CPU_OFFLOAD = os.getenv("FLUX_CPU_OFFLOAD", "true").lower() == "true"
+# Scene images denoised per pipeline call: as many as fit FLUX_BATCH_MB of
+# activation memory (0 = 80 % of the free GPU memory), at most FLUX_MAX_BATCH
+FLUX_BATCH_MB    = int(os.getenv("FLUX_BATCH_MB",  "0"))
+FLUX_MAX_BATCH   = max(1, int(os.getenv("FLUX_MAX_BATCH", "4")))
+# FLUX_DEVICE=auto runs on CUDA when present and on the CPU profile otherwise.
+# The CPU profile uses FLUX_CPU_THREADS torch threads (0 = one per physical
+# core), FLUX_CPU_DTYPE (auto = bfloat16 where the CPU computes it natively,
+# else float32) and FLUX_CPU_STEPS denoising steps (0 = FLUX_STEPS).
+FLUX_DEVICE      = os.getenv("FLUX_DEVICE", "auto").lower()
+FLUX_CPU_THREADS = int(os.getenv("FLUX_CPU_THREADS", "0"))
+FLUX_CPU_DTYPE   = os.getenv("FLUX_CPU_DTYPE", "auto").lower()
+FLUX_CPU_STEPS   = int(os.getenv("FLUX_CPU_STEPS", "0"))
+# CLIP + T5 prompt embeddings, keyed by model and prompt (0 MB = no cache)
+FLUX_EMBED_CACHE_MB  = int(os.getenv("FLUX_EMBED_CACHE_MB", "1024"))
+FLUX_EMBED_CACHE_DIR = os.getenv("FLUX_EMBED_CACHE_DIR", f"{BASE_DIR}/cache/flux-embed")
+# Finished scene images, keyed by model, normalised prompt, size, steps,
+# guidance and seed (0 MB = no cache).  IMAGE_CACHE_NEAR_DUP > 0 also reuses an
+# image whose prompt's SimHash is within that many bits.
+IMAGE_CACHE_MB       = int(os.getenv("IMAGE_CACHE_MB", "2048"))
+IMAGE_CACHE_DIR      = os.getenv("IMAGE_CACHE_DIR", f"{BASE_DIR}/cache/image")
+IMAGE_CACHE_NEAR_DUP = int(os.getenv("IMAGE_CACHE_NEAR_DUP", "0"))
+
+# ── Scheduler (pipeline.py --pipelined) ──────────────────────────────────────
+# One worker pool per resource class.  Per-stage limits are read from
+# SCHED_<STAGE>_CONCURRENCY / SCHED_<STAGE>_BATCH (e.g. SCHED_CLIP_CONCURRENCY=4).
+SCHED_GPU_WORKERS = int(os.getenv("SCHED_GPU_WORKERS", "1"))
+SCHED_CPU_WORKERS = int(os.getenv("SCHED_CPU_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+SCHED_NET_WORKERS = int(os.getenv("SCHED_NET_WORKERS", "4"))
+SCHED_POLL_SEC    = float(os.getenv("SCHED_POLL_SEC", "2"))
+
+# Serialises GPU work (Flux, Llama, Whisper) across scheduler threads.
+GPU_LOCK = threading.RLock()
+# Signalled when a model stops being in use, so a load waiting for room retries
+_MODEL_FREED = threading.Condition(GPU_LOCK)
+
+# ── Resident daemon (python pipeline.py --daemon) ───────────────────────────
+DAEMON_POLL_SEC      = float(os.getenv("DAEMON_POLL_SEC", "30"))
+# Seconds a model may sit unused in the daemon before it is unloaded.
+MODEL_IDLE_TIMEOUT   = float(os.getenv("MODEL_IDLE_TIMEOUT", "900"))
+LLM_IDLE_TIMEOUT     = float(os.getenv("LLM_IDLE_TIMEOUT",     MODEL_IDLE_TIMEOUT))
+FLUX_IDLE_TIMEOUT    = float(os.getenv("FLUX_IDLE_TIMEOUT",    MODEL_IDLE_TIMEOUT))
+WHISPER_IDLE_TIMEOUT = float(os.getenv("WHISPER_IDLE_TIMEOUT", MODEL_IDLE_TIMEOUT))
+
+# ── Model memory budget ──────────────────────────────────────────────────────
+# Before a model loads, the least recently used resident models are unloaded
+# until its estimated footprint fits both budgets.  0 = 80 % of physical RAM /
+# of the GPU's memory.
+MODEL_RAM_MB  = int(os.getenv("MODEL_RAM_MB",  "0"))
+MODEL_VRAM_MB = int(os.getenv("MODEL_VRAM_MB", "0"))
+
+# ── Feed fetching ────────────────────────────────────────────────────────────
+FETCH_WORKERS  = int(os.getenv("FETCH_WORKERS",  "8"))    # article downloads in flight
+FETCH_PER_HOST = int(os.getenv("FETCH_PER_HOST", "4"))    # … of which per host
+FETCH_TIMEOUT  = float(os.getenv("FETCH_TIMEOUT", "10"))
+HTTP_CACHE_DIR = os.getenv("HTTP_CACHE_DIR", f"{BASE_DIR}/cache/http")
+HTTP_CACHE_MB  = int(os.getenv("HTTP_CACHE_MB", "64"))    # size bound of the feed-document cache
+# Each subscription is re-polled after FEED_POLL_FACTOR × its typical gap
+# between posts, kept within [FEED_MIN_POLL_SEC, FEED_MAX_POLL_SEC]
+FEED_MIN_POLL_SEC = float(os.getenv("FEED_MIN_POLL_SEC", "300"))
+FEED_MAX_POLL_SEC = float(os.getenv("FEED_MAX_POLL_SEC", "86400"))
+FEED_POLL_FACTOR  = float(os.getenv("FEED_POLL_FACTOR",  "0.5"))
+# RSS entries turned into seeds per feed run, all in one LLM session
+FEED_BATCH        = max(1, int(os.getenv("FEED_BATCH", "4")))
+# Articles over FEED_ARTICLE_TOKENS are cut into FEED_CHUNK_TOKENS pieces,
+# each summarised, and the summaries reduced to a digest within the budget
+FEED_ARTICLE_TOKENS = int(os.getenv("FEED_ARTICLE_TOKENS", "1024"))
+FEED_CHUNK_TOKENS   = int(os.getenv("FEED_CHUNK_TOKENS",   "1536"))
+
+# ── Work leases (several pipeline workers sharing one DB) ───────────────────
+# A worker renews its leases every LEASE_TTL_SEC / 3; a lease not renewed for
+# LEASE_TTL_SEC is taken over by another worker.
+LEASE_TTL_SEC = float(os.getenv("LEASE_TTL_SEC", "300"))
+WORKER_ID     = os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+# ── Clip rendering ───────────────────────────────────────────────────────────
+# Scene clips are rendered CLIP_WORKERS at a time across all pending seeds.
+# Each ffmpeg job gets CLIP_FFMPEG_THREADS threads; by default the worker count
+# fills the machine: cores // threads-per-job.
+CLIP_FFMPEG_THREADS = max(1, int(os.getenv("CLIP_FFMPEG_THREADS", "2")))
+CLIP_WORKERS        = int(os.getenv("CLIP_WORKERS", "0")) or max(1, (os.cpu_count() or 2) // CLIP_FFMPEG_THREADS)
 
 # ── TTS ──────────────────────────────────────────────────────────────────────
 TTS_VOICE = "en-US-AvaNeural"
@@ -137,57 +236,438 @@ class SongResponse(BaseModel):
 # ──────────────────────────────────────────────────────────────────────────────
 # MODULE-LEVEL CACHES  (populated lazily on first use of each module)
 # ──────────────────────────────────────────────────────────────────────────────
-_llm         = None   # llama.cpp Llama instance
-_flux_pipe   = None   # HuggingFace FluxPipeline instance
-_whisper_mdl = None   # OpenAI Whisper model
+_models      = {}     # model name ("llm", "flux", "whisper") -> loaded instance
+_footprint   = {}     # model name -> (RAM MB, VRAM MB) it holds
+_last_used   = {}     # model name -> time.monotonic() of the last _get_* call
+_in_use      = {}     # model name -> number of using() blocks holding it
+_resident    = False  # set by the daemon: prefer RAM caches over disk ones
+
+
+def mark_resident():
+    """Tell lazily built caches that this process stays up between passes."""
+    global _resident
+    _resident = True
+
+
+def _llm_prefix_cache():
+    """llama.cpp prompt-state cache for LLAMA_PREFIX_CACHE, or None."""
+    mode = LLAMA_PREFIX_CACHE
+    if mode == "auto":
+        mode = "ram" if _resident else "disk"
+    capacity = LLAMA_PREFIX_CACHE_MB * 1024 ** 2
+    if mode == "ram":
+        from llama_cpp import LlamaRAMCache
+        return LlamaRAMCache(capacity_bytes=capacity)
+    if mode == "disk":
+        from llama_cpp import LlamaDiskCache
+        # States only fit the model and context size that produced them
+        name = f"{os.path.splitext(os.path.basename(LLAMA_MODEL_PATH))[0]}-{LLAMA_N_CTX}"
+        return LlamaDiskCache(cache_dir=os.path.join(LLAMA_PREFIX_CACHE_DIR, name),
+                              capacity_bytes=capacity)
+    return None
+
+
+_llm_id = None
+
+
+def llm_fingerprint() -> str:
+    """Identity of the configured GGUF without loading it: name, size, hash of its first MiB."""
+    global _llm_id
+    if _llm_id is None:
+        try:
+            with open(LLAMA_MODEL_PATH, "rb") as f:
+                head = hashlib.sha1(f.read(1 << 20)).hexdigest()
+            size = os.path.getsize(LLAMA_MODEL_PATH)
+        except OSError:
+            head, size = "missing", 0
+        _llm_id = f"{os.path.basename(LLAMA_MODEL_PATH)}:{size}:{head}"
+    return _llm_id
+
+
+# ── Model registry ────────────────────────────────────────────────────────────
+_MB = 1024 ** 2
+
+
+def _cuda() -> bool:
+    torch = sys.modules.get("torch")
+    return bool(torch and torch.cuda.is_available())
+
+
+def _llm_offload() -> bool:
+    """True when LLAMA_N_GPU asks for GPU layers and this llama.cpp build can place them."""
+    if not LLAMA_N_GPU:
+        return False
+    try:
+        from llama_cpp import llama_supports_gpu_offload
+        return bool(llama_supports_gpu_offload())
+    except (ImportError, AttributeError):   # older bindings: fall back to what torch sees
+        return _cuda()
+
+
+def _estimate(name: str) -> tuple[float, float]:
+    """(RAM MB, VRAM MB) *name* is expected to hold once loaded."""
+    if name == "llm":
+        try:
+            size = os.path.getsize(LLAMA_MODEL_PATH) / _MB
+        except OSError:
+            size = 0.0
+        kv = LLAMA_N_CTX * 0.125     # fp16 K+V per token of a 3B-class model
+        return (size * 0.1, size + kv) if _llm_offload() else (size + kv, 0.0)
+    if name == "flux":   # FLUX.1 bf16: 12B transformer + T5-XXL + CLIP + VAE
+        if flux_device() == "cpu":
+            return (65000.0 if flux_dtype_name() == "float32" else 32500.0), 0.0
+        return (32500.0, 23000.0) if FLUX_CPU_OFFLOAD else (1000.0, 32500.0)
+    if name == "whisper":  # "medium": ~5 GB while transcribing
+        return (1000.0, 5000.0) if _cuda() else (5000.0, 0.0)
+    return 0.0, 0.0
+
+
+def _torch_mb(*modules) -> tuple[float, float]:
+    """(CPU MB, CUDA MB) of the parameters and buffers of *modules*."""
+    ram = vram = 0.0
+    for m in modules:
+        if m is None:
+            continue
+        for t in itertools.chain(m.parameters(), m.buffers()):
+            mb = t.numel() * t.element_size() / _MB
+            if t.device.type == "cuda":
+                vram += mb
+            else:
+                ram += mb
+    return ram, vram
+
+
+def _budgets() -> tuple[float, float]:
+    """(RAM MB, VRAM MB) models may hold together; 0 where unknown."""
+    ram = MODEL_RAM_MB
+    if not ram:
+        try:
+            ram = 0.8 * os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / _MB
+        except (AttributeError, ValueError, OSError):
+            ram = 0
+    vram = MODEL_VRAM_MB
+    if not vram and _cuda():
+        vram = 0.8 * sys.modules["torch"].cuda.get_device_properties(0).total_memory / _MB
+    return ram, vram
+
+
+def _unload(names: list[str], why: str):
+    """Drop *names* from the registry and hand their memory back. Takes GPU_LOCK.
+
+    Callers leave out models in use(); their memory would stay referenced anyway.
+    """
+    with GPU_LOCK:
+        for name in names:
+            obj = _models.pop(name, None)
+            _footprint.pop(name, None)
+            if hasattr(obj, "close"):     # llama.cpp frees its context eagerly
+                try:
+                    obj.close()
+                except Exception:
+                    pass
+            del obj
+    import gc
+    gc.collect()
+    if _cuda():
+        sys.modules["torch"].cuda.empty_cache()
+    log.info(f"[models] Released {', '.join(names)} ({why})")
+
+
+def _make_room(name: str):
+    """Unload least recently used models until *name*'s estimate fits the budgets.
+
+    Models in use() are never unloaded; when only those stand in the way this
+    waits for them to be released.  Call with GPU_LOCK held, so the check,
+    the evictions and the load that follows see the same registry.
+    """
+    need_ram, need_vram = _estimate(name)
+    cap_ram, cap_vram = _budgets()
+    while True:
+        ram  = need_ram  + sum(r for r, _ in _footprint.values())
+        vram = need_vram + sum(v for _, v in _footprint.values())
+        if not (cap_ram and ram > cap_ram) and not (cap_vram and vram > cap_vram):
+            return
+        others = [n for n in _models if n != name]
+        idle   = [n for n in others if not _in_use.get(n)]
+        if idle:
+            _unload([min(idle, key=lambda n: _last_used.get(n, 0))], f"to make room for {name}")
+        elif others:
+            log.info(f"[models] {name} waits for {', '.join(others)} to be released")
+            _MODEL_FREED.wait()
+        else:
+            log.warning(f"[models] {name} needs ~{need_ram:.0f} MB RAM / {need_vram:.0f} MB VRAM, "
+                        f"over the budget of {cap_ram:.0f} / {cap_vram:.0f} MB on its own")
+            return
+
+
+def _register(name: str, obj, footprint: tuple[float, float] | None = None):
+    """Add a loaded model to the registry. Call with GPU_LOCK held."""
+    _models[name] = obj
+    _footprint[name] = footprint or _estimate(name)
+    ram, vram = _footprint[name]
+    log.info(f"[models] {name} holds ~{ram:.0f} MB RAM, ~{vram:.0f} MB VRAM")
+
+
+def reset_peak_memory():
+    """Start a new peak-memory window (process RSS on Linux, CUDA allocator)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+    if _cuda():
+        sys.modules["torch"].cuda.reset_peak_memory_stats()
+
+
+def peak_memory() -> dict:
+    """{"rss_mb", "cuda_mb"} peaks since reset_peak_memory(), process-wide."""
+    out = {}
+    try:
+        with open("/proc/self/status") as f:
+            out["rss_mb"] = next(int(l.split()[1]) for l in f if l.startswith("VmHWM:")) // 1024
+    except (OSError, StopIteration):
+        import resource
+        out["rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+    if _cuda():
+        out["cuda_mb"] = sys.modules["torch"].cuda.max_memory_allocated() // _MB
+    return out
+
+
+# ── Runtime profile ───────────────────────────────────────────────────────────
+_SPEED_TEXT = ("A viral post claims that a small town banned umbrellas after a storm, "
+               "and fact-checkers traced the story back to a satirical newspaper. ")
+
+
+def llm_speed(llm, prompt_tokens: int = 128, gen_tokens: int = 16) -> tuple[float, float]:
+    """(prefill, decode) tokens per second of *llm*, measured on a throwaway prompt."""
+    prompt = llm.tokenize((_SPEED_TEXT * 64).encode())[:prompt_tokens]
+    llm.reset()
+    t0 = time.perf_counter()
+    llm.eval(prompt)
+    t1 = time.perf_counter()
+    for _ in range(gen_tokens):
+        llm.eval(prompt[-1:])
+    t2 = time.perf_counter()
+    llm.reset()
+    return len(prompt) / (t1 - t0), gen_tokens / (t2 - t1)
+
+
+def load_llm_profile() -> dict:
+    """The saved profile for this machine and LLAMA_N_GPU, or {} if there is none."""
+    try:
+        with open(LLAMA_PROFILE) as f:
+            profile = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if profile.get("cpus") != os.cpu_count() or profile.get("n_gpu_layers") != LLAMA_N_GPU:
+        log.warning(f"[llm] {LLAMA_PROFILE} was tuned for another machine or LLAMA_N_GPU "
+                    f"— ignored; run pipeline.py --tune-llm")
+        return {}
+    if profile.get("model") != llm_fingerprint():
+        log.info("[llm] Runtime profile was tuned on another model; using it anyway")
+    return profile
+
+
+def save_llm_profile(settings: dict, prefill: float, decode: float):
+    os.makedirs(os.path.dirname(LLAMA_PROFILE) or ".", exist_ok=True)
+    tmp = f"{LLAMA_PROFILE}.{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump({"model": llm_fingerprint(), "cpus": os.cpu_count(), "n_gpu_layers": LLAMA_N_GPU,
+                   "n_ctx": LLAMA_N_CTX, "settings": settings,
+                   "prefill_tps": round(prefill, 1), "decode_tps": round(decode, 1),
+                   "tuned": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}, f, indent=2)
+    os.replace(tmp, LLAMA_PROFILE)
 
 
 def _get_llm():
-    """Return the llama.cpp model, loading it on first call."""
-    global _llm
-    if _llm is not None:
-        return _llm
-    from llama_cpp import Llama
-    log.info(f"[llm] Loading model: {LLAMA_MODEL_PATH}")
-    _llm = Llama(
-        model_path=LLAMA_MODEL_PATH,
-        n_ctx=LLAMA_N_CTX,
-        n_gpu_layers=LLAMA_N_GPU,
-        verbose=LLAMA_VERBOSE,
-    )
-    log.info("[llm] Model loaded")
-    return _llm
+    """Return the llama.cpp model, loading it on first call.
+
+    Runtime settings come from the profile written by `pipeline.py --tune-llm`
+    when there is one.  Each load logs prefill and decode speed.
+    """
+    with GPU_LOCK:
+        _last_used["llm"] = time.monotonic()
+        llm = _models.get("llm")
+        if llm is not None:
+            return llm
+        from llama_cpp import Llama
+        _make_room("llm")
+        settings = load_llm_profile().get("settings", {})
+        log.info(f"[llm] Loading model: {LLAMA_MODEL_PATH} "
+                 f"({', '.join(f'{k}={v}' for k, v in settings.items()) or 'default settings'})")
+        llm = Llama(
+            model_path=LLAMA_MODEL_PATH,
+            n_ctx=LLAMA_N_CTX,
+            n_gpu_layers=LLAMA_N_GPU,
+            verbose=LLAMA_VERBOSE,
+            **settings,
+        )
+        prefill, decode = llm_speed(llm)   # before set_cache: the probe's state is not worth keeping
+        cache = _llm_prefix_cache()
+        if cache is not None:
+            llm.set_cache(cache)
+        log.info(f"[llm] Model loaded: prefill {prefill:.0f} tok/s, decode {decode:.1f} tok/s "
+                 f"(prefix cache: {type(cache).__name__ if cache else 'off'})")
+        _register("llm", llm)
+        return llm
 
 
 def _get_whisper():
     """Return the Whisper model, loading it once per process."""
-    global _whisper_mdl
-    if _whisper_mdl is not None:
-        return _whisper_mdl
-    import whisper
-    log.info("[subtitle] Loading Whisper model (medium)…")
-    _whisper_mdl = whisper.load_model("medium")
-    log.info("[subtitle] Whisper ready")
-    return _whisper_mdl
+    with GPU_LOCK:
+        _last_used["whisper"] = time.monotonic()
+        mdl = _models.get("whisper")
+        if mdl is not None:
+            return mdl
+        import whisper
+        _make_room("whisper")
+        log.info("[subtitle] Loading Whisper model (medium)…")
+        mdl = whisper.load_model("medium")
+        log.info("[subtitle] Whisper ready")
+        ram, vram = _torch_mb(mdl)
+        # Weights plus the ~2 GB decoding works in
+        _register("whisper", mdl, (ram + (0 if vram else 2000), vram + (2000 if vram else 0)))
+        return mdl
+
+
+@functools.lru_cache(maxsize=1)
+def flux_device() -> str:
+    """"cuda" or "cpu", resolving FLUX_DEVICE=auto."""
+    if FLUX_DEVICE != "auto":
+        return FLUX_DEVICE
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def _cpu_flags() -> set[str]:
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith(("flags", "Features")):
+                    return set(line.split(":", 1)[1].split())
+    except OSError:
+        pass
+    return set()
+
+
+def _physical_cores() -> int:
+    """Physical cores this process may run on (hyperthreads slow torch's matmuls down)."""
+    logical = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    try:
+        with open("/proc/cpuinfo") as f:
+            cores, phys = set(), None
+            for line in f:
+                key, _, val = line.partition(":")
+                key = key.strip()
+                if key == "physical id":
+                    phys = val.strip()
+                elif key == "core id":
+                    cores.add((phys, val.strip()))
+        if cores:
+            return max(1, min(logical, len(cores)))
+    except OSError:
+        pass
+    return logical
+
+
+def flux_dtype_name() -> str:
+    """torch dtype name Flux runs in on the current device."""
+    if flux_device() != "cpu":
+        return FLUX_DTYPE_STR
+    if FLUX_CPU_DTYPE != "auto":
+        return FLUX_CPU_DTYPE
+    return "bfloat16" if _cpu_flags() & {"avx512_bf16", "amx_bf16", "bf16"} else "float32"
+
+
+def flux_steps() -> int:
+    """Denoising steps per image on the current device."""
+    return FLUX_CPU_STEPS if flux_device() == "cpu" and FLUX_CPU_STEPS else FLUX_STEPS
 
 
 def _get_flux_pipe():
     """Load the Flux pipeline once and return it on subsequent calls."""
-    global _flux_pipe
-    if _flux_pipe is not None:
-        return _flux_pipe
+    with GPU_LOCK:
+        _last_used["flux"] = time.monotonic()
+        pipe = _models.get("flux")
+        if pipe is not None:
+            return pipe
 
-    import torch
-    from diffusers import FluxPipeline
-    dtype = getattr(torch, FLUX_DTYPE_STR, torch.bfloat16)
-
-    log.info(f"[image] Loading Flux model: {FLUX_MODEL_ID}")
-    pipe = FluxPipeline.from_pretrained(FLUX_MODEL_ID, torch_dtype=dtype)
-    if FLUX_CPU_OFFLOAD:
-        pipe.enable_model_cpu_offload()
-    else:
-        pipe = pipe.to("cuda")
-
-    _flux_pipe = pipe
-    log.info("[image] Flux model loaded")
-    return pipe
+        import torch
+        from diffusers import FluxPipeline
+        device = flux_device()
+        dtype  = getattr(torch, flux_dtype_name(), torch.bfloat16)
+
+        _make_room("flux")
+        log.info(f"[image] Loading Flux model: {FLUX_MODEL_ID} ({device}, {dtype})")
+        pipe = FluxPipeline.from_pretrained(FLUX_MODEL_ID, torch_dtype=dtype)
+        if device == "cpu":
+            threads = FLUX_CPU_THREADS or _physical_cores()
+            torch.set_num_threads(threads)
+            # The VAE is all convolutions, which oneDNN runs fastest channels-last
+            pipe.vae.to(memory_format=torch.channels_last)
+            # Decode in tiles so a frame's activations stay small on a RAM-bound box
+            pipe.vae.enable_tiling()
+            try:
+                pipe.enable_attention_slicing()
+            except Exception:   # processors without slicing (newer diffusers) keep full attention
+                pass
+            log.info(f"[image] CPU profile: {threads} threads, {flux_steps()} steps")
+        elif FLUX_CPU_OFFLOAD:
+            pipe.enable_model_cpu_offload()
+        else:
+            pipe = pipe.to("cuda")
+        # Decode batched latents one image at a time so VAE memory does not grow with the batch
+        pipe.vae.enable_slicing()
+
+        log.info("[image] Flux model loaded")
+        parts = [getattr(pipe, n, None) for n in ("transformer", "text_encoder", "text_encoder_2", "vae")]
+        ram, vram = _torch_mb(*parts)
+        if device == "cuda" and FLUX_CPU_OFFLOAD:   # one component at a time is on the GPU, the transformer longest
+            vram = max(sum(_torch_mb(p)) for p in parts if p is not None)
+        _register("flux", pipe, (ram, vram))
+        return pipe
+
+
+@contextlib.contextmanager
+def using(name: str):
+    """Load model *name* and pin it for the block: it is not unloaded while in use.
+
+    For callers that keep the model across several GPU_LOCK sections (a
+    batch of Flux calls, a feed batch); a single call under GPU_LOCK needs
+    no pin, since unloading takes GPU_LOCK too.
+    """
+    getter = {"llm": _get_llm, "flux": _get_flux_pipe, "whisper": _get_whisper}[name]
+    with GPU_LOCK:
+        _in_use[name] = _in_use.get(name, 0) + 1
+        try:
+            obj = getter()
+        except BaseException:
+            _in_use[name] -= 1
+            _MODEL_FREED.notify_all()
+            raise
+    try:
+        yield obj
+    finally:
+        with GPU_LOCK:
+            _in_use[name] -= 1
+            _MODEL_FREED.notify_all()
+
+
+def loaded_models() -> dict:
+    """Return {model name: seconds since last use} for every resident model."""
+    now = time.monotonic()
+    return {name: round(now - _last_used.get(name, now), 1) for name in _models}
+
+
+def release_idle_models(force: bool = False) -> list[str]:
+    """Unload models idle for longer than their *_IDLE_TIMEOUT; return their names.
+
+    Takes GPU_LOCK so a model is never dropped in the middle of an inference.
+    """
+    timeouts = {"llm": LLM_IDLE_TIMEOUT, "flux": FLUX_IDLE_TIMEOUT, "whisper": WHISPER_IDLE_TIMEOUT}
+    with GPU_LOCK:
+        released = [name for name, idle in loaded_models().items()
+                    if not _in_use.get(name) and (force or idle >= timeouts[name])]
+        if released:
+            _unload(released, "shutting down" if force else "idle")
+    return released
@@ -0,0 +1,84 @@
+"""
+Control channel between `pipeline.py --daemon` and cli.py.
+
+A Unix socket in BASE_DIR carries one JSON request and one JSON reply per
+connection.  Stdlib only so cli.py can talk to the daemon without pulling in
+any pipeline dependency.
+"""
+
+import json
+import os
+import socket
+import socketserver
+import threading
+
+SOCKET_NAME = "pipeline.sock"
+
+
+def socket_path(base_dir: str) -> str:
+    return os.path.join(base_dir, SOCKET_NAME)
+
+
+def send_command(base_dir: str, cmd: str, timeout: float = 5.0, **params) -> dict | None:
+    """Send *cmd* to the daemon and return its reply, or None if no daemon is listening."""
+    path = socket_path(base_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.settimeout(timeout)
+            s.connect(path)
+            s.sendall(json.dumps({"cmd": cmd, **params}).encode() + b"\n")
+            data = b""
+            while not data.endswith(b"\n"):
+                chunk = s.recv(65536)
+                if not chunk:
+                    break
+                data += chunk
+        return json.loads(data or b"null")
+    except (OSError, ValueError):
+        return None
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            req   = json.loads(self.rfile.readline() or b"{}")
+            reply = self.server.dispatch(req)
+        except Exception as e:
+            reply = {"ok": False, "error": str(e)}
+        self.wfile.write(json.dumps(reply, default=str).encode() + b"\n")
+
+
+class ControlServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serve control requests on a background thread.
+
+    *handlers* maps a command name to a callable taking the request dict and
+    returning a JSON-serialisable reply dict.
+    """
+    daemon_threads = True
+
+    def __init__(self, base_dir: str, handlers: dict):
+        self.path     = socket_path(base_dir)
+        self.handlers = handlers
+        if os.path.exists(self.path):
+            os.remove(self.path)   # stale socket from a crashed daemon
+        super().__init__(self.path, _Handler)
+        self._thread = threading.Thread(target=self.serve_forever, name="control", daemon=True)
+
+    def dispatch(self, req: dict) -> dict:
+        fn = self.handlers.get(req.get("cmd"))
+        if fn is None:
+            return {"ok": False, "error": f"unknown command: {req.get('cmd')!r}"}
+        return fn(req)
+
+    def start(self):
+        self._thread.start()
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,669 @@
+"""
+SQLite schema helpers shared by pipeline.py and the modules.
+
+Stdlib only — pipeline.py imports this on every cron tick, before it knows
+whether any AI model will be needed.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import time
+
+ZERO = "0000-00-00 00:00:00"
+_Z   = f"'{ZERO}'"
+
+STAGES = ["feed", "image", "voice", "clip", "subtitle",
+          "transition", "mix", "final", "upload", "clean"]
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# STAGE STATES
+# TASK.taskState / SEED.seedState name the stage a row is waiting for.  Every
+# module claims work with `WHERE <col> = <const>`, which hits the matching
+# partial index instead of comparing timestamp strings across the table.
+# ──────────────────────────────────────────────────────────────────────────────
+TASK_IMAGE, TASK_VOICE, TASK_CLIP, TASK_SUBTITLE, TASK_DONE = range(5)
+SEED_SCENES, SEED_TRANSITION, SEED_MIX, SEED_FINAL, SEED_UPLOAD, SEED_CLEAN, SEED_DONE = range(7)
+
+# State -> stage whose backlog it counts toward
+TASK_STATE_STAGE = {TASK_IMAGE: "image", TASK_VOICE: "voice",
+                    TASK_CLIP: "clip", TASK_SUBTITLE: "subtitle"}
+SEED_STATE_STAGE = {SEED_TRANSITION: "transition", SEED_MIX: "mix", SEED_FINAL: "final",
+                    SEED_UPLOAD: "upload", SEED_CLEAN: "clean"}
+
+# Entering a state stamps the timestamp of the step that was just finished
+_TASK_STAMP = {TASK_VOICE:    ("sceneImageDate",    "datetime('now','localtime')"),
+               TASK_CLIP:     ("sceneAudioDate",    "datetime('now','localtime')"),
+               TASK_SUBTITLE: ("sceneClipDate",     "datetime('now','localtime')"),
+               TASK_DONE:     ("sceneSubtitleDate", "datetime('now','localtime')")}
+_SEED_STAMP = {SEED_MIX:      ("seedTransitionStamp", "datetime('now','localtime')"),
+               SEED_FINAL:    ("seedMixStamp",        "datetime('now','localtime')"),
+               SEED_UPLOAD:   ("seedRenderStamp",     "CURRENT_TIMESTAMP"),
+               SEED_CLEAN:    ("seedUploadStamp",     "CURRENT_TIMESTAMP")}
+
+
+def task_ids_in_state(conn: sqlite3.Connection, state: int, seed_id: int | None = None) -> list:
+    """Return [(taskId, seedId, sceneNumber)] for unleased tasks waiting in *state*."""
+    sql = f"SELECT taskId, seedId, sceneNumber FROM TASK WHERE taskState = {int(state)} AND {LEASE_FREE}"
+    if seed_id is not None:
+        return conn.execute(sql + " AND seedId = ? ORDER BY sceneNumber", (seed_id,)).fetchall()
+    return conn.execute(sql + " ORDER BY seedId, sceneNumber").fetchall()
+
+
+def seed_ids_in_state(conn: sqlite3.Connection, state: int) -> list[int]:
+    """Return the unleased seedIds waiting in *state*, oldest first."""
+    rows = conn.execute(
+        f"SELECT seedId FROM SEED WHERE seedState = {int(state)} AND {LEASE_FREE} ORDER BY seedId"
+    ).fetchall()
+    return [r[0] for r in rows]
+
+
+def advance_task(conn: sqlite3.Connection, task_id: int, to_state: int) -> bool:
+    """Move a task from the previous state to *to_state* and stamp its timestamp.
+
+    The seed is promoted to SEED_TRANSITION once its last task is done.
+    Returns False if the task was not in the expected state.  Does not commit.
+    """
+    col, now = _TASK_STAMP[to_state]
+    cur = conn.execute(
+        f"UPDATE TASK SET taskState = ?, {col} = {now}, {_UNLEASE} WHERE taskId = ? AND taskState = ?",
+        (to_state, task_id, to_state - 1),
+    )
+    if cur.rowcount and to_state == TASK_DONE:
+        conn.execute(
+            f"""UPDATE SEED SET seedState = {SEED_TRANSITION}
+                WHERE seedState = {SEED_SCENES}
+                AND seedId = (SELECT seedId FROM TASK WHERE taskId = ?)
+                AND NOT EXISTS (SELECT 1 FROM TASK WHERE seedId = SEED.seedId AND taskState < {TASK_DONE})""",
+            (task_id,),
+        )
+    return cur.rowcount > 0
+
+
+def advance_seed(conn: sqlite3.Connection, seed_id: int, to_state: int) -> bool:
+    """Move a seed from the previous state to *to_state* and drop its lease (does not commit)."""
+    col, now = _SEED_STAMP.get(to_state, (None, None))
+    stamp = f", {col} = {now}" if col else ""
+    cur = conn.execute(
+        f"UPDATE SEED SET seedState = ?{stamp}, {_UNLEASE} WHERE seedId = ? AND seedState = ?",
+        (to_state, seed_id, to_state - 1),
+    )
+    return cur.rowcount > 0
+
+
+def record_seed_error(conn: sqlite3.Connection, seed_id: int, step: str, msg: str):
+    """Record why *step* failed for a seed, for `cli.py status` / `retry` (does not commit)."""
+    conn.execute("UPDATE SEED SET seedErrorStep = ?, seedErrorMsg = ? WHERE seedId = ?",
+                 (step, msg[:1000], seed_id))
+
+
+def seed_failed(db_path: str, seed_id: int, step: str, err: Exception) -> bool:
+    """record_seed_error on its own connection, for a stage loop's except clause.
+
+    Returns False if the error could not be stored (the DB itself is failing).
+    """
+    try:
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            record_seed_error(conn, seed_id, step, str(err))
+            conn.commit()
+        finally:
+            conn.close()
+        return True
+    except sqlite3.Error:
+        return False
+
+
+def _state_columns(conn: sqlite3.Connection) -> bool:
+    """Add taskState / seedState with partial indexes; backfill. True if added."""
+    added = False
+    for table, col in (("TASK", "taskState"), ("SEED", "seedState")):
+        try:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} INTEGER NOT NULL DEFAULT 0")
+            added = True
+        except sqlite3.OperationalError:
+            pass
+    if added:
+        conn.execute(f"""UPDATE TASK SET taskState = CASE
+            WHEN sceneSubtitleDate != {_Z} THEN {TASK_DONE}
+            WHEN sceneClipDate     != {_Z} THEN {TASK_SUBTITLE}
+            WHEN sceneAudioDate    != {_Z} THEN {TASK_CLIP}
+            WHEN sceneImageDate    != {_Z} THEN {TASK_VOICE}
+            ELSE {TASK_IMAGE} END""")
+        conn.execute(f"""UPDATE SEED SET seedState = CASE
+            WHEN seedUploadStamp     != {_Z} THEN {SEED_CLEAN}
+            WHEN seedRenderStamp     != {_Z} THEN {SEED_UPLOAD}
+            WHEN seedMixStamp        != {_Z} THEN {SEED_FINAL}
+            WHEN seedTransitionStamp != {_Z} THEN {SEED_MIX}
+            WHEN EXISTS (SELECT 1 FROM TASK WHERE TASK.seedId = SEED.seedId)
+             AND NOT EXISTS (SELECT 1 FROM TASK WHERE TASK.seedId = SEED.seedId
+                             AND taskState < {TASK_DONE}) THEN {SEED_TRANSITION}
+            ELSE {SEED_SCENES} END""")
+    for state in TASK_STATE_STAGE:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_task_state_{state} "
+                     f"ON TASK(seedId, sceneNumber) WHERE taskState = {state}")
+    for state in [SEED_SCENES, *SEED_STATE_STAGE]:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_seed_state_{state} "
+                     f"ON SEED(seedId) WHERE seedState = {state}")
+    return added
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# RSS SOURCE LINKS
+# Fetched articles remember their URL so the next feed run can skip them
+# without downloading the page again.
+# ──────────────────────────────────────────────────────────────────────────────
+def ensure_rss_link(conn: sqlite3.Connection):
+    try:
+        conn.execute("ALTER TABLE RSS ADD COLUMN rssLink TEXT")
+    except sqlite3.OperationalError:
+        pass
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_rss_link ON RSS(rssLink) "
+                 "WHERE rssLink IS NOT NULL")
+
+
+def ensure_rss_digest(conn: sqlite3.Connection):
+    """RSS.rssDigest: the bounded summary prompted in place of a long article."""
+    try:
+        conn.execute("ALTER TABLE RSS ADD COLUMN rssDigest TEXT")
+    except sqlite3.OperationalError:
+        pass
+
+
+def known_links(conn: sqlite3.Connection, links: list[str]) -> set[str]:
+    """Return the subset of *links* already stored in RSS.rssLink."""
+    known = set()
+    links = list(links)
+    for i in range(0, len(links), 500):
+        chunk = links[i:i + 500]
+        known.update(r[0] for r in conn.execute(
+            f"SELECT rssLink FROM RSS WHERE rssLink IN ({','.join('?' * len(chunk))})", chunk
+        ).fetchall())
+    return known
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# RSS CONTENT FINGERPRINTS
+# rssHash is a SHA-1 of the normalised text (unique, so an exact re-post is
+# rejected by the index).  rssSimhash is a 64-bit SimHash over word 3-shingles;
+# near-identical stories differ in only a few bits.  Four expression indexes on
+# its 16-bit bands find candidates: two hashes within 3 bits of each other must
+# agree on at least one band, so a near-duplicate check is four index probes
+# plus a popcount on the few rows they return.
+# ──────────────────────────────────────────────────────────────────────────────
+SIM_BANDS     = 4
+SIM_BAND_BITS = 16
+_SIM_MASK     = (1 << SIM_BAND_BITS) - 1
+_SIM_MIN_WORDS = 20     # shorter texts get exact matching only
+
+
+def near_dup_distance() -> int:
+    """Max SimHash bit distance treated as a duplicate (0 = exact matches only).
+
+    Read at call time so cli.py sees values from .env loaded after import.
+    """
+    return int(os.getenv("NEAR_DUP_DISTANCE", "3"))
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(normalize_text(text).encode()).hexdigest()
+
+
+def simhash(text: str) -> int | None:
+    """Signed 64-bit SimHash of *text* (fits an SQLite INTEGER); None if too short."""
+    words = normalize_text(text).split()
+    if len(words) < _SIM_MIN_WORDS:
+        return None
+    weights = [0] * 64
+    for i in range(len(words) - 2):
+        h = int.from_bytes(hashlib.blake2b(" ".join(words[i:i + 3]).encode(),
+                                           digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    sim = sum(1 << bit for bit, w in enumerate(weights) if w > 0)
+    return sim - (1 << 64) if sim >= 1 << 63 else sim
+
+
+def sim_bands(sim: int) -> list[int]:
+    """The SIM_BANDS blocks of a SimHash, lowest bits first."""
+    return [(sim >> (i * SIM_BAND_BITS)) & _SIM_MASK for i in range(SIM_BANDS)]
+
+
+def sim_distance(a: int, b: int) -> int:
+    """Bits in which two SimHashes differ."""
+    return bin((a ^ b) & ((1 << 64) - 1)).count("1")
+
+
+def _band(i: int) -> str:
+    return f"((rssSimhash >> {i * SIM_BAND_BITS}) & {_SIM_MASK})"
+
+
+def ensure_rss_fingerprint(conn: sqlite3.Connection):
+    for col, definition in [("rssHash", "TEXT"), ("rssSimhash", "INTEGER")]:
+        try:
+            conn.execute(f"ALTER TABLE RSS ADD COLUMN {col} {definition}")
+        except sqlite3.OperationalError:
+            pass
+    # Backfill; a row repeating an earlier text keeps a NULL hash so the
+    # unique index can still be built over history
+    seen = {r[0] for r in conn.execute("SELECT rssHash FROM RSS WHERE rssHash IS NOT NULL")}
+    for rss_id, text in conn.execute(
+        "SELECT rssId, rssText FROM RSS WHERE rssHash IS NULL ORDER BY rssId"
+    ).fetchall():
+        digest = content_hash(text)
+        conn.execute("UPDATE RSS SET rssHash = ?, rssSimhash = ? WHERE rssId = ?",
+                     (None if digest in seen else digest, simhash(text), rss_id))
+        seen.add(digest)
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_rss_hash ON RSS(rssHash) "
+                 "WHERE rssHash IS NOT NULL")
+    for i in range(SIM_BANDS):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_rss_sim{i} ON RSS({_band(i)})")
+
+
+def find_duplicate(conn: sqlite3.Connection, text: str, max_distance: int | None = None):
+    """rssId of a stored entry with the same or a near-identical text, else None."""
+    row = conn.execute("SELECT rssId FROM RSS WHERE rssHash = ?", (content_hash(text),)).fetchone()
+    if row:
+        return row[0]
+    max_distance = near_dup_distance() if max_distance is None else max_distance
+    sim = simhash(text)
+    if sim is None or max_distance <= 0:
+        return None
+    if max_distance < SIM_BANDS:
+        where = " OR ".join(f"{_band(i)} = ?" for i in range(SIM_BANDS))
+        args  = sim_bands(sim)
+    else:   # bands no longer guarantee a shared block; compare against everything
+        where, args = "rssSimhash IS NOT NULL", []
+    for rss_id, other in conn.execute(f"SELECT rssId, rssSimhash FROM RSS WHERE {where}", args):
+        if sim_distance(sim, other) <= max_distance:
+            return rss_id
+    return None
+
+
+def insert_rss(conn: sqlite3.Connection, group: str, text: str, stamp: str,
+               link: str | None = None) -> tuple[int | None, int | None]:
+    """Insert one RSS entry unless it repeats a stored link or (near-)duplicate text.
+
+    Returns (rssId, None) when inserted, (None, dupOfRssId) for a duplicate
+    text, and (None, None) for a link that was already ingested.
+    """
+    dup = find_duplicate(conn, text)
+    if dup is not None:
+        return None, dup
+    cur = conn.execute(
+        "INSERT OR IGNORE INTO RSS (rssGroup, rssText, rssStamp, rssLink, rssHash, rssSimhash) "
+        "VALUES (?,?,?,?,?,?)",
+        (group, text, stamp, link, content_hash(text), simhash(text)),
+    )
+    return (cur.lastrowid if cur.rowcount else None), None
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# FEED SUBSCRIPTIONS
+# One row per polled feed.  feedCursor / feedCursorTs remember the newest entry
+# already handed to the extractor, feedEtag / feedModified the last validator
+# the server sent, and feedNextPoll when the feed is next due — the poller in
+# modules.feed stretches or shrinks feedInterval to the feed's publish rate.
+# ──────────────────────────────────────────────────────────────────────────────
+FEED_EXTRACTORS  = ("summary", "snopes", "dailymail")
+FEED_DEFAULT_SEC = 3600.0
+
+# (url, group, extractor, limit, enabled) — what the pipeline polled before
+# subscriptions existed.  Daily Mail ships disabled; `cli.py add-rss` with its
+# URL turns it on.
+_DEFAULT_FEEDS = [
+    ("https://www.snopes.com/feed/",             "snopes",    "snopes",    None, 1),
+    ("https://www.dailymail.co.uk/articles.rss", "dailymail", "dailymail", 5,    0),
+]
+
+
+def ensure_feed_table(conn: sqlite3.Connection):
+    conn.execute(
+        f"""CREATE TABLE IF NOT EXISTS FEED (
+            feedId        INTEGER PRIMARY KEY AUTOINCREMENT,
+            feedUrl       TEXT NOT NULL UNIQUE,
+            feedGroup     TEXT NOT NULL,
+            feedExtractor TEXT NOT NULL DEFAULT 'summary',
+            feedLimit     INT,
+            feedCursor    TEXT,
+            feedCursorTs  REAL,
+            feedEtag      TEXT,
+            feedModified  TEXT,
+            feedInterval  REAL NOT NULL DEFAULT {FEED_DEFAULT_SEC},
+            feedNextPoll  REAL NOT NULL DEFAULT 0,
+            feedLastPoll  REAL,
+            feedEnabled   INT NOT NULL DEFAULT 1
+        )"""
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_feed_due ON FEED(feedNextPoll) "
+                 "WHERE feedEnabled = 1")
+    conn.executemany(
+        "INSERT OR IGNORE INTO FEED (feedUrl, feedGroup, feedExtractor, feedLimit, feedEnabled) "
+        "VALUES (?,?,?,?,?)", _DEFAULT_FEEDS,
+    )
+
+
+def add_feed(conn: sqlite3.Connection, url: str, group: str, extractor: str = "summary",
+             limit: int | None = None) -> int:
+    """Subscribe to *url* (or re-enable it) and make it due at once; returns feedId."""
+    if extractor not in FEED_EXTRACTORS:
+        raise ValueError(f"Unknown extractor {extractor!r}")
+    conn.execute(
+        """INSERT INTO FEED (feedUrl, feedGroup, feedExtractor, feedLimit) VALUES (?,?,?,?)
+           ON CONFLICT(feedUrl) DO UPDATE SET
+               feedGroup = excluded.feedGroup, feedExtractor = excluded.feedExtractor,
+               feedLimit = excluded.feedLimit, feedEnabled = 1, feedNextPoll = 0""",
+        (url, group, extractor, limit),
+    )
+    return conn.execute("SELECT feedId FROM FEED WHERE feedUrl = ?", (url,)).fetchone()[0]
+
+
+def feeds_due(conn: sqlite3.Connection, now: float | None = None) -> list[sqlite3.Row]:
+    """Enabled subscriptions whose next poll time has passed, most overdue first."""
+    conn.row_factory = sqlite3.Row
+    try:
+        return conn.execute(
+            "SELECT * FROM FEED WHERE feedEnabled = 1 AND feedNextPoll <= ? ORDER BY feedNextPoll",
+            (time.time() if now is None else now,),
+        ).fetchall()
+    finally:
+        conn.row_factory = None
+
+
+def any_feed_due(conn: sqlite3.Connection) -> bool:
+    """Cheap check for the idle tick: is any subscription due for a poll?"""
+    return conn.execute(
+        "SELECT 1 FROM FEED WHERE feedEnabled = 1 AND feedNextPoll <= ? LIMIT 1", (time.time(),)
+    ).fetchone() is not None
+
+
+def claim_feed(conn: sqlite3.Connection, feed_id: int, due: float, until: float) -> bool:
+    """Push a due feed's next poll to *until*; False if another worker got there first."""
+    cur = conn.execute(
+        "UPDATE FEED SET feedNextPoll = ? WHERE feedId = ? AND feedNextPoll = ?",
+        (until, feed_id, due),
+    )
+    conn.commit()
+    return cur.rowcount == 1
+
+
+def record_poll(conn: sqlite3.Connection, feed_id: int, interval: float, *,
+                cursor: str | None = None, cursor_ts: float | None = None,
+                etag: str | None = None, modified: str | None = None):
+    """Store a finished poll: new interval, next due time and (if given) cursor / validators."""
+    now = time.time()
+    conn.execute(
+        """UPDATE FEED SET feedInterval = ?, feedNextPoll = ?, feedLastPoll = ?,
+               feedCursor   = COALESCE(?, feedCursor),   feedCursorTs = COALESCE(?, feedCursorTs),
+               feedEtag     = COALESCE(?, feedEtag),     feedModified = COALESCE(?, feedModified)
+           WHERE feedId = ?""",
+        (interval, now + interval, now, cursor, cursor_ts, etag, modified, feed_id),
+    )
+    conn.commit()
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# LEASES
+# Several pipeline processes (or hosts sharing the DB) may work the same queue.
+# A worker claims a row by writing its id and an expiry into leaseOwner /
+# leaseExpiry with a guarded UPDATE, so exactly one claim wins.  Holders renew
+# their leases on a heartbeat; a lease whose expiry has passed is free again,
+# which is how work held by a crashed worker gets picked up.  Advancing a row
+# to its next state drops the lease.
+# ──────────────────────────────────────────────────────────────────────────────
+LEASE_TABLES = {"RSS": "rssId", "SEED": "seedId", "TASK": "taskId"}
+
+# Unix time, comparable with time.time() on the worker side
+_NOW       = "((julianday('now') - 2440587.5) * 86400.0)"
+LEASE_FREE = f"(leaseOwner IS NULL OR leaseExpiry < {_NOW})"
+_UNLEASE   = "leaseOwner = NULL, leaseExpiry = NULL"
+
+# Extra condition a row must still meet when it is claimed, so a row another
+# worker finished between our SELECT and our claim is not processed twice
+_CLAIMABLE = {
+    "RSS":  lambda state: "NOT EXISTS (SELECT 1 FROM SEED WHERE SEED.rssId = RSS.rssId)",
+    "SEED": lambda state: f"seedState = {int(state)}" if state is not None else "1",
+    "TASK": lambda state: f"taskState = {int(state)}" if state is not None else "1",
+}
+
+
+def ensure_lease_columns(conn: sqlite3.Connection):
+    for table in LEASE_TABLES:
+        for col, decl in (("leaseOwner", "TEXT"), ("leaseExpiry", "REAL")):
+            try:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} {decl}")
+            except sqlite3.OperationalError:
+                pass
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table.lower()}_lease "
+                     f"ON {table}(leaseOwner) WHERE leaseOwner IS NOT NULL")
+
+
+def claim_rows(conn: sqlite3.Connection, table: str, ids: list, worker: str,
+               ttl: float, state: int | None = None) -> list[int]:
+    """Lease the rows of *ids* that are free (or already ours) to *worker*.
+
+    With *state*, a row is only claimed while it is still waiting in that
+    state.  Returns the ids actually won, in input order.  Commits.
+    """
+    key   = LEASE_TABLES[table]
+    cond  = _CLAIMABLE[table](state)
+    until = time.time() + ttl
+    won   = []
+    for row_id in ids:
+        cur = conn.execute(
+            f"""UPDATE {table} SET leaseOwner = ?, leaseExpiry = ?
+                WHERE {key} = ? AND {cond}
+                AND (leaseOwner IS NULL OR leaseOwner = ? OR leaseExpiry < {_NOW})""",
+            (worker, until, row_id, worker),
+        )
+        if cur.rowcount:
+            won.append(row_id)
+    conn.commit()
+    return won
+
+
+def release_rows(conn: sqlite3.Connection, table: str, ids: list, worker: str):
+    """Drop *worker*'s leases on *ids* (rows it no longer holds are untouched)."""
+    key = LEASE_TABLES[table]
+    conn.executemany(
+        f"UPDATE {table} SET {_UNLEASE} WHERE {key} = ? AND leaseOwner = ?",
+        [(row_id, worker) for row_id in ids],
+    )
+    conn.commit()
+
+
+def renew_leases(conn: sqlite3.Connection, worker: str, ttl: float) -> int:
+    """Heartbeat: push out the expiry of every lease *worker* holds."""
+    until = time.time() + ttl
+    n = sum(conn.execute(f"UPDATE {table} SET leaseExpiry = ? WHERE leaseOwner = ?",
+                         (until, worker)).rowcount for table in LEASE_TABLES)
+    conn.commit()
+    return n
+
+
+def release_worker(conn: sqlite3.Connection, worker: str) -> int:
+    """Drop every lease *worker* holds (clean shutdown)."""
+    n = sum(conn.execute(f"UPDATE {table} SET {_UNLEASE} WHERE leaseOwner = ?",
+                         (worker,)).rowcount for table in LEASE_TABLES)
+    conn.commit()
+    return n
+
+
+def reclaim_expired(conn: sqlite3.Connection) -> int:
+    """Clear leases whose holder stopped renewing them; return how many."""
+    n = sum(conn.execute(f"UPDATE {table} SET {_UNLEASE} "
+                         f"WHERE leaseOwner IS NOT NULL AND leaseExpiry < {_NOW}").rowcount
+            for table in LEASE_TABLES)
+    conn.commit()
+    return n
+
+
+def lease_holders(conn: sqlite3.Connection) -> dict:
+    """Return {worker: live lease count} across all leased tables."""
+    holders = {}
+    for table in LEASE_TABLES:
+        for owner, n in conn.execute(
+            f"SELECT leaseOwner, COUNT(*) FROM {table} "
+            f"WHERE leaseOwner IS NOT NULL AND leaseExpiry >= {_NOW} GROUP BY leaseOwner"
+        ).fetchall():
+            holders[owner] = holders.get(owner, 0) + n
+    return holders
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# SPANS  (written by modules.trace, read by `cli.py profile`)
+# ──────────────────────────────────────────────────────────────────────────────
+def ensure_span_table(conn: sqlite3.Connection):
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS SPAN (
+            spanId   TEXT PRIMARY KEY,
+            parentId TEXT,
+            traceId  TEXT NOT NULL,
+            stage    TEXT,
+            name     TEXT NOT NULL,
+            seedId   INT,
+            taskId   INT,
+            startTs  REAL NOT NULL,
+            endTs    REAL NOT NULL,
+            durMs    REAL NOT NULL,
+            ok       INT NOT NULL DEFAULT 1,
+            detail   TEXT
+        )"""
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_span_seed  ON SPAN(seedId, startTs)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_span_trace ON SPAN(traceId)")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# STAGE COUNTERS
+# STAGE_COUNT holds one row per stage with its current backlog.  Triggers on
+# RSS / SEED / TASK keep it exact, so the idle cron tick reads ten integers
+# instead of scanning the whole history.
+# ──────────────────────────────────────────────────────────────────────────────
+def _stage_of(mapping: dict, state: str) -> str:
+    whens = " ".join(f"WHEN {k} THEN '{v}'" for k, v in mapping.items())
+    return f"(CASE {state} {whens} END)"
+
+
+def _move(mapping: dict, new: str | None, old: str | None) -> str:
+    """UPDATE counting a row into its NEW state's stage and out of its OLD one."""
+    plus  = f"COALESCE(stage = {_stage_of(mapping, new)}, 0)" if new else "0"
+    minus = f"COALESCE(stage = {_stage_of(mapping, old)}, 0)" if old else "0"
+    names = ", ".join(f"'{v}'" for v in mapping.values())
+    return f"UPDATE STAGE_COUNT SET pending = pending + {plus} - {minus} WHERE stage IN ({names});"
+
+
+def _feed(delta: str) -> str:
+    return f"UPDATE STAGE_COUNT SET pending = pending + ({delta}) WHERE stage = 'feed';"
+
+
+def _first_seed_of(rss: str) -> str:
+    """1 if RSS row *rss* exists and exactly one seed now references it."""
+    return (f"COALESCE({rss} IS NOT NULL AND EXISTS (SELECT 1 FROM RSS WHERE rssId = {rss})"
+            f" AND (SELECT COUNT(*) FROM SEED WHERE rssId = {rss}) = 1, 0)")
+
+
+def _rss_orphan(rss: str) -> str:
+    """1 if RSS row *rss* exists and no seed references it."""
+    return (f"COALESCE(EXISTS (SELECT 1 FROM RSS WHERE rssId = {rss}) "
+            f"AND NOT EXISTS (SELECT 1 FROM SEED WHERE rssId = {rss}), 0)")
+
+
+def _counter_triggers() -> list[str]:
+    T, S = TASK_STATE_STAGE, SEED_STATE_STAGE
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS trg_stage_task_ins AFTER INSERT ON TASK BEGIN
+            {_move(T, "NEW.taskState", None)}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_stage_task_del AFTER DELETE ON TASK BEGIN
+            {_move(T, None, "OLD.taskState")}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_stage_task_upd AFTER UPDATE OF taskState ON TASK
+            WHEN OLD.taskState IS NOT NEW.taskState BEGIN
+            {_move(T, "NEW.taskState", "OLD.taskState")}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_stage_seed_ins AFTER INSERT ON SEED BEGIN
+            {_move(S, "NEW.seedState", None)}
+            {_feed("-" + _first_seed_of("NEW.rssId"))}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_stage_seed_del AFTER DELETE ON SEED BEGIN
+            {_move(S, None, "OLD.seedState")}
+            {_feed(_rss_orphan("OLD.rssId"))}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_stage_seed_upd AFTER UPDATE OF seedState ON SEED
+            WHEN OLD.seedState IS NOT NEW.seedState BEGIN
+            {_move(S, "NEW.seedState", "OLD.seedState")}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_stage_seed_rss AFTER UPDATE OF rssId ON SEED
+            WHEN OLD.rssId IS NOT NEW.rssId BEGIN
+            {_feed(_rss_orphan("OLD.rssId") + " - " + _first_seed_of("NEW.rssId"))}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_stage_rss_ins AFTER INSERT ON RSS BEGIN
+            {_feed("NOT EXISTS (SELECT 1 FROM SEED WHERE rssId = NEW.rssId)")}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_stage_rss_del AFTER DELETE ON RSS BEGIN
+            {_feed("-(NOT EXISTS (SELECT 1 FROM SEED WHERE rssId = OLD.rssId))")}
+        END""",
+    ]
+
+
+def _recount_sql() -> dict:
+    """Full-scan definition of each backlog — used to backfill STAGE_COUNT."""
+    sql = {"feed": "SELECT COUNT(*) FROM RSS WHERE rssId NOT IN "
+                   "(SELECT DISTINCT rssId FROM SEED WHERE rssId IS NOT NULL)"}
+    for state, stage in TASK_STATE_STAGE.items():
+        sql[stage] = f"SELECT COUNT(*) FROM TASK WHERE taskState = {state}"
+    for state, stage in SEED_STATE_STAGE.items():
+        sql[stage] = f"SELECT COUNT(*) FROM SEED WHERE seedState = {state}"
+    return sql
+
+
+def recount_stages(conn: sqlite3.Connection):
+    """Rebuild STAGE_COUNT from full table scans (one-off repair/backfill)."""
+    for stage, sql in _recount_sql().items():
+        n = conn.execute(sql).fetchone()[0]
+        conn.execute(
+            "INSERT INTO STAGE_COUNT (stage, pending) VALUES (?, ?) "
+            "ON CONFLICT(stage) DO UPDATE SET pending=excluded.pending",
+            (stage, n),
+        )
+
+
+def ensure_stage_counters(conn: sqlite3.Connection) -> bool:
+    """Create state columns, STAGE_COUNT and its triggers; backfill when needed.
+
+    Returns True when the counters were (re)populated.
+    """
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS STAGE_COUNT ("
+        "stage TEXT PRIMARY KEY, pending INTEGER NOT NULL DEFAULT 0)"
+    )
+    # The triggers look rows up by seed / rss, so these must be seeks
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_task_seed ON TASK(seedId)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_seed_rss  ON SEED(rssId)")
+    stale = _state_columns(conn)
+    # Counters used to be derived from the timestamp columns
+    for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='trigger' AND name LIKE 'trg_count_%'"
+    ).fetchall():
+        conn.execute(f"DROP TRIGGER {name}")
+        stale = True
+    for ddl in _counter_triggers():
+        conn.execute(ddl)
+    if stale or conn.execute("SELECT COUNT(*) FROM STAGE_COUNT").fetchone()[0] < len(STAGES):
+        recount_stages(conn)
+        return True
+    return False
+
+
+def stage_snapshot(conn: sqlite3.Connection) -> dict:
+    """Return {stage: pending} for every stage from a single query."""
+    snap = dict.fromkeys(STAGES, 0)
+    snap.update(conn.execute("SELECT stage, pending FROM STAGE_COUNT").fetchall())
+    return snap
@@ -1,7 +1,18 @@
 from .config import *
+from .config import llm_fingerprint
+from .admission import admission_slots
+from .cache import DiskLRU, cache_key
+from .db import claim_feed, feeds_due, insert_rss, known_links, record_poll
+from .fetch import fetch, fetch_many
+from .lease import lease
+from .trace import attach_seed, span
+
+import calendar
+import contextlib
+import functools
+import statistics
 
 import feedparser
-import requests
 from bs4 import BeautifulSoup
 
 
@@ -14,161 +25,372 @@ def _clean_text(html_text: str) -> str:
     return text.strip()
 
 
+_llm_cache = DiskLRU(LLM_CACHE_DIR, LLM_CACHE_MB * 1024 ** 2, "llm")
+_session   = threading.local()    # .stack: ExitStack of the open _llm_session(), .llm once pinned
+
+
+@contextlib.contextmanager
+def _llm_session():
+    """Keep the model pinned from its first use in the block until the block ends.
+
+    The model is loaded only once a reply is not in the response cache, so a
+    batch answered entirely from the cache never loads it.
+    """
+    _session.stack, _session.llm = contextlib.ExitStack(), None
+    try:
+        with _session.stack:
+            yield
+    finally:
+        _session.stack = _session.llm = None
+
+
+@contextlib.contextmanager
+def _llm():
+    """The model, pinned for the block (or the enclosing _llm_session())."""
+    stack = getattr(_session, "stack", None)
+    if stack is None:
+        with using("llm") as llm:
+            yield llm
+        return
+    if _session.llm is None:
+        _session.llm = stack.enter_context(using("llm"))
+    yield _session.llm
+
+
 def _llm_chat(prompt: str, schema: dict | None = None,
-              max_tokens: int = 2048, temperature: float = 0.7) -> str:
+              max_tokens: int = 2048, temperature: float = 0.7,
+              system: str | None = None, refresh: bool = False) -> str:
     """Send a chat message and return the raw string reply.
 
     If *schema* is provided the model is constrained to emit valid JSON
-    matching that JSON-Schema (llama.cpp grammar mode).
+    matching that JSON-Schema (llama.cpp grammar mode).  Fixed instructions
+    belong in *system*: they come first in the rendered prompt, so the
+    prefix cache set up by _get_llm() only has to evaluate *prompt*.
+
+    Replies are kept in the on-disk response cache (unless LLM_CACHE is off);
+    a repeat of the same model, prompt, schema and sampling settings returns
+    without loading the model.  *refresh* skips the lookup and overwrites the
+    entry — retries after a rejected reply use it.
     """
-    fmt = {"type": "json_object"}
-    if schema:
-        fmt["schema"] = schema          # llama-cpp-python ≥ 0.2.76
-
-    resp = _get_llm().create_chat_completion(
-        messages=[{"role": "user", "content": prompt}],
-        response_format=fmt if schema else None,
-        max_tokens=max_tokens,
-        temperature=temperature,
-    )
-    return resp["choices"][0]["message"]["content"]
-
-
-def feed_fetch_snopes():
-    """Fetch Snopes RSS, parse full article text, insert new rows into RSS table."""
-    log.info("[feed] Fetching Snopes RSS")
-    feed = feedparser.parse("https://www.snopes.com/feed/")
-    if feed.bozo:
-        log.warning(f"[feed] Feed error: {feed.bozo_exception}")
-        return
+    key = None
+    if LLM_CACHE:
+        key = cache_key(llm_fingerprint(), system, prompt, schema, temperature, max_tokens)
+        if not refresh:
+            hit = _llm_cache.get(key)
+            if hit is not None:
+                log.debug("[llm] response cache hit")
+                return hit.decode()
+
+    with _llm() as llm, GPU_LOCK, span("llm.chat", max_tokens=max_tokens, schema=bool(schema)) as sp:
+        chunks = llm.create_chat_completion(
+            messages=([{"role": "system", "content": system}] if system else [])
+                     + [{"role": "user", "content": prompt}],
+            grammar=_grammar(schema) if schema else None,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+        )
+        text, aborted = _read_stream(chunks)
+        if aborted:
+            sp.detail["aborted"] = aborted
+    if key and not aborted:
+        _llm_cache.put(key, text.encode())
+    return text
+
+
+@functools.lru_cache(maxsize=32)
+def _compiled_grammar(schema_json: str):
+    from llama_cpp import LlamaGrammar
+    return LlamaGrammar.from_json_schema(schema_json, verbose=False)
+
+
+def _grammar(schema: dict):
+    """llama.cpp grammar for *schema*, compiled once per distinct schema."""
+    return _compiled_grammar(json.dumps(schema, sort_keys=True))
+
+
+# ── Stream guard ──────────────────────────────────────────────────────────────
+# The grammar keeps replies well-formed but not sane: a model can loop on one
+# phrase or never close a string until max_tokens.  The reply is checked every
+# _GUARD_EVERY tokens and abandoned as soon as it goes that way; the caller
+# keeps whatever scenes were complete (see _salvage_scenes).
+_GUARD_EVERY     = 16
+_LOOP_WINDOW     = 600     # chars of tail searched for a repeating phrase
+_LOOP_PROBE      = 40
+_LOOP_REPEATS    = 4
+_MAX_FIELD_CHARS = 1500    # longest plausible single string value
+
+
+def _runaway(text: str) -> str | None:
+    """Why a partial reply should be abandoned, or None while it looks fine."""
+    tail = text[-_LOOP_WINDOW:]
+    if len(tail) == _LOOP_WINDOW and tail.count(tail[-_LOOP_PROBE:]) >= _LOOP_REPEATS:
+        return "repeating itself"
+    if len(text) - text.rfind('"') > _MAX_FIELD_CHARS:
+        return "runaway string"
+    return None
+
+
+def _read_stream(chunks) -> tuple[str, str | None]:
+    """Join a streamed completion; (text, reason) if the guard cut it short."""
+    text = ""
+    for i, chunk in enumerate(chunks, 1):
+        text += chunk["choices"][0]["delta"].get("content") or ""
+        if i % _GUARD_EVERY == 0:
+            why = _runaway(text)
+            if why:
+                chunks.close()
+                log.warning(f"[llm] Aborted reply after {len(text)} chars: {why}")
+                return text, why
+    return text, None
+
+
+def _new_entries(conn, entries: list) -> list:
+    """Feed entries whose link has not been ingested yet."""
+    links = [e.get("link") for e in entries if e.get("link")]
+    known = known_links(conn, links)
+    return [e for e in entries if e.get("link") and e["link"] not in known]
+
 
+def _insert_article(conn, group: str, text: str, entry) -> bool:
+    """Insert one article unless it (nearly) repeats a stored one; True if inserted."""
+    published = entry.get("published", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    rss_id, dup = insert_rss(conn, group, text, published, entry.get("link"))
+    if dup is not None:
+        log.info(f"[feed] {group}: skipped {entry.get('link')} — duplicate of RSS {dup}")
+    return rss_id is not None
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# EXTRACTORS
+# FEED.feedExtractor names one of these.  Each turns a feed entry (plus its
+# article page, for extractors in _NEEDS_PAGE) into article text, or None to
+# skip the entry.
+# ──────────────────────────────────────────────────────────────────────────────
+def _extract_summary(entry, _page) -> str | None:
+    """Title + summary straight from the feed, no page download."""
+    summary = entry.get("summary") or entry.get("description") or ""
+    summary = BeautifulSoup(summary, "html.parser").get_text(separator=" ", strip=True)
+    return f"{entry.get('title', '')}\n\n{summary}".strip() or None
+
+
+def _extract_snopes(_entry, page) -> str | None:
+    el = BeautifulSoup(page.text, "html.parser").select_one("#article-content")
+    return _clean_text(el.get_text(strip=True)) if el else None
+
+
+def _extract_dailymail(entry, page) -> str | None:
+    soup = BeautifulSoup(page.content, "html.parser")
+    title = entry.get("title", "").strip()
+    content = ""
+    el = soup.select_one("#content > div.articleWide.cleared > div.alpha")
+    if el:
+        content = el.get_text(separator=" ", strip=True)
+    else:
+        for cls in ["content-inner", "entry-content", "article-content", "post-content"]:
+            el = soup.find(class_=cls)
+            if el:
+                content = el.get_text(separator=" ", strip=True)
+                break
+    if not content:
+        desc = entry.get("description", "") or entry.get("summary", "")
+        content = BeautifulSoup(desc, "html.parser").get_text(separator=" ", strip=True)
+    text = _clean_text(f"{title} {content}")
+    return text if len(text) >= 20 else None
+
+
+EXTRACTORS = {"summary": _extract_summary, "snopes": _extract_snopes,
+              "dailymail": _extract_dailymail}
+_NEEDS_PAGE = {"snopes", "dailymail"}
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# POLLER
+# Only feeds whose FEED.feedNextPoll has passed are fetched; only entries newer
+# than the feed's cursor reach the extractor.  After each poll the interval is
+# pulled toward FEED_POLL_FACTOR × the feed's typical gap between posts, so a
+# feed that posts hourly is checked about every half hour and one that posts
+# weekly drifts out to FEED_MAX_POLL_SEC.
+# ──────────────────────────────────────────────────────────────────────────────
+def _entry_ts(entry) -> float | None:
+    st = entry.get("published_parsed") or entry.get("updated_parsed")
+    return float(calendar.timegm(st)) if st else None
+
+
+def _entry_guid(entry) -> str | None:
+    return entry.get("id") or entry.get("link")
+
+
+def _since_cursor(entries: list, cursor: str | None, cursor_ts: float | None) -> list:
+    """Entries published after the cursor (feeds list newest first)."""
+    out = []
+    for e in entries:
+        if cursor and _entry_guid(e) == cursor:
+            break
+        ts = _entry_ts(e)
+        if cursor_ts and ts and ts <= cursor_ts:
+            continue
+        out.append(e)
+    return out
+
+
+def _newest(entries: list):
+    dated = [e for e in entries if _entry_ts(e)]
+    return max(dated, key=_entry_ts) if dated else entries[0]
+
+
+def _next_interval(prev: float, entries: list, found: int) -> float:
+    """Poll interval adapted to the publish rate seen in *entries*."""
+    stamps = sorted(ts for ts in map(_entry_ts, entries) if ts)[-10:]
+    if len(stamps) >= 2:
+        gaps = [b - a for a, b in zip(stamps, stamps[1:]) if b > a]
+        # Time since the last post counts too, so a feed that went quiet slows down
+        gaps.append(max(0.0, time.time() - stamps[-1]))
+        target = statistics.median(gaps) * FEED_POLL_FACTOR
+    else:
+        target = prev / 2 if found else prev * 2
+    interval = (prev + target) / 2
+    return min(max(interval, FEED_MIN_POLL_SEC), FEED_MAX_POLL_SEC)
+
+
+def _record_poll(feed_id: int, interval: float, **kw):
     conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    new = 0
-    for entry in feed.entries:
-        try:
-            link = entry.get("link")
-            if not link:
-                continue
-            r = requests.get(link, timeout=10)
-            if r.status_code != 200:
-                continue
-            soup = BeautifulSoup(r.text, "html.parser")
-            el = soup.select_one("#article-content")
-            if not el:
-                continue
-            text = _clean_text(el.get_text(strip=True))
-            c.execute("SELECT rssId FROM RSS WHERE rssText = ?", (text,))
-            if c.fetchone():
-                continue
-            published = entry.get("published", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-            c.execute(
-                "INSERT INTO RSS (rssGroup, rssText, rssStamp) VALUES (?,?,?)",
-                ("snopes", text, published),
-            )
-            conn.commit()
-            new += 1
-        except Exception as e:
-            log.error(f"[feed] Entry error: {e}")
+    record_poll(conn, feed_id, interval, **kw)
     conn.close()
-    log.info(f"[feed] Inserted {new} new Snopes entries")
 
 
-def feed_fetch_news():
-    """Fetch Daily Mail RSS (first 5 items) and insert into RSS table."""
-    log.info("[feed] Fetching news RSS")
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-    }
-    try:
-        r = requests.get("https://www.dailymail.co.uk/articles.rss", headers=headers, timeout=10)
-        if r.status_code != 200:
-            log.warning("[feed] Daily Mail feed unavailable")
-            return False
-        feed = feedparser.parse(r.content)
-        if not feed.entries:
-            return False
-    except Exception as e:
-        log.error(f"[feed] News feed error: {e}")
-        return False
+def _poll_feed(row, page) -> int:
+    """Ingest new entries from one fetched feed; returns the number inserted."""
+    name, feed_id = row["feedGroup"], row["feedId"]
+    if page is None:
+        log.warning(f"[feed] {name}: feed unavailable")
+        _record_poll(feed_id, row["feedInterval"])
+        return 0
+    if not page.fresh:
+        log.info(f"[feed] {name}: not modified")
+        _record_poll(feed_id, _next_interval(row["feedInterval"], [], 0),
+                       etag=page.etag, modified=page.modified)
+        return 0
+
+    feed = feedparser.parse(page.content)
+    if feed.bozo and not feed.entries:
+        log.warning(f"[feed] {name}: feed error: {feed.bozo_exception}")
+        _record_poll(feed_id, row["feedInterval"])
+        return 0
 
     conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    new = 0
-    for entry in feed.entries[:5]:
+    entries = _since_cursor(feed.entries, row["feedCursor"], row["feedCursorTs"])
+    if row["feedLimit"]:
+        entries = entries[:row["feedLimit"]]
+    entries = _new_entries(conn, entries)
+    log.info(f"[feed] {name}: {len(entries)} new of {len(feed.entries)} items")
+
+    extractor = EXTRACTORS[row["feedExtractor"]]
+    # Article links are new by construction, so there is nothing to revalidate later
+    pages = (fetch_many([e["link"] for e in entries], cache=False)
+             if row["feedExtractor"] in _NEEDS_PAGE else {})
+    new, missed = 0, 0
+    for entry in entries:
         try:
-            link = entry.get("link")
-            if not link:
-                continue
-            ar = requests.get(link, headers=headers, timeout=10)
-            if ar.status_code != 200:
+            art = pages.get(entry["link"])
+            if row["feedExtractor"] in _NEEDS_PAGE and art is None:
+                missed += 1
                 continue
-            soup = BeautifulSoup(ar.content, "html.parser")
-            title = entry.get("title", "").strip()
-            content = ""
-            el = soup.select_one("#content > div.articleWide.cleared > div.alpha")
-            if el:
-                content = el.get_text(separator=" ", strip=True)
-            else:
-                for cls in ["content-inner", "entry-content", "article-content", "post-content"]:
-                    el = soup.find(class_=cls)
-                    if el:
-                        content = el.get_text(separator=" ", strip=True)
-                        break
-            if not content:
-                desc = entry.get("description", "") or entry.get("summary", "")
-                content = BeautifulSoup(desc, "html.parser").get_text(separator=" ", strip=True)
-            text = _clean_text(f"{title} {content}")
-            if len(text.strip()) < 20:
-                continue
-            c.execute("SELECT rssId FROM RSS WHERE rssText = ?", (text,))
-            if c.fetchone():
-                continue
-            published = entry.get("published", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-            c.execute(
-                "INSERT INTO RSS (rssGroup, rssText, rssStamp) VALUES (?,?,?)",
-                ("dailymail", text, published),
-            )
-            conn.commit()
-            new += 1
+            text = extractor(entry, art)
+            if text and _insert_article(conn, name, text, entry):
+                conn.commit()
+                new += 1
         except Exception as e:
-            log.error(f"[feed] News entry error: {e}")
+            log.error(f"[feed] {name}: entry error: {e}")
     conn.close()
-    log.info(f"[feed] Inserted {new} new news entries")
-    return new > 0
 
+    # A failed article download keeps the old cursor so the next poll retries
+    # it; links already ingested are skipped by _new_entries either way.
+    head = _newest(feed.entries) if feed.entries and not missed else None
+    _record_poll(feed_id, _next_interval(row["feedInterval"], feed.entries, new),
+                   cursor=_entry_guid(head) if head else None,
+                   cursor_ts=_entry_ts(head) if head else None,
+                   etag=page.etag, modified=page.modified)
+    log.info(f"[feed] {name}: inserted {new} entries")
+    return new
 
-def feed_get_unprocessed_rss():
-    """Return the first RSS entry not yet in the seed table, or None."""
+
+def _validators(row) -> dict:
+    hdrs = {}
+    if row["feedEtag"]:
+        hdrs["If-None-Match"] = row["feedEtag"]
+    if row["feedModified"]:
+        hdrs["If-Modified-Since"] = row["feedModified"]
+    return hdrs
+
+
+def feed_poll() -> int:
+    """Poll every subscription that is due; returns the number of articles inserted."""
     conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("""
-        SELECT rss.rssId, rss.rssGroup, rss.rssText, rss.rssStamp
-        FROM rss LEFT JOIN seed ON rss.rssId = seed.rssId
-        WHERE seed.rssId IS NULL LIMIT 1
-    """)
-    row = c.fetchone()
+    now  = time.time()
+    rows = [r for r in feeds_due(conn, now)
+            if r["feedExtractor"] in EXTRACTORS
+            and claim_feed(conn, r["feedId"], r["feedNextPoll"], now + r["feedInterval"])]
     conn.close()
-    if not row:
-        log.info("[feed] No unprocessed RSS entries")
-        return None
-    rss_id, rss_group, rss_text, rss_stamp = row
+    if not rows:
+        log.info("[feed] No feeds due")
+        return 0
+
+    log.info(f"[feed] Polling {len(rows)} feed(s): " + ", ".join(r["feedGroup"] for r in rows))
+    # The validators stored with each subscription make the poll conditional even
+    # when the HTTP cache is off or has evicted the feed; a 304 then has no body
+    # and _poll_feed treats it as not modified
+    validators = {r["feedUrl"]: _validators(r) for r in rows}
+    pages = fetch_many([r["feedUrl"] for r in rows], per_url=validators)
+    return sum(_poll_feed(r, pages.get(r["feedUrl"])) for r in rows)
+
+
+def _rss_row_to_entry(row) -> dict:
+    rss_id, rss_group, rss_text, rss_stamp, rss_digest = row
     try:
         parsed = json.loads(rss_text)
         rss_text = parsed[:5]
     except json.JSONDecodeError:
         pass
-    return {"rssId": rss_id, "rssGroup": rss_group, "rssText": rss_text, "rssStamp": rss_stamp}
+    return {"rssId": rss_id, "rssGroup": rss_group, "rssText": rss_text, "rssStamp": rss_stamp,
+            "rssDigest": rss_digest}
 
 
-def feed_process_rss_to_seed(rss_entry: dict, max_retries: int = 3):
-    """Use Ollama/LLaMA to build 6 scenes from the RSS text, insert seed+scene+task rows."""
-    if not rss_entry:
-        return
-    attribute = rss_entry["rssText"]
-    prompt = f"""Generate a surprising YouTube video script from this text: '{attribute}'.
-IMPORTANT REQUIREMENTS:
+def feed_get_unprocessed_batch(limit: int) -> list[dict]:
+    """Return up to *limit* unleased RSS entries not yet in the seed table, oldest first."""
+    conn = sqlite3.connect(DB_PATH)
+    rows = conn.execute("""
+        SELECT rss.rssId, rss.rssGroup, rss.rssText, rss.rssStamp, rss.rssDigest
+        FROM rss LEFT JOIN seed ON rss.rssId = seed.rssId
+        WHERE seed.rssId IS NULL AND (rss.leaseOwner IS NULL OR rss.leaseExpiry < ?)
+        ORDER BY rss.rssId LIMIT ?
+    """, (time.time(), max(1, limit))).fetchall()
+    conn.close()
+    return [_rss_row_to_entry(r) for r in rows]
+
+
+def feed_get_unprocessed_rss():
+    """Return the first RSS entry not yet in the seed table, or None."""
+    batch = feed_get_unprocessed_batch(1)
+    if not batch:
+        log.info("[feed] No unprocessed RSS entries")
+        return None
+    return batch[0]
+
+
+def feed_get_rss_entry(rss_id: int):
+    """Return one RSS entry by id, or None."""
+    conn = sqlite3.connect(DB_PATH)
+    row = conn.execute(
+        "SELECT rssId, rssGroup, rssText, rssStamp, rssDigest FROM rss WHERE rssId=?", (rss_id,)
+    ).fetchone()
+    conn.close()
+    return _rss_row_to_entry(row) if row else None
+
+
+GENRES = ["bright", "calm", "dark", "dramatic", "funky", "happy", "inspirational", "sad"]
+
+_SCENE_RULES = """IMPORTANT REQUIREMENTS:
 1. The output MUST have EXACTLY 6 scenes — no more, no less.
 2. Each scene MUST be a separate object in a JSON array.
 3. Each 'scene' object MUST have:
@@ -177,103 +399,283 @@ IMPORTANT REQUIREMENTS:
    - Key 'text'  with value as narration text for the scene
 4. The 6th scene MUST be a creative way to say 'subscribe and like our video'
 """
-    retry, validated = 0, None
 
-    while retry < max_retries:
-        try:
-            raw = _llm_chat(prompt, schema=SceneList.model_json_schema())
-            data = SceneList.model_validate_json(raw)
-            if len(data.scenes) == 6 and sorted(s.scene for s in data.scenes) == list(range(1, 7)):
-                validated = data
+# Instruction blocks go in the system message and the article in the user
+# message, so every prompt of a kind shares a long token prefix.
+_SCENES_SYSTEM = f"Generate a surprising YouTube video script from the user's text.\n{_SCENE_RULES}"
+_TITLE_SYSTEM  = ("I want YouTube video title and description in JSON format only "
+                  "from the user's text. Do not include any text or explanations.")
+_GENRE_SYSTEM  = (f"I want YouTube video background music for the user's text. "
+                  f"Choose one of: {' | '.join(GENRES)}.")
+_REPAIR_SYSTEM = (f"You are completing a 6-scene YouTube video script built from the user's text.\n"
+                  f"{_SCENE_RULES}Write only the scenes the user asks for, so that they fit "
+                  f"with the scenes already written.")
+_DRAFT_SYSTEM  = f"""Generate a surprising YouTube video from the user's text.
+Return one JSON object with these keys:
+- 'scenes': the video script as a list of scene objects.
+- 'title': a catchy YouTube video title.
+- 'description': the YouTube video description.
+- 'genre': background music for the video, one of: {' | '.join(GENRES)}.
+{_SCENE_RULES}"""
+
+
+def _article(rss_entry: dict) -> str:
+    return f"Text: '{rss_entry.get('rssDigest') or rss_entry['rssText']}'"
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# DIGEST
+# Every prompt carries the article, so a long one would overflow LLAMA_N_CTX
+# or make prefill the slowest part of the call.  An article over
+# FEED_ARTICLE_TOKENS is split at sentence ends into FEED_CHUNK_TOKENS
+# pieces, each piece is summarised (map) and the joined summaries are
+# summarised again until they fit the budget (reduce).  The digest is stored
+# in RSS.rssDigest, so a retried entry never summarises twice.
+# ──────────────────────────────────────────────────────────────────────────────
+_DIGEST_SYSTEM = ("Summarise the user's text as plain prose for a short video script. "
+                  "Keep names, places, numbers, quotes, claims and how the story ends; "
+                  "drop everything else. Do not add anything that is not in the text.")
+_DIGEST_ROUNDS      = 3
+_MIN_SUMMARY_TOKENS = 96
+_SENTENCE_END       = re.compile(r"(?<=[.!?])\s+")
+
+
+def _tokens(text: str) -> list[int]:
+    with _llm() as llm:
+        return llm.tokenize(text.encode(), add_bos=False)
+
+
+def _detokenize(tokens: list[int]) -> str:
+    with _llm() as llm:
+        return llm.detokenize(tokens).decode("utf-8", errors="ignore")
+
+
+def _chunks(text: str, limit: int) -> list[str]:
+    """Split *text* at sentence ends into pieces of at most *limit* tokens.
+
+    A single sentence longer than *limit* is cut at token boundaries.
+    """
+    pieces, cur, cur_n = [], [], 0
+
+    def flush():
+        nonlocal cur, cur_n
+        if cur:
+            pieces.append(" ".join(cur))
+        cur, cur_n = [], 0
+
+    for sentence in _SENTENCE_END.split(text):
+        toks = _tokens(sentence)
+        while len(toks) > limit:
+            flush()
+            pieces.append(_detokenize(toks[:limit]))
+            toks = toks[limit:]
+            sentence = _detokenize(toks)
+        if cur_n + len(toks) > limit:
+            flush()
+        if toks:
+            cur.append(sentence)
+            cur_n += len(toks)
+    flush()
+    return pieces
+
+
+def _summarise(text: str, max_tokens: int) -> str:
+    try:
+        return _llm_chat(f"In at most {max_tokens * 3 // 4} words:\n{text}",
+                         max_tokens=max_tokens, temperature=0.2, system=_DIGEST_SYSTEM).strip()
+    except Exception as e:
+        log.error(f"[feed] LLM summary error: {e}")
+        return ""
+
+
+def feed_digest(rss_entry: dict) -> str | None:
+    """The article as prompted: None if it fits FEED_ARTICLE_TOKENS, else its digest."""
+    if rss_entry.get("rssDigest"):
+        return rss_entry["rssDigest"]
+    text = rss_entry["rssText"]
+    # Prose runs about four characters a token; text under two per budgeted
+    # token fits without loading the model just to count it
+    if not isinstance(text, str) or len(text) <= FEED_ARTICLE_TOKENS * 2:
+        return None
+    size = len(_tokens(text))
+    if size <= FEED_ARTICLE_TOKENS:
+        return None
+
+    with span("feed.digest", tokens=size) as sp:
+        digest = text
+        for rnd in range(_DIGEST_ROUNDS):
+            parts = _chunks(digest, FEED_CHUNK_TOKENS)
+            share = max(_MIN_SUMMARY_TOKENS, FEED_ARTICLE_TOKENS // len(parts))
+            summary = "\n".join(s for s in (_summarise(p, share) for p in parts) if s)
+            if not summary:
+                if rnd == 0:
+                    # Nothing to store; prompt with the article's opening instead
+                    sp.ok = False
+                    return _detokenize(_tokens(text)[:FEED_ARTICLE_TOKENS])
                 break
-            log.warning(f"[feed] Got {len(data.scenes)} scenes, expected 6. Retry {retry+1}")
+            digest = summary
+            size   = len(_tokens(digest))
+            log.info(f"[feed] RSS {rss_entry['rssId']}: round {rnd + 1} summarised "
+                     f"{len(parts)} chunk(s) to {size} tokens")
+            if size <= FEED_ARTICLE_TOKENS:
+                break
+        if size > FEED_ARTICLE_TOKENS:
+            digest = _detokenize(_tokens(digest)[:FEED_ARTICLE_TOKENS])
+            log.warning(f"[feed] RSS {rss_entry['rssId']}: digest cut to {FEED_ARTICLE_TOKENS} tokens")
+        sp.detail["digest_tokens"] = min(size, FEED_ARTICLE_TOKENS)
+
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    with conn:
+        conn.execute("UPDATE RSS SET rssDigest=? WHERE rssId=?", (digest, rss_entry["rssId"]))
+    conn.close()
+    return digest
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# SCENES
+# The grammar fixes the shape: exactly the requested scene numbers, in order,
+# each with image and text.  What it cannot rule out (an empty field, a reply
+# cut short by the stream guard) is repaired by asking only for the scenes
+# that are missing, with the good ones given as context.
+# ──────────────────────────────────────────────────────────────────────────────
+SCENE_COUNT = 6
+
+
+def _scenes_schema(numbers) -> dict:
+    """JSON schema for an array holding exactly scenes *numbers*, in that order."""
+    def item(n):
+        return {"type": "object",
+                "properties": {"scene": {"type": "integer", "const": n},
+                               "image": {"type": "string"},
+                               "text":  {"type": "string"}},
+                "required": ["scene", "image", "text"]}
+    numbers = list(numbers)
+    return {"type": "array", "prefixItems": [item(n) for n in numbers],
+            "minItems": len(numbers), "maxItems": len(numbers)}
+
+
+def _scenes_reply_schema(numbers) -> dict:
+    return {"type": "object", "properties": {"scenes": _scenes_schema(numbers)},
+            "required": ["scenes"]}
+
+
+_DRAFT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "scenes":      _scenes_schema(range(1, SCENE_COUNT + 1)),
+        "title":       {"type": "string"},
+        "description": {"type": "string"},
+        "genre":       {"type": "string", "enum": GENRES},
+    },
+    "required": ["scenes", "title", "description", "genre"],
+}
+
+
+def _good_scene(obj) -> SceneInfo | None:
+    try:
+        sc = SceneInfo.model_validate(obj)
+    except ValidationError:
+        return None
+    if 1 <= sc.scene <= SCENE_COUNT and sc.image.strip() and sc.text.strip():
+        return sc
+    return None
+
+
+_SCENE_START = re.compile(r'\{\s*"scene"')
+
+
+def _salvage_scenes(raw: str) -> dict:
+    """{number: SceneInfo} for every complete, valid scene object in *raw*.
+
+    Works on truncated or otherwise unparsable replies: each scene object is
+    decoded on its own, and the first valid object for a number wins.
+    """
+    found, dec, pos = {}, json.JSONDecoder(), 0
+    while True:
+        m = _SCENE_START.search(raw, pos)
+        if not m:
+            return found
+        pos = m.start()
+        try:
+            obj, end = dec.raw_decode(raw, pos)
+        except ValueError:
+            pos += 1
+            continue
+        sc = _good_scene(obj)
+        if sc and sc.scene not in found:
+            found[sc.scene] = sc
+        pos = end
+
+
+def feed_generate_scenes(rss_entry: dict, have: dict | None = None, max_rounds: int = 3) -> list | None:
+    """Fill in every scene missing from *have* ({number: SceneInfo}).
+
+    Each round asks only for the missing numbers.  Returns the 6 scenes in
+    order, or None if some are still missing after *max_rounds*.
+    """
+    have = dict(have or {})
+    for attempt in range(max_rounds):
+        missing = [n for n in range(1, SCENE_COUNT + 1) if n not in have]
+        if not missing:
+            break
+        if have:
+            log.info(f"[feed] Repairing scene(s) {missing}")
+            system = _REPAIR_SYSTEM
+            prompt = (f"{_article(rss_entry)}\n"
+                      f"Scenes already written: {json.dumps([have[n].model_dump() for n in sorted(have)])}\n"
+                      f"Write scene(s) {', '.join(map(str, missing))}.")
+        else:
+            system, prompt = _SCENES_SYSTEM, _article(rss_entry)
+        try:
+            raw = _llm_chat(prompt, schema=_scenes_reply_schema(missing), system=system,
+                            refresh=attempt > 0)
         except Exception as e:
-            log.error(f"[feed] LLM validation error: {e}")
-        retry += 1
-        time.sleep(1)
+            log.error(f"[feed] LLM scene error: {e}")
+            continue
+        for n, sc in _salvage_scenes(raw).items():
+            if n in missing:
+                have[n] = sc
+    if len(have) < SCENE_COUNT:
+        log.error(f"[feed] Still missing scene(s) after {max_rounds} round(s)")
+        return None
+    return [have[n] for n in range(1, SCENE_COUNT + 1)]
 
-    if not validated:
-        log.error("[feed] Failed to get valid 6-scene response after retries")
-        return
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+def _valid_title(data: dict) -> tuple[str, str] | None:
     try:
-        cursor.execute(
-            """INSERT INTO seed
-               (rssId, seedPrompt, seedTitle, seedDescription, seedSong,
-                seedCreatedDate, seedTransitionStamp, seedMixStamp, seedRenderStamp, seedUploadStamp)
-               VALUES (?,?,?,?,?,?,?,?,?,?)""",
-            (rss_entry["rssId"], prompt, "not loaded", "not loaded", "not loaded",
-             now, "0000-00-00 00:00:00", "0000-00-00 00:00:00",
-             "0000-00-00 00:00:00", "0000-00-00 00:00:00"),
-        )
-        seed_id = cursor.lastrowid
-        for scene in validated.scenes:
-            cursor.execute(
-                "INSERT INTO scene (seedId, sceneNumber, sceneImage, sceneText, sceneCreatedDate) VALUES (?,?,?,?,?)",
-                (seed_id, scene.scene, scene.image, scene.text, now),
-            )
-            cursor.execute(
-                """INSERT INTO task
-                   (seedId, sceneNumber, sceneImageDate, sceneAudioDate, sceneClipDate, sceneSubtitleDate)
-                   VALUES (?,?,?,?,?,?)""",
-                (seed_id, scene.scene,
-                 "0000-00-00 00:00:00", "0000-00-00 00:00:00",
-                 "0000-00-00 00:00:00", "0000-00-00 00:00:00"),
-            )
-        conn.commit()
-        log.info(f"[feed] Seed {seed_id} created with 6 scenes")
-    except sqlite3.Error as e:
-        log.error(f"[feed] DB error: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
+        parsed = TitleDescriptionResponse.model_validate(data)
+    except ValidationError:
+        return None
+    return (parsed.title, parsed.description) if parsed.title.strip() else None
 
 
-def feed_generate_title_description(rss_entry: dict):
-    """Generate YouTube title + description and write to seed table."""
-    if not rss_entry:
-        return
-    prompt = (
-        f"I want YouTube video title and description in JSON format only "
-        f"from this text '{rss_entry['rssText']}'. "
-        f"Do not include any text or explanations."
-    )
+def feed_generate_title_description(rss_entry: dict) -> tuple[str, str]:
+    """Generate a YouTube title + description; placeholders on failure."""
     try:
-        raw    = _llm_chat(prompt, schema=TitleDescriptionResponse.model_json_schema())
+        raw    = _llm_chat(_article(rss_entry), schema=TitleDescriptionResponse.model_json_schema(),
+                           system=_TITLE_SYSTEM)
         parsed = TitleDescriptionResponse.model_validate_json(raw)
-        conn   = sqlite3.connect(DB_PATH)
-        conn.execute(
-            "UPDATE seed SET seedTitle=?, seedDescription=? WHERE rssId=?",
-            (parsed.title, parsed.description, rss_entry["rssId"]),
-        )
-        conn.commit()
-        conn.close()
-        log.info(f"[feed] Title: {parsed.title}")
+        return parsed.title, parsed.description
     except Exception as e:
         log.error(f"[feed] Title/desc error: {e}")
+        return "not loaded", "not loaded"
 
 
-def feed_choose_song(rss_entry: dict):
-    """Pick a background music genre and random MP3, write path to seed table."""
-    if not rss_entry:
-        return
-    genres = ["bright", "calm", "dark", "dramatic", "funky", "happy", "inspirational", "sad"]
-    genre = "calm"
+def feed_choose_genre(rss_entry: dict) -> str:
+    """Ask the LLM for a background music genre; "calm" on failure."""
     try:
-        prompt = (
-            f"I want YouTube video background music from this text '{rss_entry['rssText']}'. "
-            f"Choose one of: {' | '.join(genres)}."
-        )
-        raw    = _llm_chat(prompt, schema=SongResponse.model_json_schema())
+        raw    = _llm_chat(_article(rss_entry), schema=SongResponse.model_json_schema(),
+                           system=_GENRE_SYSTEM)
         parsed = SongResponse.model_validate_json(raw)
-        if parsed.genre in genres:
-            genre = parsed.genre
+        if parsed.genre in GENRES:
+            return parsed.genre
     except Exception as e:
         log.warning(f"[feed] Song genre error: {e}, using 'calm'")
+    return "calm"
+
 
+def feed_song_for_genre(genre: str) -> str:
+    """A random MP3 from song/<genre>/ (falling back to calm); "not loaded" if none."""
     mp3_dir = f"{BASE_DIR}/song/{genre}/"
     mp3_files = [os.path.join(mp3_dir, f) for f in os.listdir(mp3_dir) if f.lower().endswith(".mp3")] \
         if os.path.isdir(mp3_dir) else []
@@ -283,21 +685,154 @@ def feed_choose_song(rss_entry: dict):
             if os.path.isdir(mp3_dir) else []
     if not mp3_files:
         log.error("[feed] No MP3 files found in song directories")
-        return
+        return "not loaded"
 
     song_path = random.choice(mp3_files)
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("UPDATE seed SET seedSong=? WHERE rssId=?", (song_path, rss_entry["rssId"]))
-    conn.commit()
-    conn.close()
     log.info(f"[feed] Song: {song_path}")
+    return song_path
+
+
+def feed_generate_draft(rss_entry: dict, max_retries: int = 3) -> dict | None:
+    """Scenes, title, description and music genre for one entry from a single LLM call.
+
+    Each part of the answer is validated on its own; a part that fails is
+    asked for again through its single-purpose prompt, so the article text is
+    normally prefilled once instead of three times.  None if no valid scenes.
+    """
+    rss_entry["rssDigest"] = feed_digest(rss_entry)
+    prompt, raw = _article(rss_entry), ""
+    try:
+        raw  = _llm_chat(prompt, schema=_DRAFT_SCHEMA, max_tokens=3072, system=_DRAFT_SYSTEM)
+        data = json.loads(raw)
+        if not isinstance(data, dict):
+            data = {}
+    except Exception as e:
+        log.error(f"[feed] LLM draft error: {e}")
+        data = {}
+
+    # Keep whatever scenes came out whole and generate only the rest
+    have = _salvage_scenes(raw)
+    if len(have) < SCENE_COUNT:
+        log.info(f"[feed] Draft has {len(have)}/{SCENE_COUNT} usable scenes")
+    scenes = feed_generate_scenes(rss_entry, have, max_retries)
+    if scenes is None:
+        return None
+    title = _valid_title(data)
+    if title is None:
+        log.info("[feed] Retrying title/description on their own")
+        title = feed_generate_title_description(rss_entry)
+    genre = data.get("genre")
+    if genre not in GENRES:
+        log.info("[feed] Retrying music genre on its own")
+        genre = feed_choose_genre(rss_entry)
+
+    log.info(f"[feed] Title: {title[0]}")
+    return {"rssId": rss_entry["rssId"], "prompt": f"{_DRAFT_SYSTEM}\n{prompt}", "scenes": scenes,
+            "title": title[0], "description": title[1], "song": feed_song_for_genre(genre)}
+
+
+def _insert_seeds(drafts: list[dict]) -> dict:
+    """Insert seed + scene + task rows for every draft in one transaction.
+
+    Returns {rssId: seedId}; empty if the transaction was rolled back.
+    """
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    cursor = conn.cursor()
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    seeds = {}
+    try:
+        for d in drafts:
+            cursor.execute(
+                """INSERT INTO seed
+                   (rssId, seedPrompt, seedTitle, seedDescription, seedSong,
+                    seedCreatedDate, seedTransitionStamp, seedMixStamp, seedRenderStamp, seedUploadStamp)
+                   VALUES (?,?,?,?,?,?,?,?,?,?)""",
+                (d["rssId"], d["prompt"], d["title"], d["description"], d["song"],
+                 now, "0000-00-00 00:00:00", "0000-00-00 00:00:00",
+                 "0000-00-00 00:00:00", "0000-00-00 00:00:00"),
+            )
+            seed_id = cursor.lastrowid
+            cursor.executemany(
+                "INSERT INTO scene (seedId, sceneNumber, sceneImage, sceneText, sceneCreatedDate) VALUES (?,?,?,?,?)",
+                [(seed_id, sc.scene, sc.image, sc.text, now) for sc in d["scenes"]],
+            )
+            cursor.executemany(
+                """INSERT INTO task
+                   (seedId, sceneNumber, sceneImageDate, sceneAudioDate, sceneClipDate, sceneSubtitleDate)
+                   VALUES (?,?,?,?,?,?)""",
+                [(seed_id, sc.scene, "0000-00-00 00:00:00", "0000-00-00 00:00:00",
+                  "0000-00-00 00:00:00", "0000-00-00 00:00:00") for sc in d["scenes"]],
+            )
+            seeds[d["rssId"]] = seed_id
+        conn.commit()
+        return seeds
+    except sqlite3.Error as e:
+        log.error(f"[feed] DB error: {e}")
+        conn.rollback()
+        return {}
+    finally:
+        conn.close()
+
+
+def feed_process_batch(entries: list[dict]) -> list[int]:
+    """Turn several RSS entries into seeds in one LLM session.
+
+    From the first response-cache miss on, the model stays loaded (pinned)
+    for the rest of the batch while GPU_LOCK is taken per generation call, so
+    Flux and Whisper can run between calls; then every seed is inserted in a
+    single transaction.  The batch is
+    trimmed to the admission budget.  Returns the new seedIds.
+    """
+    entries = [e for e in entries if e]
+    if not entries:
+        return []
+    slots, why = admission_slots(DB_PATH, BASE_DIR)
+    if slots == 0:
+        log.info(f"[feed] Not starting a new seed — {why}")
+        return []
+    if slots is not None:
+        entries = entries[:slots]
+
+    with lease("RSS", [e["rssId"] for e in entries]) as won:
+        won = set(won)
+        for e in entries:
+            if e["rssId"] not in won:
+                log.info(f"[feed] RSS {e['rssId']} is being processed by another worker")
+        entries = [e for e in entries if e["rssId"] in won]
+        if not entries:
+            return []
+
+        drafts, traces = [], {}
+        with _llm_session():
+            for entry in entries:
+                with span("feed", stage="feed", rss_id=entry["rssId"], batch=len(entries)) as sp:
+                    draft = feed_generate_draft(entry)
+                    if draft is None:
+                        sp.ok = False
+                        continue
+                drafts.append(draft)
+                traces[entry["rssId"]] = sp.trace
+
+        seeds = _insert_seeds(drafts) if drafts else {}
+        for rss_id, seed_id in seeds.items():
+            attach_seed(traces[rss_id], seed_id)
+        if seeds:
+            log.info(f"[feed] Created {len(seeds)} seed(s) with 6 scenes: "
+                     + ", ".join(str(s) for s in seeds.values()))
+        if LLM_CACHE:
+            log.info(f"[llm] Response cache: {_llm_cache.stats()}")
+        return list(seeds.values())
+
+
+def feed_process_entry(rss_entry: dict):
+    """Turn one RSS entry into a complete seed (scenes, title, song)."""
+    if not rss_entry:
+        return
+    feed_process_batch([rss_entry])
 
 
 def run_feed():
     """Run the full Feed module end-to-end."""
     log.info("═══ MODULE: FEED ═══")
-    feed_fetch_snopes()
-    rss = feed_get_unprocessed_rss()
-    feed_process_rss_to_seed(rss)
-    feed_generate_title_description(rss)
-    feed_choose_song(rss)
+    feed_poll()
+    feed_process_batch(feed_get_unprocessed_batch(FEED_BATCH))
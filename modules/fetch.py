@@ -0,0 +1,153 @@
+from .config import *
+
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .cache import DiskLRU, cache_key
+from .trace import span
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# HTTP FETCH LAYER
+# One pooled Session shared by every feed fetcher, at most FETCH_PER_HOST
+# requests in flight per host, and a bounded on-disk cache revalidated with
+# ETag / Last-Modified so an unchanged feed costs a 304 instead of a download.
+# Article pages skip the cache: a link is fetched once, then known.
+# ──────────────────────────────────────────────────────────────────────────────
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/124.0 Safari/537.36")
+
+_session      = None
+_session_lock = threading.Lock()
+_host_slots   = {}
+_hosts_lock   = threading.Lock()
+_http_cache   = DiskLRU(HTTP_CACHE_DIR, HTTP_CACHE_MB * 1024 ** 2, "http")
+
+
+class Page:
+    """A fetched document; *fresh* is False when the server answered 304.
+
+    *etag* / *modified* are the validators the server sent (or the cached
+    ones on a 304), for callers that keep their own cursor.
+    """
+
+    __slots__ = ("url", "status", "content", "fresh", "etag", "modified")
+
+    def __init__(self, url: str, status: int, content: bytes, fresh: bool,
+                 etag: str | None = None, modified: str | None = None):
+        self.url, self.status, self.content, self.fresh = url, status, content, fresh
+        self.etag, self.modified = etag, modified
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+
+def _get_session() -> requests.Session:
+    global _session
+    with _session_lock:
+        if _session is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=FETCH_WORKERS, pool_maxsize=FETCH_PER_HOST)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            s.headers.update({
+                "User-Agent": USER_AGENT,
+                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            })
+            _session = s
+        return _session
+
+
+def _host_slot(host: str) -> threading.BoundedSemaphore:
+    with _hosts_lock:
+        slot = _host_slots.get(host)
+        if slot is None:
+            slot = _host_slots[host] = threading.BoundedSemaphore(FETCH_PER_HOST)
+        return slot
+
+
+# ── On-disk cache ─────────────────────────────────────────────────────────────
+# One DiskLRU entry per URL: a JSON line of validators, then the body.
+def _cache_load(url: str):
+    blob = _http_cache.get(cache_key(url)) if HTTP_CACHE_MB else None
+    if blob is None:
+        return None, None
+    head, _, body = blob.partition(b"\n")
+    try:
+        return json.loads(head), body
+    except ValueError:
+        return None, None
+
+
+def _cache_store(url: str, resp: requests.Response):
+    etag, modified = resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+    if not HTTP_CACHE_MB or (not etag and not modified):
+        return   # cache off, or nothing to revalidate against
+    head = json.dumps({"url": url, "etag": etag, "last_modified": modified, "stored": time.time()})
+    try:
+        _http_cache.put(cache_key(url), head.encode() + b"\n" + resp.content)
+    except OSError as e:
+        log.debug(f"[fetch] Could not cache {url}: {e}")
+
+
+# ── Fetching ──────────────────────────────────────────────────────────────────
+def fetch(url: str, headers: dict | None = None, timeout: float | None = None,
+          cache: bool = True) -> Page | None:
+    """GET *url* through the shared session (and HTTP cache with *cache*); None on failure."""
+    meta, cached = _cache_load(url) if cache else (None, None)
+    hdrs = dict(headers or {})
+    if meta:
+        if meta.get("etag"):
+            hdrs["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            hdrs["If-Modified-Since"] = meta["last_modified"]
+
+    host = urlparse(url).netloc
+    try:
+        with _host_slot(host), span("http.get", host=host):
+            resp = _get_session().get(url, headers=hdrs, timeout=timeout or FETCH_TIMEOUT)
+    except requests.RequestException as e:
+        log.warning(f"[fetch] {url}: {e}")
+        return None
+
+    if resp.status_code == 304:
+        # Without a cached body (caller sent its own validators) the page is empty
+        meta = meta or {}
+        return Page(url, 304 if cached is None else 200, cached or b"", fresh=False,
+                    etag=meta.get("etag") or hdrs.get("If-None-Match"),
+                    modified=meta.get("last_modified") or hdrs.get("If-Modified-Since"))
+    if resp.status_code != 200:
+        log.debug(f"[fetch] {url}: HTTP {resp.status_code}")
+        return None
+    if cache:
+        _cache_store(url, resp)
+    return Page(url, 200, resp.content, fresh=True,
+                etag=resp.headers.get("ETag"), modified=resp.headers.get("Last-Modified"))
+
+
+def fetch_many(urls: list[str], headers: dict | None = None, cache: bool = True,
+               per_url: dict | None = None) -> dict:
+    """Fetch *urls* concurrently (FETCH_WORKERS overall, FETCH_PER_HOST per host).
+
+    *per_url* maps a URL to extra headers for it alone (e.g. its validators).
+
+    Returns {url: Page or None} in the order given.
+    """
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return {}
+    per_url = per_url or {}
+
+    def one(url: str, ctx: contextvars.Context):
+        # Run in a copy of the caller's context so http.get nests under its span
+        return ctx.run(fetch, url, {**(headers or {}), **per_url.get(url, {})}, cache=cache)
+
+    with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(urls)),
+                            thread_name_prefix="fetch") as pool:
+        pages = pool.map(one, urls, [contextvars.copy_context() for _ in urls])
+        return dict(zip(urls, pages))
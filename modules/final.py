@@ -1,5 +1,8 @@
 from .config import *
 from .clip import _ffprobe_duration
+from .db import SEED_FINAL, SEED_UPLOAD, advance_seed, seed_failed, seed_ids_in_state
+from .lease import leased
+from .trace import run_cmd, traced
 
 
 def final_merge(seed_id: int) -> bool:
@@ -37,7 +40,7 @@ def final_merge(seed_id: int) -> bool:
             "-pix_fmt", "yuv420p", "-c:a", "libmp3lame", "-b:a", "192k",
             output]
     try:
-        subprocess.run(cmd, check=True, capture_output=True)
+        run_cmd(cmd, check=True, capture_output=True)
         log.info(f"[final] Saved: {output}")
         return True
     except subprocess.CalledProcessError as e:
@@ -45,28 +48,38 @@ def final_merge(seed_id: int) -> bool:
         return False
 
 
-def run_final():
-    """Run the Final module for one pending seed."""
-    log.info("═══ MODULE: FINAL ═══")
+def final_pending_seeds() -> list[int]:
+    """Seeds that are mixed but not yet rendered to final/."""
     conn = sqlite3.connect(DB_PATH)
-    row = conn.execute(
-        """SELECT DISTINCT seedId FROM seed
-           WHERE seedTransitionStamp!='0000-00-00 00:00:00'
-           AND seedMixStamp!='0000-00-00 00:00:00'
-           AND seedRenderStamp='0000-00-00 00:00:00'
-           AND seedUploadStamp='0000-00-00 00:00:00'
-           LIMIT 1"""
-    ).fetchone()
+    seeds = seed_ids_in_state(conn, SEED_FINAL)
     conn.close()
-    if not row:
+    return seeds
+
+
+@leased("SEED", SEED_FINAL)
+@traced("final")
+def final_process_seed(seed_id: int) -> bool:
+    """Render one seed and stamp seedRenderStamp on success."""
+    if not final_merge(seed_id):
+        return False
+    conn = sqlite3.connect(DB_PATH)
+    advance_seed(conn, seed_id, SEED_UPLOAD)
+    conn.commit()
+    conn.close()
+    return True
+
+
+def run_final():
+    """Run the Final module for every pending seed."""
+    log.info("═══ MODULE: FINAL ═══")
+    seeds = final_pending_seeds()
+    if not seeds:
         log.info("[final] No pending seeds")
         return
-    seed_id = row[0]
-    if final_merge(seed_id):
-        conn2 = sqlite3.connect(DB_PATH)
-        conn2.execute(
-            "UPDATE seed SET seedRenderStamp=CURRENT_TIMESTAMP WHERE seedId=?",
-            (seed_id,),
-        )
-        conn2.commit()
-        conn2.close()
+    for seed_id in seeds:
+        try:
+            final_process_seed(seed_id)
+        except Exception as e:
+            # A broken seed (e.g. a truncated clip ffprobe cannot read) must not hold up the rest
+            log.error(f"[final] Seed {seed_id} failed: {e}")
+            seed_failed(DB_PATH, seed_id, "final", e)
@@ -1,86 +1,451 @@
 from .config import *
+from .cache import DiskLRU, cache_key
+from .db import (SIM_BANDS, TASK_IMAGE, TASK_VOICE, advance_task, normalize_text, sim_bands,
+                 sim_distance, simhash, task_ids_in_state)
+from .lease import lease
+from .trace import span
 
+import functools
+import io
 
-def image_generate_for_seed(seed_id: int):
-    """Generate one PNG per scene that hasn't been imaged yet, using Flux."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT taskId, sceneNumber FROM task "
-        "WHERE sceneImageDate='0000-00-00 00:00:00' AND seedId=?",
-        (seed_id,),
+# Flux is a guidance-distilled model – negative prompt has no official channel,
+# so we append style cues to the positive prompt instead.
+_STYLE = ", high quality, sharp, professional photography, cinematic"
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# BATCHED FLUX
+# Pending scene prompts are gathered across seeds and denoised together, as
+# many per pipeline call as fit the memory budget.  Every image has its own
+# generator seeded from its prompt, so a picture does not depend on which
+# batch it landed in, and re-rendering a scene reproduces it.
+# ──────────────────────────────────────────────────────────────────────────────
+_MB_PER_MPIX  = 1024.0   # first guess at activation memory per image per megapixel
+_mb_per_image = None     # measured on CUDA after each batch
+_oom_cap      = None     # largest batch size that has not run out of memory
+_weights_mb   = None     # offloaded transformer weights, on the GPU only during a call
+
+
+class _Job:
+    __slots__ = ("task_id", "scene_number", "scene_id", "text", "prompt", "embeds")
+
+    def __init__(self, task_id: int, scene_number: int, scene_id: int, text: str):
+        self.task_id, self.scene_number, self.scene_id = task_id, scene_number, scene_id
+        self.text   = text
+        self.prompt = text + _STYLE
+        self.embeds = None   # (prompt_embeds, pooled_prompt_embeds), batch dimension 1
+
+    @property
+    def seed(self) -> int:
+        return int.from_bytes(hashlib.sha1(normalize_text(self.prompt).encode()).digest()[:4], "big")
+
+    @property
+    def key(self) -> str:
+        return cache_key(_settings_key(), normalize_text(self.prompt), self.seed)
+
+    @property
+    def image_path(self) -> str:
+        return f"{BASE_DIR}/temp/image/{self.scene_id}/image.png"
+
+
+# ── Image result cache ────────────────────────────────────────────────────────
+# A finished PNG is stored under a key of everything that decides its pixels
+# (model, normalised prompt, size, steps, guidance, generator seed) and is
+# hard-linked — or copied, across filesystems — into place for any later scene
+# with the same key.  index.db maps keys to prompt SimHashes for the optional
+# near-duplicate match, with each hash's 16-bit bands indexed the way RSS is
+# (modules/db.py) so a lookup probes four indexes instead of scanning the cache;
+# rows whose file was evicted are dropped when met.
+_image_cache = DiskLRU(os.path.join(IMAGE_CACHE_DIR, "png"), IMAGE_CACHE_MB * 1024 ** 2, "image")
+_index_ready = False
+
+
+@functools.lru_cache(maxsize=1)
+def _settings_key() -> str:
+    return cache_key(FLUX_MODEL_ID, flux_dtype_name(), FLUX_WIDTH, FLUX_HEIGHT, flux_steps(), FLUX_GUIDANCE)
+
+
+_BAND_COLS = [f"band{i}" for i in range(SIM_BANDS)]
+
+
+def _index() -> sqlite3.Connection:
+    global _index_ready
+    os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(IMAGE_CACHE_DIR, "index.db"), timeout=30)
+    if _index_ready:
+        return conn
+    conn.execute("CREATE TABLE IF NOT EXISTS image "
+                 "(imageKey TEXT PRIMARY KEY, settings TEXT NOT NULL, sim INTEGER)")
+    for col in _BAND_COLS:
+        try:
+            conn.execute(f"ALTER TABLE image ADD COLUMN {col} INTEGER")
+        except sqlite3.OperationalError:
+            pass
+    # Rows stored before the bands existed
+    conn.executemany(
+        f"UPDATE image SET {', '.join(f'{c} = ?' for c in _BAND_COLS)} WHERE imageKey = ?",
+        [(*sim_bands(sim), key) for key, sim in conn.execute(
+            f"SELECT imageKey, sim FROM image WHERE sim IS NOT NULL AND {_BAND_COLS[0]} IS NULL")],
     )
-    tasks = cursor.fetchall()
+    conn.execute("DROP INDEX IF EXISTS idx_image_settings")
+    for col in _BAND_COLS:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_image_{col} ON image(settings, {col})")
+    conn.commit()
+    _index_ready = True
+    return conn
 
-    if not tasks:
+
+def _cache_lookup(job: _Job) -> str | None:
+    """Path of a cached image for *job*: same key, else (optionally) a near-identical prompt.
+
+    Near duplicates are found through the SimHash bands, so a match is certain
+    only for IMAGE_CACHE_NEAR_DUP below SIM_BANDS (two hashes that close share
+    a band); larger distances find what shares a band.
+    """
+    path = _image_cache.get_path(job.key)
+    if path or IMAGE_CACHE_NEAR_DUP <= 0:
+        return path
+    sim = simhash(job.text)
+    if sim is None:
+        return None
+    conn = _index()
+    try:
+        settings = _settings_key()
+        rows = conn.execute(
+            " UNION ".join(f"SELECT imageKey, sim FROM image WHERE settings = ? AND {col} = ?"
+                           for col in _BAND_COLS),
+            [arg for band in sim_bands(sim) for arg in (settings, band)],
+        ).fetchall()
+        near = sorted((sim_distance(sim, other), key) for key, other in rows
+                      if sim_distance(sim, other) <= IMAGE_CACHE_NEAR_DUP)
+        stale = []
+        for _dist, key in near:
+            path = _image_cache.get_path(key)
+            if path:
+                break
+            stale.append((key,))
+        if stale:
+            conn.executemany("DELETE FROM image WHERE imageKey = ?", stale)
+            conn.commit()
+    finally:
         conn.close()
-        return
+    return path
 
-    pipe = _get_flux_pipe()
 
-    for task_id, scene_number in tasks:
-        cursor.execute(
-            "SELECT sceneId, sceneImage FROM scene WHERE seedId=? AND sceneNumber=?",
-            (seed_id, scene_number),
-        )
-        row = cursor.fetchone()
-        if not row:
-            continue
-        scene_id, scene_image_prompt = row
+def _cache_store(job: _Job):
+    with open(job.image_path, "rb") as f:
+        _image_cache.put(job.key, f.read())
+    sim = simhash(job.text)
+    conn = _index()
+    bands = sim_bands(sim) if sim is not None else [None] * SIM_BANDS
+    with conn:
+        conn.execute(f"INSERT OR REPLACE INTO image (imageKey, settings, sim, {', '.join(_BAND_COLS)}) "
+                     f"VALUES (?,?,?,{','.join('?' * SIM_BANDS)})",
+                     (job.key, _settings_key(), sim, *bands))
+    conn.close()
+
 
-        out_dir = f"{BASE_DIR}/temp/image/{scene_id}"
-        os.makedirs(out_dir, exist_ok=True)
-        image_path = os.path.join(out_dir, "image.png")
+def _materialize(src: str, dst: str):
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    tmp = f"{dst}.{os.getpid()}"
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
 
-        full_prompt = scene_image_prompt
-        # Append negative guidance as a separate "negative" token block if supported;
-        # Flux is a guidance-distilled model – negative prompt has no official channel,
-        # so we append style cues to the positive prompt instead.
-        full_prompt += f", high quality, sharp, professional photography, cinematic"
 
-        log.info(f"[image] Generating scene {scene_number} (task {task_id}): {scene_image_prompt[:80]}…")
+def _from_cache(conn, jobs: list[_Job]) -> list[_Job]:
+    """Put cached images in place and advance their tasks; return the jobs still to render."""
+    t0 = time.perf_counter()
+    misses = []
+    for job in jobs:
+        src = _cache_lookup(job)
+        if src is None:
+            misses.append(job)
+            continue
         try:
-            import torch
+            _materialize(src, job.image_path)
+        except OSError as e:
+            log.warning(f"[image] Could not reuse cached image for task {job.task_id}: {e}")
+            misses.append(job)
+            continue
+        advance_task(conn, job.task_id, TASK_VOICE)
+    conn.commit()
+    hits = len(jobs) - len(misses)
+    if hits:
+        log.info(f"[image] {hits} image(s) reused from cache in "
+                 f"{(time.perf_counter() - t0) * 1000:.0f} ms")
+    return misses
+
+
+# ── Prompt embeddings ─────────────────────────────────────────────────────────
+# CLIP and T5 run once over every pending prompt before any denoising, so with
+# CPU offload the encoders are moved to the GPU once per run rather than once
+# per image.  Their output is kept on disk: re-rendering a prompt skips them.
+_ENCODE_BATCH    = 16
+_MAX_SEQ_LEN     = 512
+_embed_cache     = DiskLRU(FLUX_EMBED_CACHE_DIR, FLUX_EMBED_CACHE_MB * 1024 ** 2, "flux-embed")
+
+
+def _embed_key(prompt: str) -> str:
+    return cache_key(FLUX_MODEL_ID, flux_dtype_name(), _MAX_SEQ_LEN, prompt)
+
+
+def _encode(pipe, jobs: list[_Job], use_cache: bool = True):
+    """Fill in job.embeds for every job, from the cache or one encoder pass per _ENCODE_BATCH."""
+    import torch
+    use_cache = use_cache and FLUX_EMBED_CACHE_MB
+    todo = []
+    for job in jobs:
+        hit = _embed_cache.get(_embed_key(job.prompt)) if use_cache else None
+        if hit is not None:
+            try:
+                job.embeds = torch.load(io.BytesIO(hit), map_location="cpu")
+                continue
+            except Exception as e:
+                log.debug(f"[image] Unreadable cached embedding: {e}")
+        todo.append(job)
+    if use_cache:
+        log.info(f"[image] Prompt embeddings: {len(jobs) - len(todo)} cached, {len(todo)} to encode")
+
+    for i in range(0, len(todo), _ENCODE_BATCH):
+        chunk = todo[i:i + _ENCODE_BATCH]
+        with GPU_LOCK, span("flux.encode", batch=len(chunk)), torch.no_grad():
+            embeds, pooled, _text_ids = pipe.encode_prompt(
+                prompt=[j.prompt for j in chunk], prompt_2=None,
+                device=pipe._execution_device, max_sequence_length=_MAX_SEQ_LEN,
+            )
+        for k, job in enumerate(chunk):
+            job.embeds = (embeds[k:k + 1].cpu(), pooled[k:k + 1].cpu())
+            if use_cache:
+                buf = io.BytesIO()
+                torch.save(job.embeds, buf)
+                _embed_cache.put(_embed_key(job.prompt), buf.getvalue())
+
+
+def _offloaded_mb(pipe) -> float:
+    """GPU memory the transformer takes while a call runs, if it is CPU-offloaded between calls."""
+    global _weights_mb
+    if _weights_mb is None:
+        _weights_mb = 0.0
+        if FLUX_CPU_OFFLOAD and hasattr(pipe, "transformer"):
+            _weights_mb = sum(p.numel() * p.element_size()
+                              for p in pipe.transformer.parameters()) / 1024 ** 2
+    return _weights_mb
+
+
+def _batch_size(pipe) -> int:
+    """Images per pipeline call under FLUX_BATCH_MB (or the free GPU memory).
+
+    On the CPU one image already keeps every core busy, so batches only cost
+    RAM; without an explicit FLUX_BATCH_MB it renders one at a time.
+    """
+    import torch
+    budget = FLUX_BATCH_MB
+    if not budget and flux_device() == "cpu":
+        return 1
+    if not budget and torch.cuda.is_available():
+        free, _total = torch.cuda.mem_get_info()
+        budget = free / 1024 ** 2 * 0.8 - _offloaded_mb(pipe)
+    size = FLUX_MAX_BATCH
+    if budget:
+        per_image = _mb_per_image or _MB_PER_MPIX * FLUX_WIDTH * FLUX_HEIGHT / 1e6
+        size = min(size, int(budget // per_image))
+    if _oom_cap:
+        size = min(size, _oom_cap)
+    return max(1, size)
+
+
+def _denoise(pipe, jobs: list[_Job]) -> list:
+    """Run one pipeline call for *jobs*; a batch that runs out of GPU memory is split in half."""
+    global _mb_per_image, _oom_cap
+    import torch
+    cuda = flux_device() == "cuda"
+    try:
+        with GPU_LOCK, span("flux", task_id=jobs[0].task_id if len(jobs) == 1 else None,
+                            steps=flux_steps(), batch=len(jobs)):
+            if cuda:
+                torch.cuda.reset_peak_memory_stats()
+                base = torch.cuda.memory_allocated()
+            device = pipe._execution_device
             result = pipe(
-                prompt=full_prompt,
+                prompt_embeds=torch.cat([j.embeds[0] for j in jobs]).to(device),
+                pooled_prompt_embeds=torch.cat([j.embeds[1] for j in jobs]).to(device),
                 height=FLUX_HEIGHT,
                 width=FLUX_WIDTH,
-                num_inference_steps=FLUX_STEPS,
+                num_inference_steps=flux_steps(),
                 guidance_scale=FLUX_GUIDANCE,
-                generator=torch.Generator().manual_seed(random.randint(0, 2**32 - 1)),
+                generator=[torch.Generator().manual_seed(j.seed) for j in jobs],
             )
-            image = result.images[0]
-            image.save(image_path)
-            log.info(f"[image] Saved: {image_path}")
+            if cuda:
+                used = (torch.cuda.max_memory_allocated() - base) / 1024 ** 2 - _offloaded_mb(pipe)
+                _mb_per_image = max(_mb_per_image or 0.0, used / len(jobs))
+        return result.images
+    except torch.cuda.OutOfMemoryError:
+        if len(jobs) == 1:
+            raise
+        torch.cuda.empty_cache()
+        half = len(jobs) // 2
+        _oom_cap = half
+        log.warning(f"[image] Out of GPU memory with {len(jobs)} images — retrying in batches of {half}")
+        return _denoise(pipe, jobs[:half]) + _denoise(pipe, jobs[half:])
 
-            cursor.execute(
-                "UPDATE task SET sceneImageDate=datetime('now','localtime') WHERE taskId=?",
-                (task_id,),
-            )
-            conn.commit()
+
+def _image_generate_tasks(tasks: list):
+    """Render *tasks* [(taskId, seedId, sceneNumber)] in memory-sized batches."""
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    jobs = []
+    for task_id, seed_id, scene_number in tasks:
+        row = conn.execute(
+            "SELECT sceneId, sceneImage FROM scene WHERE seedId=? AND sceneNumber=?",
+            (seed_id, scene_number),
+        ).fetchone()
+        if row:
+            jobs.append(_Job(task_id, scene_number, *row))
+    if jobs and IMAGE_CACHE_MB:
+        jobs = _from_cache(conn, jobs)
+    if not jobs:
+        conn.close()
+        return
+
+    # Scenes sharing a key in this run (the closing scene of several seeds) render once
+    twins = {}
+    for job in jobs:
+        twins.setdefault(job.key, []).append(job)
+    jobs = [group[0] for group in twins.values()]
+
+    # Pinned for every batch: another stage loading its model must not unload Flux
+    # while this job still holds it
+    with using("flux") as pipe:
+        try:
+            _encode(pipe, jobs)
         except Exception as e:
-            log.error(f"[image] Generation failed for taskId {task_id}: {e}")
+            log.error(f"[image] Prompt encoding failed: {e}")
+            conn.close()
+            return
+        done = 0
+        while done < len(jobs):
+            batch = jobs[done:done + _batch_size(pipe)]
+            done += len(batch)
+            log.info(f"[image] Generating {len(batch)} image(s), tasks "
+                     + ", ".join(str(j.task_id) for j in batch))
+            try:
+                images = _denoise(pipe, batch)
+            except Exception as e:
+                log.error(f"[image] Generation failed for taskIds {[j.task_id for j in batch]}: {e}")
+                continue
 
+            for job, image in zip(batch, images):
+                os.makedirs(os.path.dirname(job.image_path), exist_ok=True)
+                try:
+                    image.save(job.image_path)
+                except OSError as e:
+                    log.error(f"[image] Could not save {job.image_path}: {e}")
+                    continue
+                log.info(f"[image] Saved scene {job.scene_number} (seed {job.seed}): {job.image_path}")
+                advance_task(conn, job.task_id, TASK_VOICE)
+                for twin in twins[job.key][1:]:
+                    try:
+                        _materialize(job.image_path, twin.image_path)
+                    except OSError as e:
+                        log.error(f"[image] Could not place {twin.image_path}: {e}")
+                        continue
+                    advance_task(conn, twin.task_id, TASK_VOICE)
+                if IMAGE_CACHE_MB:
+                    try:
+                        _cache_store(job)
+                    except (OSError, sqlite3.Error) as e:
+                        log.warning(f"[image] Could not cache {job.image_path}: {e}")
+            conn.commit()
+    if _mb_per_image:
+        log.info(f"[image] Measured {_mb_per_image:.0f} MB of GPU memory per image")
+    if FLUX_EMBED_CACHE_MB:
+        log.info(f"[image] Embedding cache: {_embed_cache.stats()}")
+    if IMAGE_CACHE_MB:
+        log.info(f"[image] Image cache: {_image_cache.stats()}")
+    conn.close()
+
+
+def image_generate_for_seeds(seed_ids: list[int] | None = None):
+    """Generate every pending scene image of *seed_ids* (all seeds if None) in shared batches."""
+    conn = sqlite3.connect(DB_PATH)
+    tasks = task_ids_in_state(conn, TASK_IMAGE)
     conn.close()
+    if seed_ids is not None:
+        wanted = set(seed_ids)
+        tasks = [t for t in tasks if t[1] in wanted]
+
+    with lease("TASK", [t[0] for t in tasks], TASK_IMAGE) as won:
+        won = set(won)
+        tasks = [t for t in tasks if t[0] in won]
+        if not tasks:
+            return
+        seeds = sorted({t[1] for t in tasks})
+        with span("image", stage="image", seed_id=seeds[0] if len(seeds) == 1 else None,
+                  seeds=len(seeds), images=len(tasks)):
+            _image_generate_tasks(tasks)
+
+
+def image_generate_for_seed(seed_id: int):
+    """Generate one PNG per scene of *seed_id* that hasn't been imaged yet, using Flux."""
+    image_generate_for_seeds([seed_id])
 
 
 def run_image():
-    """Run the Image module for all pending seeds."""
+    """Run the Image module: every pending scene of every seed, batched."""
     log.info("═══ MODULE: IMAGE ═══")
     conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        """SELECT DISTINCT seedId FROM task
-           WHERE sceneImageDate='0000-00-00 00:00:00'
-           AND sceneAudioDate='0000-00-00 00:00:00'
-           AND sceneClipDate='0000-00-00 00:00:00'
-           AND sceneSubtitleDate='0000-00-00 00:00:00'"""
-    )
-    seeds = cursor.fetchall()
+    seeds = sorted({seed_id for _, seed_id, _ in task_ids_in_state(conn, TASK_IMAGE)})
     conn.close()
     log.info(f"[image] {len(seeds)} pending seeds")
-    for (seed_id,) in seeds:
+    if seeds:
         try:
-            image_generate_for_seed(seed_id)
+            image_generate_for_seeds(seeds)
         except Exception as e:
-            log.error(f"[image] Seed {seed_id} failed: {e}")
+            log.error(f"[image] Batch failed: {e}")
+
+
+# ── Benchmark (pipeline.py --flux-bench) ──────────────────────────────────────
+_BENCH_PROMPTS = [
+    "A lighthouse on a rocky cliff at dusk, storm clouds rolling in over a dark sea",
+    "A crowded night market in the rain, neon signs reflected in the puddles",
+    "An old scientist in a cluttered laboratory holding up a glowing test tube",
+    "A golden retriever running through autumn leaves in a city park",
+]
+
+
+def bench_flux(images: int = 2):
+    """Render *images* sample scenes the way the image stage does, bypassing the caches and TASK.
+
+    Prints load time, encode time, seconds per image and peak RSS at the
+    configured FLUX_WIDTH x FLUX_HEIGHT on the device the stage would use.
+    """
+    images = max(1, images)
+    reset_peak_memory()
+    t0 = time.perf_counter()
+    with using("flux") as pipe:
+        load, loaded = time.perf_counter() - t0, peak_memory()
+
+        jobs = [_Job(0, i + 1, 0, f"{_BENCH_PROMPTS[i % len(_BENCH_PROMPTS)]}, take {i + 1}")
+                for i in range(images)]
+        t0 = time.perf_counter()
+        _encode(pipe, jobs, use_cache=False)
+        encode = time.perf_counter() - t0
+
+        size, done = _batch_size(pipe), 0
+        t0 = time.perf_counter()
+        while done < len(jobs):
+            batch = jobs[done:done + size]
+            _denoise(pipe, batch)
+            done += len(batch)
+        denoise = time.perf_counter() - t0
+    peak = peak_memory()
+
+    print(f"Flux on {flux_device()} ({flux_dtype_name()}), {FLUX_WIDTH}x{FLUX_HEIGHT}, "
+          f"{flux_steps()} steps, batches of {size}")
+    print(f"  load                 {load:8.1f} s     peak RSS {loaded['rss_mb']:>7} MB")
+    print(f"  encode {images:<3} prompts    {encode:8.1f} s")
+    print(f"  denoise + decode     {denoise / images:8.1f} s/image")
+    print(f"  whole run            {'':8}       peak RSS {peak['rss_mb']:>7} MB"
+          + (f", CUDA {peak['cuda_mb']} MB" if "cuda_mb" in peak else ""))
@@ -0,0 +1,116 @@
+from .config import *
+
+import functools
+from contextlib import contextmanager
+
+from .db import (claim_rows, reclaim_expired, release_rows, release_worker,
+                 renew_leases, task_ids_in_state)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# WORK LEASES
+# Every stage unit is claimed before it runs, so several pipeline.py workers
+# can drain one DB without doing the same scene or seed twice.  A background
+# heartbeat keeps this worker's leases alive while it is working on them.
+# ──────────────────────────────────────────────────────────────────────────────
+_worker    = WORKER_ID
+_heartbeat = None
+_hb_stop   = threading.Event()
+
+
+def worker_id() -> str:
+    return _worker
+
+
+def _connect() -> sqlite3.Connection:
+    return sqlite3.connect(DB_PATH, timeout=30)
+
+
+@contextmanager
+def lease(table: str, ids: list, state: int | None = None):
+    """Claim *ids* in *table* for this worker; yield the ids won.
+
+    Leases still held on exit (the unit failed before advancing) are released
+    so the row can be retried straight away.
+    """
+    conn = _connect()
+    try:
+        won = claim_rows(conn, table, list(ids), _worker, LEASE_TTL_SEC, state)
+    finally:
+        conn.close()
+    if len(won) < len(ids):
+        log.debug(f"[lease] {table}: {len(ids) - len(won)} of {len(ids)} rows held by other workers")
+    try:
+        yield won
+    finally:
+        if won:
+            conn = _connect()
+            release_rows(conn, table, won, _worker)
+            conn.close()
+
+
+@contextmanager
+def leased_tasks(state: int, seed_id: int | None = None):
+    """Yield [(taskId, seedId, sceneNumber)] waiting in *state* that this worker won."""
+    conn = _connect()
+    tasks = task_ids_in_state(conn, state, seed_id)
+    conn.close()
+    with lease("TASK", [t[0] for t in tasks], state) as won:
+        won = set(won)
+        yield [t for t in tasks if t[0] in won]
+
+
+def leased(table: str, state: int | None = None):
+    """Decorator: run ``fn(row_id)`` only if this worker wins that row's lease;
+    otherwise return None without running it."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(row_id, *args, **kwargs):
+            with lease(table, [row_id], state) as won:
+                if not won:
+                    log.info(f"[lease] {table} {row_id} is held by another worker — skipped")
+                    return None
+                return fn(row_id, *args, **kwargs)
+        return wrapper
+    return deco
+
+
+# ── Heartbeat ─────────────────────────────────────────────────────────────────
+def _beat():
+    interval = max(1.0, LEASE_TTL_SEC / 3)
+    while not _hb_stop.wait(interval):
+        try:
+            conn = _connect()
+            renew_leases(conn, _worker, LEASE_TTL_SEC)
+            n = reclaim_expired(conn)
+            conn.close()
+            if n:
+                log.warning(f"[lease] Reclaimed {n} expired leases from stalled workers")
+        except Exception as e:
+            log.warning(f"[lease] Heartbeat failed: {e}")
+
+
+def start_heartbeat():
+    """Start renewing this worker's leases in the background."""
+    global _heartbeat
+    if _heartbeat and _heartbeat.is_alive():
+        return
+    _hb_stop.clear()
+    _heartbeat = threading.Thread(target=_beat, name="lease-heartbeat", daemon=True)
+    _heartbeat.start()
+    log.info(f"[lease] Worker {_worker} (lease TTL {LEASE_TTL_SEC:.0f}s)")
+
+
+def stop_heartbeat():
+    """Stop the heartbeat and hand back any leases still held."""
+    _hb_stop.set()
+    if _heartbeat:
+        _heartbeat.join(timeout=5)
+    try:
+        conn = _connect()
+        n = release_worker(conn, _worker)
+        conn.close()
+        if n:
+            log.info(f"[lease] Released {n} leases on shutdown")
+    except Exception as e:
+        log.warning(f"[lease] Could not release leases: {e}")
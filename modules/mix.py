@@ -1,6 +1,11 @@
 from .config import *
+from .db import SEED_FINAL, SEED_MIX, advance_seed, seed_failed, seed_ids_in_state
+from .lease import leased
+from .trace import check_output_cmd, run_cmd, traced
 
 
+@leased("SEED", SEED_MIX)
+@traced("mix")
 def mix_process_seed(seed_id: int):
     video_file = f"{BASE_DIR}/temp/video/{seed_id}.mp4"
     audio_file = f"{BASE_DIR}/temp/audio/{seed_id}.wav"
@@ -13,7 +18,7 @@ def mix_process_seed(seed_id: int):
 
     # Get video duration
     video_dur = float(
-        subprocess.check_output(
+        check_output_cmd(
             shlex.split(f'ffprobe -v error -show_entries format=duration '
                         f'-of default=noprint_wrappers=1:nokey=1 "{video_file}"'),
             text=True,
@@ -21,7 +26,7 @@ def mix_process_seed(seed_id: int):
     )
 
     # Extract audio track from the video
-    subprocess.run(
+    run_cmd(
         ["ffmpeg", "-i", video_file,
          "-af", f"aresample=async=1000,apad=pad_dur={video_dur}",
          "-to", str(video_dur), "-c:a", "pcm_s16le", audio_file],
@@ -48,15 +53,15 @@ def mix_process_seed(seed_id: int):
     mixed     = f"{mix_folder}/mixed.wav"
     final_out = f"{mix_folder}/{seed_id}.wav"
 
-    subprocess.run(["ffmpeg-normalize", audio_file, "-c:a", "pcm_s16le",
-                    "--normalization-type", "rms", "--target-level", "-18",
-                    "-o", norm_in], check=True)
-    subprocess.run(["ffmpeg-normalize", seed_song, "-c:a", "pcm_s16le",
-                    "--normalization-type", "rms", "--target-level", "-23",
-                    "-o", norm_bg], check=True)
+    run_cmd(["ffmpeg-normalize", audio_file, "-c:a", "pcm_s16le",
+             "--normalization-type", "rms", "--target-level", "-18",
+             "-o", norm_in], check=True)
+    run_cmd(["ffmpeg-normalize", seed_song, "-c:a", "pcm_s16le",
+             "--normalization-type", "rms", "--target-level", "-23",
+             "-o", norm_bg], check=True)
 
     # Mix with EQ + echo + low background volume
-    subprocess.run(
+    run_cmd(
         ["ffmpeg", "-i", norm_in, "-stream_loop", "-1", "-i", norm_bg,
          "-filter_complex",
          "[0:a]equalizer=f=100:width_type=o:width=2:g=6,"
@@ -71,38 +76,37 @@ def mix_process_seed(seed_id: int):
          "-map", "[aout]", "-c:a", "pcm_s16le", mixed],
         check=True,
     )
-    subprocess.run(["ffmpeg-normalize", mixed, "-c:a", "pcm_s16le",
-                    "--normalization-type", "rms", "--target-level", "-18",
-                    "-o", final_out], check=True)
+    run_cmd(["ffmpeg-normalize", mixed, "-c:a", "pcm_s16le",
+             "--normalization-type", "rms", "--target-level", "-18",
+             "-o", final_out], check=True)
 
     shutil.copy(final_out, f"{BASE_DIR}/temp/mix/{seed_id}.wav")
 
     conn = sqlite3.connect(DB_PATH)
-    conn.execute(
-        "UPDATE seed SET seedMixStamp=datetime('now','localtime') WHERE seedId=?",
-        (seed_id,),
-    )
+    advance_seed(conn, seed_id, SEED_FINAL)
     conn.commit()
     conn.close()
     log.info(f"[mix] Done for seed {seed_id}")
 
 
-def run_mix():
-    """Run the Mix module for one pending seed."""
-    log.info("═══ MODULE: MIX ═══")
+def mix_pending_seeds() -> list[int]:
+    """Seeds with a transition video that still need their audio mix."""
     conn = sqlite3.connect(DB_PATH)
-    row = conn.execute(
-        """SELECT DISTINCT seedId FROM seed
-           WHERE seedTransitionStamp!='0000-00-00 00:00:00'
-           AND seedMixStamp='0000-00-00 00:00:00'
-           AND seedRenderStamp='0000-00-00 00:00:00'
-           AND seedUploadStamp='0000-00-00 00:00:00'"""
-    ).fetchone()
+    seeds = seed_ids_in_state(conn, SEED_MIX)
     conn.close()
-    if not row:
+    return seeds
+
+
+def run_mix():
+    """Run the Mix module for every pending seed."""
+    log.info("═══ MODULE: MIX ═══")
+    seeds = mix_pending_seeds()
+    if not seeds:
         log.info("[mix] No pending seeds")
         return
-    try:
-        mix_process_seed(row[0])
-    except Exception as e:
-        log.error(f"[mix] Seed {row[0]} failed: {e}")
+    for seed_id in seeds:
+        try:
+            mix_process_seed(seed_id)
+        except Exception as e:
+            log.error(f"[mix] Seed {seed_id} failed: {e}")
+            seed_failed(DB_PATH, seed_id, "mix", e)
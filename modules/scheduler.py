@@ -0,0 +1,197 @@
+from .config import *
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .feed       import feed_get_rss_entry, feed_poll, feed_process_batch, feed_process_entry
+from .image      import image_generate_for_seed, image_generate_for_seeds
+from .voice      import voice_process_seed
+from .clip       import clip_make_for_seed
+from .subtitle   import subtitle_complete_task
+from .transition import transition_pending_seeds, transition_process_seed
+from .mix        import mix_pending_seeds, mix_process_seed
+from .final      import final_pending_seeds, final_process_seed
+from .upload     import upload_pending_seeds, upload_process_seed
+from .clean      import clean_pending_seeds, clean_seed
+from .admission  import may_admit
+from .db         import TASK_CLIP, TASK_IMAGE, TASK_SUBTITLE, TASK_VOICE, seed_failed
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# WORK DISCOVERY
+# A seed is only handed to the next scene-level stage once the previous stage
+# has finished *all* of its scenes, so a stage never sees a half-done seed.
+# ──────────────────────────────────────────────────────────────────────────────
+def _ids(sql: str) -> list[int]:
+    conn = sqlite3.connect(DB_PATH)
+    rows = conn.execute(sql).fetchall()
+    conn.close()
+    return [r[0] for r in rows]
+
+
+def _pending_feed() -> list[int]:
+    if not may_admit(DB_PATH, BASE_DIR)[0]:
+        return []
+    return _ids(
+        "SELECT rss.rssId FROM rss LEFT JOIN seed ON rss.rssId = seed.rssId "
+        "WHERE seed.rssId IS NULL ORDER BY rss.rssId"
+    )
+
+
+def _seeds_ready(state: int) -> list[int]:
+    """Seeds with tasks waiting in *state* and none left in an earlier state."""
+    return _ids(
+        f"""SELECT DISTINCT seedId FROM task WHERE taskState = {state}
+            AND seedId NOT IN (SELECT seedId FROM task WHERE taskState < {state})
+            ORDER BY seedId"""
+    )
+
+
+def _pending_image() -> list[int]:
+    return _ids(f"SELECT DISTINCT seedId FROM task WHERE taskState = {TASK_IMAGE} ORDER BY seedId")
+
+
+def _pending_voice() -> list[int]:
+    return _seeds_ready(TASK_VOICE)
+
+
+def _pending_clip() -> list[int]:
+    return _seeds_ready(TASK_CLIP)
+
+
+def _pending_subtitle() -> list[int]:
+    return _ids(f"SELECT taskId FROM task WHERE taskState = {TASK_SUBTITLE} ORDER BY seedId, sceneNumber")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# STAGES
+# ──────────────────────────────────────────────────────────────────────────────
+RESOURCE_WORKERS = {
+    "gpu": SCHED_GPU_WORKERS,
+    "cpu": SCHED_CPU_WORKERS,
+    "net": SCHED_NET_WORKERS,
+}
+
+
+class Stage:
+    """One pipeline step: how to find its work units and how to run one."""
+
+    def __init__(self, name: str, resource: str, pending, run_unit,
+                 concurrency: int = 1, batch: int = 1, run_many=None):
+        self.name        = name
+        self.resource    = resource
+        self.pending     = pending
+        self.run_unit    = run_unit
+        self.run_many    = run_many     # takes the whole batch at once, if given
+        self.concurrency = int(os.getenv(f"SCHED_{name.upper()}_CONCURRENCY", concurrency))
+        self.batch       = max(1, int(os.getenv(f"SCHED_{name.upper()}_BATCH", batch)))
+
+
+def _feed_unit(rss_id: int):
+    feed_process_entry(feed_get_rss_entry(rss_id))
+
+
+def _feed_batch(rss_ids: list[int]):
+    feed_process_batch([feed_get_rss_entry(r) for r in rss_ids])
+
+
+def build_stages(skip_upload: bool = False) -> list[Stage]:
+    """Return the stage table in pipeline order (downstream stages drain first)."""
+    stages = [
+        Stage("feed",       "gpu", _pending_feed,            _feed_unit,              batch=FEED_BATCH,
+              run_many=_feed_batch),
+        Stage("image",      "gpu", _pending_image,           image_generate_for_seed,  batch=2,
+              run_many=image_generate_for_seeds),
+        Stage("voice",      "net", _pending_voice,           voice_process_seed,      concurrency=4),
+        Stage("clip",       "cpu", _pending_clip,            clip_make_for_seed,      concurrency=SCHED_CPU_WORKERS),
+        Stage("subtitle",   "cpu", _pending_subtitle,        subtitle_complete_task,  concurrency=SCHED_CPU_WORKERS, batch=6),
+        Stage("transition", "cpu", transition_pending_seeds, transition_process_seed, concurrency=SCHED_CPU_WORKERS),
+        Stage("mix",        "cpu", mix_pending_seeds,        mix_process_seed,        concurrency=SCHED_CPU_WORKERS),
+        Stage("final",      "cpu", final_pending_seeds,      final_process_seed,      concurrency=SCHED_CPU_WORKERS),
+        Stage("upload",     "net", upload_pending_seeds,     upload_process_seed),
+        Stage("clean",      "cpu", clean_pending_seeds,      clean_seed),
+    ]
+    if skip_upload:
+        stages = [s for s in stages if s.name != "upload"]
+    # Prefer finishing videos over starting new ones when a pool is contended
+    return list(reversed(stages))
+
+
+# Stages whose work unit is a seedId; a unit that raises is recorded on the seed
+_SEED_UNITS = {"image", "voice", "clip", "transition", "mix", "final", "upload", "clean"}
+
+
+def _run_batch(stage: Stage, units: list):
+    if stage.run_many:
+        try:
+            stage.run_many(units)
+        except Exception as e:
+            log.error(f"[sched] {stage.name} batch {units} failed: {e}", exc_info=True)
+        return
+    for unit in units:
+        try:
+            stage.run_unit(unit)
+        except Exception as e:
+            log.error(f"[sched] {stage.name} unit {unit} failed: {e}", exc_info=True)
+            if stage.name in _SEED_UNITS:
+                seed_failed(DB_PATH, unit, stage.name, e)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# SCHEDULER LOOP
+# ──────────────────────────────────────────────────────────────────────────────
+def run_scheduler(skip_upload: bool = False, fetch: bool = True) -> int:
+    """Stream seeds through all stages until no stage has work left.
+
+    Each resource class gets its own thread pool so Flux can render seed N+1
+    while ffmpeg is busy with seed N.  A unit is dispatched at most once per
+    call, so a failing unit is retried on the next run rather than spinning.
+    Returns the number of units dispatched.
+    """
+    stages  = build_stages(skip_upload)
+    pools   = {res: ThreadPoolExecutor(max_workers=max(1, n), thread_name_prefix=f"sched-{res}")
+               for res, n in RESOURCE_WORKERS.items()}
+    running = {s.name: 0 for s in stages}
+    seen    = {s.name: set() for s in stages}
+    inflight = {}
+    dispatched = 0
+
+    log.info("[sched] Workers: " + ", ".join(f"{r}={n}" for r, n in RESOURCE_WORKERS.items()))
+    if fetch:
+        inflight[pools["net"].submit(feed_poll)] = None
+
+    try:
+        while True:
+            for stage in stages:
+                free = stage.concurrency - running[stage.name]
+                if free <= 0:
+                    continue
+                try:
+                    units = [u for u in stage.pending() if u not in seen[stage.name]]
+                except Exception as e:
+                    log.error(f"[sched] {stage.name}: pending query failed: {e}")
+                    continue
+                while free > 0 and units:
+                    batch, units = units[:stage.batch], units[stage.batch:]
+                    seen[stage.name].update(batch)
+                    fut = pools[stage.resource].submit(_run_batch, stage, batch)
+                    inflight[fut] = stage
+                    running[stage.name] += 1
+                    dispatched += len(batch)
+                    free -= 1
+                    log.info(f"[sched] {stage.name} ← {batch}")
+
+            if not inflight:
+                break
+            done, _ = wait(list(inflight), timeout=SCHED_POLL_SEC, return_when=FIRST_COMPLETED)
+            for fut in done:
+                stage = inflight.pop(fut)
+                if stage is not None:
+                    running[stage.name] -= 1
+                if fut.exception():
+                    log.error(f"[sched] job failed: {fut.exception()}")
+    finally:
+        for pool in pools.values():
+            pool.shutdown(wait=True)
+
+    log.info(f"[sched] Drained — {dispatched} units processed")
+    return dispatched
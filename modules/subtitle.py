@@ -1,4 +1,8 @@
 from .config import *
+from .config import _get_whisper
+from .db import TASK_DONE, TASK_SUBTITLE, advance_task, task_ids_in_state
+from .lease import leased
+from .trace import run_cmd, span, traced
 
 
 def _format_ass_time(seconds: float) -> str:
@@ -77,13 +81,14 @@ def subtitle_process_task(task_id: int):
     video_out  = os.path.join(sub_dir, "video.mp4")
 
     # Extract audio
-    subprocess.run(
+    run_cmd(
         ["ffmpeg", "-i", video_in, "-vn", "-acodec", "libmp3lame", "-q:a", "2", audio_tmp, "-y"],
         check=True, capture_output=True,
     )
 
     # Transcribe (model loaded once and cached for the whole process)
-    result = _get_whisper().transcribe(audio_tmp, word_timestamps=True)
+    with GPU_LOCK, span("whisper"):
+        result = _get_whisper().transcribe(audio_tmp, word_timestamps=True)
     words = [
         {"word": w["word"].strip(), "start": w["start"], "end": w["end"]}
         for seg in result["segments"] for w in seg["words"]
@@ -92,7 +97,7 @@ def subtitle_process_task(task_id: int):
     # Build & burn subtitles
     lines = _split_into_lines(words)
     _write_ass(lines, ass_path)
-    subprocess.run(
+    run_cmd(
         ["ffmpeg", "-i", video_in, "-vf", f"ass={ass_path}",
          "-c:v", "libx264", "-preset", "medium", "-crf", "22",
          "-c:a", "aac", "-b:a", "192k", video_out, "-y"],
@@ -101,30 +106,26 @@ def subtitle_process_task(task_id: int):
     log.info(f"[subtitle] Created: {video_out}")
 
 
+@leased("TASK", TASK_SUBTITLE)
+@traced("subtitle", key="task")
+def subtitle_complete_task(task_id: int):
+    """Burn subtitles for one task and mark it done."""
+    subtitle_process_task(task_id)
+    conn = sqlite3.connect(DB_PATH)
+    advance_task(conn, task_id, TASK_DONE)
+    conn.commit()
+    conn.close()
+
+
 def run_subtitle():
     """Run the Subtitle module for all pending tasks."""
     log.info("═══ MODULE: SUBTITLE ═══")
     conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        """SELECT DISTINCT taskId FROM task
-           WHERE sceneImageDate!='0000-00-00 00:00:00'
-           AND sceneAudioDate!='0000-00-00 00:00:00'
-           AND sceneClipDate!='0000-00-00 00:00:00'
-           AND sceneSubtitleDate='0000-00-00 00:00:00'"""
-    )
-    tasks = cursor.fetchall()
+    tasks = [task_id for task_id, _, _ in task_ids_in_state(conn, TASK_SUBTITLE)]
     conn.close()
     log.info(f"[subtitle] {len(tasks)} pending tasks")
-    for (task_id,) in tasks:
+    for task_id in tasks:
         try:
-            subtitle_process_task(task_id)
-            conn2 = sqlite3.connect(DB_PATH)
-            conn2.execute(
-                "UPDATE task SET sceneSubtitleDate=datetime('now','localtime') WHERE taskId=?",
-                (task_id,),
-            )
-            conn2.commit()
-            conn2.close()
+            subtitle_complete_task(task_id)
         except Exception as e:
             log.error(f"[subtitle] Task {task_id} failed: {e}")
@@ -0,0 +1,150 @@
+from .config import *
+
+import contextvars
+import functools
+import uuid
+from contextlib import contextmanager
+
+from .db import ensure_span_table
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# SPANS
+# Every stage unit and every expensive sub-step (LLM call, Flux inference,
+# TTS request, ffmpeg/ffprobe run, upload chunk) is timed into the SPAN table.
+# Child spans inherit seed/task/stage from the enclosing span through a
+# contextvar, so call sites only name what they are doing.
+# ──────────────────────────────────────────────────────────────────────────────
+_current = contextvars.ContextVar("span", default=None)
+_ready   = False
+# Open stage root spans -> whether another stage ran while they were open.
+# Peak memory is a process-wide counter, so only a stage that ran alone owns it.
+_stage_roots = {}
+_roots_lock  = threading.Lock()
+
+
+class Span:
+    __slots__ = ("id", "parent", "trace", "name", "stage", "seed_id", "task_id",
+                 "detail", "start", "ok")
+
+    def __init__(self, name, stage, seed_id, task_id, detail, parent):
+        self.id      = uuid.uuid4().hex[:16]
+        self.parent  = parent.id if parent else None
+        self.trace   = parent.trace if parent else self.id
+        self.name    = name
+        self.stage   = stage or (parent.stage if parent else None)
+        self.seed_id = seed_id if seed_id is not None else (parent.seed_id if parent else None)
+        self.task_id = task_id if task_id is not None else (parent.task_id if parent else None)
+        self.detail  = detail
+        self.start   = time.time()
+        self.ok      = True
+
+
+def _write(sp: Span, end: float):
+    global _ready
+    try:
+        conn = sqlite3.connect(DB_PATH, timeout=30)
+        if not _ready:
+            ensure_span_table(conn)
+            _ready = True
+        seed_id = sp.seed_id
+        if seed_id is None and sp.task_id is not None:
+            row = conn.execute("SELECT seedId FROM TASK WHERE taskId=?", (sp.task_id,)).fetchone()
+            seed_id = row[0] if row else None
+        conn.execute(
+            """INSERT INTO SPAN (spanId, parentId, traceId, stage, name, seedId, taskId,
+                                 startTs, endTs, durMs, ok, detail)
+               VALUES (?,?,?,?,?,?,?,?,?,?,?,?)""",
+            (sp.id, sp.parent, sp.trace, sp.stage, sp.name, seed_id, sp.task_id,
+             sp.start, end, (end - sp.start) * 1000, int(sp.ok),
+             json.dumps(sp.detail) if sp.detail else None),
+        )
+        # A root span that learned its seed late (feed) back-fills its children
+        if sp.parent is None and seed_id is not None:
+            conn.execute("UPDATE SPAN SET seedId=? WHERE traceId=? AND seedId IS NULL",
+                         (seed_id, sp.trace))
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        log.debug(f"[trace] span write failed: {e}")
+
+
+@contextmanager
+def span(name: str, stage: str | None = None, seed_id: int | None = None,
+         task_id: int | None = None, **detail):
+    """Time the enclosed block and record it as one SPAN row.
+
+    A root span of a stage also records the process's peak RSS (and CUDA
+    allocation) while it ran as rss_mb / cuda_mb, unless another stage
+    overlapped it (--pipelined); then it records peak_shared instead.
+    """
+    sp = Span(name, stage, seed_id, task_id, detail, _current.get())
+    stage_root = stage is not None and sp.parent is None
+    if stage_root:
+        with _roots_lock:
+            if _stage_roots:
+                for other in _stage_roots:
+                    _stage_roots[other] = True
+                _stage_roots[sp.id] = True
+            else:
+                reset_peak_memory()
+                _stage_roots[sp.id] = False
+    token = _current.set(sp)
+    try:
+        yield sp
+    except BaseException:
+        sp.ok = False
+        raise
+    finally:
+        _current.reset(token)
+        if stage_root:
+            with _roots_lock:
+                if _stage_roots.pop(sp.id):
+                    sp.detail["peak_shared"] = True
+                else:
+                    sp.detail.update(peak_memory())
+        _write(sp, time.time())
+
+
+def attach_seed(trace_id: str, seed_id: int):
+    """Tag every span of a finished trace with *seed_id* (feed learns it after the fact)."""
+    try:
+        conn = sqlite3.connect(DB_PATH, timeout=30)
+        conn.execute("UPDATE SPAN SET seedId=? WHERE traceId=? AND seedId IS NULL",
+                     (seed_id, trace_id))
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        log.debug(f"[trace] span update failed: {e}")
+
+
+def traced(stage: str, key: str = "seed"):
+    """Decorator recording a stage span for a function whose first argument is
+    a seed id (``key="seed"``) or task id (``key="task"``)."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(unit, *args, **kwargs):
+            with span(stage, stage=stage, **{f"{key}_id": unit}):
+                return fn(unit, *args, **kwargs)
+        return wrapper
+    return deco
+
+
+def _cmd_span(cmd) -> tuple[str, dict]:
+    name = os.path.basename(cmd[0] if isinstance(cmd, (list, tuple)) else shlex.split(cmd)[0])
+    last = cmd[-1] if isinstance(cmd, (list, tuple)) else None
+    return name, ({"file": os.path.basename(str(last))} if last else {})
+
+
+def run_cmd(cmd, **kwargs) -> subprocess.CompletedProcess:
+    """subprocess.run wrapped in a span named after the executable."""
+    name, detail = _cmd_span(cmd)
+    with span(name, **detail):
+        return subprocess.run(cmd, **kwargs)
+
+
+def check_output_cmd(cmd, **kwargs):
+    """subprocess.check_output wrapped in a span named after the executable."""
+    name, detail = _cmd_span(cmd)
+    with span(name, **detail):
+        return subprocess.check_output(cmd, **kwargs)
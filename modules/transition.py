@@ -1,9 +1,12 @@
 from .config import *
 from .clip import _ffprobe_duration
+from .db import SEED_MIX, SEED_TRANSITION, TASK_DONE, advance_seed, seed_failed, seed_ids_in_state, task_ids_in_state
+from .lease import leased
+from .trace import run_cmd, traced
 
 
 def _extract_segment(src: str, dst: str, start: float, dur: float):
-    subprocess.run(
+    run_cmd(
         ["ffmpeg", "-ss", str(start), "-i", src, "-t", str(dur),
          "-c:v", "libx264", "-preset", "fast", "-crf", "22",
          "-pix_fmt", "yuv420p", "-c:a", "aac", "-y", dst],
@@ -12,7 +15,7 @@ def _extract_segment(src: str, dst: str, start: float, dur: float):
 
 
 def _has_audio(path: str) -> bool:
-    result = subprocess.run(
+    result = run_cmd(
         ["ffprobe", "-i", path, "-show_streams", "-select_streams", "a", "-loglevel", "error"],
         stdout=subprocess.PIPE,
     )
@@ -34,7 +37,7 @@ def _create_transition(seg1: str, seg2: str, out: str, ttype: str):
         elif a2: cmd += ["-map", "1:a"]
     cmd += ["-c:v", "libx264", "-preset", "fast", "-crf", "22",
             "-pix_fmt", "yuv420p", "-c:a", "aac", "-shortest", "-y", out]
-    subprocess.run(cmd, check=True, stderr=subprocess.PIPE)
+    run_cmd(cmd, check=True, stderr=subprocess.PIPE)
 
 
 def transition_make_video(video_paths: list, output_path: str) -> str:
@@ -78,62 +81,62 @@ def transition_make_video(video_paths: list, output_path: str) -> str:
 
     cmd = ["ffmpeg", "-f", "concat", "-safe", "0", "-i", concat_file, "-c", "copy", "-y", output_path]
     try:
-        subprocess.run(cmd, check=True, stderr=subprocess.PIPE)
+        run_cmd(cmd, check=True, stderr=subprocess.PIPE)
     except subprocess.CalledProcessError:
         # Fallback with re-encode
         cmd[-3:-1] = ["-c:v", "libx264", "-preset", "medium", "-crf", "22",
                       "-pix_fmt", "yuv420p", "-c:a", "aac"]
-        subprocess.run(cmd, check=True, stderr=subprocess.PIPE)
+        run_cmd(cmd, check=True, stderr=subprocess.PIPE)
 
     log.info(f"[transition] Output: {output_path}")
     return tmp
 
 
-def run_transition():
-    """Run the Transition module for one pending seed."""
-    log.info("═══ MODULE: TRANSITION ═══")
+def transition_pending_seeds() -> list[int]:
+    """Seeds whose every scene is subtitled but which have no transition video yet."""
     conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        """SELECT DISTINCT seedId FROM seed
-           WHERE seedTransitionStamp='0000-00-00 00:00:00'
-           AND seedMixStamp='0000-00-00 00:00:00'
-           AND seedRenderStamp='0000-00-00 00:00:00'
-           AND seedUploadStamp='0000-00-00 00:00:00'
-           ORDER BY seedId ASC LIMIT 1"""
-    )
-    row = cursor.fetchone()
-    if not row:
-        log.info("[transition] No pending seeds")
-        conn.close()
-        return
-    seed_id = row[0]
-    cursor.execute(
-        """SELECT DISTINCT taskId FROM task
-           WHERE sceneImageDate!='0000-00-00 00:00:00'
-           AND sceneAudioDate!='0000-00-00 00:00:00'
-           AND sceneClipDate!='0000-00-00 00:00:00'
-           AND sceneSubtitleDate!='0000-00-00 00:00:00'
-           AND seedId=?""",
-        (seed_id,),
-    )
-    task_ids = cursor.fetchall()
+    seeds = seed_ids_in_state(conn, SEED_TRANSITION)
+    conn.close()
+    return seeds
+
+
+@leased("SEED", SEED_TRANSITION)
+@traced("transition")
+def transition_process_seed(seed_id: int):
+    """Join the subtitled scene clips of one seed into temp/video/{seed_id}.mp4."""
+    conn = sqlite3.connect(DB_PATH)
+    task_ids = task_ids_in_state(conn, TASK_DONE, seed_id)
 
     videos = [f"{BASE_DIR}/temp/subtitle/{tid}/video.mp4"
-              for (tid,) in task_ids
+              for tid, _, _ in task_ids
               if os.path.exists(f"{BASE_DIR}/temp/subtitle/{tid}/video.mp4")]
 
     os.makedirs(f"{BASE_DIR}/temp/video", exist_ok=True)
     out = f"{BASE_DIR}/temp/video/{seed_id}.mp4"
 
     try:
-        transition_make_video(videos, out)
-        cursor.execute(
-            "UPDATE seed SET seedTransitionStamp=datetime('now','localtime') WHERE seedId=?",
-            (seed_id,),
-        )
+        tmp = transition_make_video(videos, out)
+        advance_seed(conn, seed_id, SEED_MIX)
         conn.commit()
+        # Scratch segments are only needed until the concat succeeds
+        shutil.rmtree(tmp, ignore_errors=True)
     except Exception as e:
         log.error(f"[transition] Seed {seed_id} failed: {e}")
     finally:
         conn.close()
+
+
+def run_transition():
+    """Run the Transition module for every seed whose scenes are all subtitled."""
+    log.info("═══ MODULE: TRANSITION ═══")
+    seeds = transition_pending_seeds()
+    if not seeds:
+        log.info("[transition] No pending seeds")
+        return
+    log.info(f"[transition] {len(seeds)} pending seeds")
+    for seed_id in seeds:
+        try:
+            transition_process_seed(seed_id)
+        except Exception as e:
+            log.error(f"[transition] Seed {seed_id} failed: {e}")
+            seed_failed(DB_PATH, seed_id, "transition", e)
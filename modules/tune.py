@@ -0,0 +1,95 @@
+"""
+pipeline.py --tune-llm: find the fastest llama.cpp runtime settings here.
+
+Each candidate loads the model afresh and times a throwaway prompt
+(llm_speed).  Candidates are ranked by the time a typical draft call would
+take on them — mostly decode, since a draft writes more than it reads.
+The winner is written to LLAMA_PROFILE, which _get_llm() applies from then
+on.  Run it on an otherwise idle machine.
+"""
+
+from .config import *
+
+import gc
+import itertools
+
+# Shape of a typical draft call: system prompt + article in, six scenes out
+_PREFILL_TOKENS = 1200
+_DECODE_TOKENS  = 1500
+# Probe size per candidate
+_PROBE_PROMPT = 512
+_PROBE_GEN    = 64
+
+
+def _thread_counts() -> list[int]:
+    cpus = os.cpu_count() or 4
+    return sorted({max(1, cpus // 4), max(1, cpus // 2), max(1, cpus * 3 // 4), cpus})
+
+
+def _measure(settings: dict) -> tuple[float, float, float] | None:
+    """(load seconds, prefill tok/s, decode tok/s) with *settings*; None if it fails."""
+    from llama_cpp import Llama
+    t0 = time.perf_counter()
+    try:
+        llm = Llama(model_path=LLAMA_MODEL_PATH, n_ctx=LLAMA_N_CTX, n_gpu_layers=LLAMA_N_GPU,
+                    verbose=False, **settings)
+        load = time.perf_counter() - t0
+        prefill, decode = llm_speed(llm, _PROBE_PROMPT, _PROBE_GEN)
+    except Exception as e:
+        log.warning(f"[tune] {settings}: {e}")
+        return None
+    del llm
+    gc.collect()
+    return load, prefill, decode
+
+
+def _cost(prefill: float, decode: float) -> float:
+    """Seconds a typical draft call would take."""
+    return _PREFILL_TOKENS / prefill + _DECODE_TOKENS / decode
+
+
+def _run(grid: list[dict]) -> list[tuple[dict, float, float, float]]:
+    results = []
+    for settings in grid:
+        m = _measure(settings)
+        if m is None:
+            continue
+        load, prefill, decode = m
+        log.info(f"[tune] {', '.join(f'{k}={v}' for k, v in settings.items())}: "
+                 f"load {load:.1f}s, prefill {prefill:.0f} tok/s, decode {decode:.1f} tok/s")
+        results.append((settings, load, prefill, decode))
+    return results
+
+
+def tune_llm():
+    """Benchmark a grid of llama.cpp settings and save the fastest as the profile."""
+    log.info("═══ TUNE: LLM ═══")
+    log.info(f"[tune] Model {LLAMA_MODEL_PATH}, n_ctx={LLAMA_N_CTX}, n_gpu_layers={LLAMA_N_GPU}")
+
+    # 1. Compute: thread count, batch size, flash attention
+    grid = [{"n_threads": t, "n_threads_batch": t, "n_batch": b, "flash_attn": fa}
+            for t, b, fa in itertools.product(_thread_counts(), (256, 512), (False, True))]
+    results = _run(grid)
+    if not results:
+        log.error("[tune] No setting could load the model")
+        return
+    best = min(results, key=lambda r: _cost(r[2], r[3]))[0]
+
+    # Prefill scales with more threads than decode does; give it its own count
+    same = [r for r in results
+            if r[0]["n_batch"] == best["n_batch"] and r[0]["flash_attn"] == best["flash_attn"]]
+    best = {**best, "n_threads_batch": max(same, key=lambda r: r[2])[0]["n_threads"]}
+
+    # 2. Memory: mmap, mmap + mlock (no paging out under render load), or read into RAM.
+    # Every cron run loads the model, so load time counts here.
+    results = _run([{**best, "use_mmap": mmap, "use_mlock": mlock}
+                    for mmap, mlock in ((True, False), (True, True), (False, False))])
+    if not results:
+        log.error("[tune] No memory setting could load the model")
+        return
+    settings, load, prefill, decode = min(results, key=lambda r: r[1] + _cost(r[2], r[3]))
+
+    save_llm_profile(settings, prefill, decode)
+    log.info(f"[tune] Saved {LLAMA_PROFILE}: {', '.join(f'{k}={v}' for k, v in settings.items())}")
+    log.info(f"[tune] prefill {prefill:.0f} tok/s, decode {decode:.1f} tok/s — "
+             f"a typical draft call ≈ {_cost(prefill, decode):.0f}s")
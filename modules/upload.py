@@ -1,4 +1,7 @@
 from .config import *
+from .db import SEED_CLEAN, SEED_UPLOAD, advance_seed, seed_failed, seed_ids_in_state
+from .lease import leased
+from .trace import span, traced
 
 import httplib2
 from googleapiclient import discovery
@@ -47,7 +50,8 @@ def upload_video_to_youtube(file_path: str, title: str, description: str = "") -
     response, retry = None, 0
     while response is None and retry < 3:
         try:
-            status, response = request.next_chunk()
+            with span("upload.chunk", attempt=retry):
+                status, response = request.next_chunk()
             if status:
                 log.info(f"[upload] {int(status.progress()*100)}%")
         except HttpError as e:
@@ -62,33 +66,50 @@ def upload_video_to_youtube(file_path: str, title: str, description: str = "") -
     return None
 
 
-def run_upload():
-    """Upload one ready video to YouTube."""
-    log.info("═══ MODULE: UPLOAD ═══")
+def upload_pending_seeds() -> list[int]:
+    """Seeds rendered to final/ that have not been uploaded yet."""
+    conn = sqlite3.connect(DB_PATH)
+    seeds = seed_ids_in_state(conn, SEED_UPLOAD)
+    conn.close()
+    return seeds
+
+
+@leased("SEED", SEED_UPLOAD)
+@traced("upload")
+def upload_process_seed(seed_id: int) -> bool:
+    """Upload one rendered seed and stamp seedUploadStamp on success."""
     conn = sqlite3.connect(DB_PATH)
     row = conn.execute(
-        """SELECT seedId, seedTitle, seedDescription FROM seed
-           WHERE seedTransitionStamp!='0000-00-00 00:00:00'
-           AND seedMixStamp!='0000-00-00 00:00:00'
-           AND seedRenderStamp!='0000-00-00 00:00:00'
-           AND seedUploadStamp='0000-00-00 00:00:00'
-           LIMIT 1"""
+        "SELECT seedTitle, seedDescription FROM seed WHERE seedId=?", (seed_id,)
     ).fetchone()
     conn.close()
     if not row:
-        log.info("[upload] No videos ready to upload")
-        return
-    seed_id, title, description = row
+        return False
+    title, description = row
     video_path = f"{BASE_DIR}/final/{seed_id}.mp4"
     if not os.path.exists(video_path):
         log.error(f"[upload] File not found: {video_path}")
-        return
+        return False
     vid_id = upload_video_to_youtube(video_path, title, description)
-    if vid_id:
-        conn2 = sqlite3.connect(DB_PATH)
-        conn2.execute(
-            "UPDATE seed SET seedUploadStamp=CURRENT_TIMESTAMP WHERE seedId=?",
-            (seed_id,),
-        )
-        conn2.commit()
-        conn2.close()
+    if not vid_id:
+        return False
+    conn = sqlite3.connect(DB_PATH)
+    advance_seed(conn, seed_id, SEED_CLEAN)
+    conn.commit()
+    conn.close()
+    return True
+
+
+def run_upload():
+    """Upload every ready video to YouTube."""
+    log.info("═══ MODULE: UPLOAD ═══")
+    seeds = upload_pending_seeds()
+    if not seeds:
+        log.info("[upload] No videos ready to upload")
+        return
+    for seed_id in seeds:
+        try:
+            upload_process_seed(seed_id)
+        except Exception as e:
+            log.error(f"[upload] Seed {seed_id} failed: {e}")
+            seed_failed(DB_PATH, seed_id, "upload", e)
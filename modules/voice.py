@@ -1,4 +1,7 @@
 from .config import *
+from .db import TASK_CLIP, TASK_VOICE, advance_task, seed_failed, task_ids_in_state
+from .lease import leased_tasks
+from .trace import span, traced
 
 import edge_tts
 
@@ -15,49 +18,39 @@ async def _tts_scene(seed_id: int, task_id: int, scene_number: int, cursor, conn
     out_dir = f"{BASE_DIR}/temp/voice/{scene_id}"
     os.makedirs(out_dir, exist_ok=True)
     audio_path = os.path.join(out_dir, "audio.mp3")
-    communicate = edge_tts.Communicate(scene_text, TTS_VOICE)
-    await communicate.save(audio_path)
-    cursor.execute(
-        "UPDATE task SET sceneAudioDate=datetime('now','localtime') WHERE taskId=?",
-        (task_id,),
-    )
+    with span("tts", task_id=task_id, chars=len(scene_text)):
+        communicate = edge_tts.Communicate(scene_text, TTS_VOICE)
+        await communicate.save(audio_path)
+    advance_task(conn, task_id, TASK_CLIP)
     conn.commit()
     log.info(f"[voice] Saved audio: {audio_path}")
 
 
 async def voice_generate_for_seed(seed_id: int):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        """SELECT taskId, sceneNumber FROM task
-           WHERE sceneImageDate!='0000-00-00 00:00:00'
-           AND sceneAudioDate='0000-00-00 00:00:00'
-           AND seedId=?""",
-        (seed_id,),
-    )
-    tasks = cursor.fetchall()
-    for task_id, scene_number in tasks:
-        await _tts_scene(seed_id, task_id, scene_number, cursor, conn)
-    conn.close()
+    with leased_tasks(TASK_VOICE, seed_id) as tasks:
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+        for task_id, _, scene_number in tasks:
+            await _tts_scene(seed_id, task_id, scene_number, cursor, conn)
+        conn.close()
+
+
+@traced("voice")
+def voice_process_seed(seed_id: int):
+    """Synchronous wrapper so the scheduler can run TTS from a worker thread."""
+    asyncio.run(voice_generate_for_seed(seed_id))
 
 
 def run_voice():
     """Run the Voice module for all pending seeds."""
     log.info("═══ MODULE: VOICE ═══")
     conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        """SELECT DISTINCT seedId FROM task
-           WHERE sceneImageDate!='0000-00-00 00:00:00'
-           AND sceneAudioDate='0000-00-00 00:00:00'
-           AND sceneClipDate='0000-00-00 00:00:00'
-           AND sceneSubtitleDate='0000-00-00 00:00:00'"""
-    )
-    seeds = cursor.fetchall()
+    seeds = sorted({seed_id for _, seed_id, _ in task_ids_in_state(conn, TASK_VOICE)})
     conn.close()
     log.info(f"[voice] {len(seeds)} pending seeds")
-    for (seed_id,) in seeds:
+    for seed_id in seeds:
         try:
-            asyncio.run(voice_generate_for_seed(seed_id))
+            voice_process_seed(seed_id)
         except Exception as e:
             log.error(f"[voice] Seed {seed_id} failed: {e}")
+            seed_failed(DB_PATH, seed_id, "voice", e)
@@ -11,6 +11,11 @@ Usage
   python pipeline.py                    # run all modules (state-aware)
   python pipeline.py --module feed      # run one module manually
   python pipeline.py --output file      # skip YouTube upload, save .mp4 locally
+  python pipeline.py --pipelined        # overlap GPU / CPU / network stages across seeds
+  python pipeline.py --status           # print every stage's pending-work count
+  python pipeline.py --daemon           # stay resident, keep models warm, serve cli.py
+  python pipeline.py --worker box2      # extra worker sharing the queue via leases
+  python pipeline.py --startup-bench    # idle-tick and per-module import timings
 
   make run          # alias for python pipeline.py --output api
   make run-file     # alias for python pipeline.py --output file
@@ -18,19 +23,42 @@ Usage
 """
 
 import argparse
+import importlib
 import logging
 import os
+import signal
 import sqlite3
 import sys
+import threading
+import time
+
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
 
 # ── Bootstrap: load .env so BASE_DIR / DB_PATH are available at import time ──
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-except ImportError:
-    pass
+# A plain KEY=VALUE reader instead of python-dotenv keeps the idle tick on the
+# stdlib; modules.config still runs load_dotenv() once real work starts.
+def _load_env():
+    for path in (os.path.join(os.getcwd(), ".env"), os.path.join(_SCRIPT_DIR, ".env")):
+        try:
+            lines = open(path).read().splitlines()
+        except OSError:
+            continue
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            key, _, value = line.removeprefix("export ").partition("=")
+            value = value.strip()
+            if value[:1] in "'\"" and value[-1:] == value[:1]:
+                value = value[1:-1]
+            else:
+                value = value.split(" #")[0].strip()
+            os.environ.setdefault(key.strip(), value)
+        return
 
-_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_load_env()
 BASE_DIR    = os.getenv("BASE_DIR", _SCRIPT_DIR)
 DB_PATH     = os.path.join(BASE_DIR, "main.db")
 LOCK_FILE   = os.path.join(BASE_DIR, "pipeline.lock")
@@ -47,37 +75,49 @@ logging.basicConfig(
 )
 log = logging.getLogger("pipeline")
 
-# ── Module imports (heavy AI deps loaded lazily inside each module) ───────────
-from modules.feed       import run_feed
-from modules.image      import run_image
-from modules.voice      import run_voice
-from modules.clip       import run_clip
-from modules.subtitle   import run_subtitle
-from modules.transition import run_transition
-from modules.mix        import run_mix
-from modules.final      import run_final
-from modules.upload     import run_upload
-from modules.clean      import run_clean
-
-# ── Manual single-module dispatch table ──────────────────────────────────────
+# ── Stdlib-only imports: everything the idle tick needs ──────────────────────
+from modules.db         import (SEED_UPLOAD, STAGES, any_feed_due, ensure_feed_table,
+                                ensure_lease_columns, ensure_rss_digest, ensure_rss_fingerprint,
+                                ensure_rss_link, ensure_span_table, ensure_stage_counters, stage_snapshot)
+from modules.admission  import admission_state, may_admit
+
+# ── Dispatch table ────────────────────────────────────────────────────────────
+# Stage modules pull in pydantic, feedparser, edge_tts, googleapiclient, torch…
+# They are imported only when their stage actually has work.
 MODULES = {
-    "feed":       run_feed,
-    "image":      run_image,
-    "voice":      run_voice,
-    "clip":       run_clip,
-    "subtitle":   run_subtitle,
-    "transition": run_transition,
-    "mix":        run_mix,
-    "final":      run_final,
-    "upload":     run_upload,
-    "clean":      run_clean,
+    "feed":       "modules.feed:run_feed",
+    "image":      "modules.image:run_image",
+    "voice":      "modules.voice:run_voice",
+    "clip":       "modules.clip:run_clip",
+    "subtitle":   "modules.subtitle:run_subtitle",
+    "transition": "modules.transition:run_transition",
+    "mix":        "modules.mix:run_mix",
+    "final":      "modules.final:run_final",
+    "upload":     "modules.upload:run_upload",
+    "clean":      "modules.clean:run_clean",
 }
 
 
+def _resolve(spec: str):
+    """Import "package.module:attr" on first use and return the attribute."""
+    module, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module), attr)
+
+
+# Bumped whenever _migrate_db learns something new; lets the idle tick skip
+# the ALTER / CREATE round-trips once a database is current.
+SCHEMA_VERSION = 5
+
+
 # ── DB migration ──────────────────────────────────────────────────────────────
 def _migrate_db():
     """Add columns introduced after the initial schema, without dropping data."""
     conn = sqlite3.connect(DB_PATH)
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        conn.close()
+        return
+    # WAL lets the pipelined scheduler's worker threads read while one writes
+    conn.execute("PRAGMA journal_mode=WAL")
     for col, definition in [
         ("seedErrorStep", "TEXT DEFAULT NULL"),
         ("seedErrorMsg",  "TEXT DEFAULT NULL"),
@@ -87,79 +127,65 @@ def _migrate_db():
             log.info(f"[db] Added column SEED.{col}")
         except sqlite3.OperationalError:
             pass
+    if ensure_stage_counters(conn):
+        log.info("[db] Backfilled STAGE_COUNT")
+    ensure_span_table(conn)
+    ensure_lease_columns(conn)
+    ensure_rss_link(conn)
+    ensure_rss_fingerprint(conn)
+    ensure_rss_digest(conn)
+    ensure_feed_table(conn)
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
     conn.commit()
     conn.close()
 
 
-# ── State-check helpers (fast DB queries, no model loading) ───────────────────
-def _count(sql: str) -> int:
+# ── State-check helpers (one query against trigger-maintained counters) ──────
+def _pending_snapshot() -> dict:
+    """Return {stage: pending} for all stages from a single STAGE_COUNT read."""
     try:
         conn = sqlite3.connect(DB_PATH)
-        n = conn.execute(sql).fetchone()[0]
+        snap = stage_snapshot(conn)
         conn.close()
-        return n
+        return snap
     except Exception:
-        return 0
-
+        return dict.fromkeys(STAGES, 0)
 
-def _pending_feed():
-    return _count(
-        "SELECT COUNT(*) FROM RSS "
-        "WHERE rssId NOT IN (SELECT DISTINCT rssId FROM SEED WHERE rssId IS NOT NULL)"
-    )
-
-def _pending_image():
-    return _count("SELECT COUNT(*) FROM TASK WHERE sceneImageDate='0000-00-00 00:00:00'")
 
-def _pending_voice():
-    return _count(
-        "SELECT COUNT(*) FROM TASK "
-        "WHERE sceneImageDate!='0000-00-00 00:00:00' AND sceneAudioDate='0000-00-00 00:00:00'"
-    )
-
-def _pending_clip():
-    return _count(
-        "SELECT COUNT(*) FROM TASK "
-        "WHERE sceneAudioDate!='0000-00-00 00:00:00' AND sceneClipDate='0000-00-00 00:00:00'"
-    )
-
-def _pending_subtitle():
-    return _count(
-        "SELECT COUNT(*) FROM TASK "
-        "WHERE sceneClipDate!='0000-00-00 00:00:00' AND sceneSubtitleDate='0000-00-00 00:00:00'"
-    )
-
-def _pending_transition():
-    return _count(
-        """SELECT COUNT(*) FROM SEED
-           WHERE seedTransitionStamp='0000-00-00 00:00:00'
-           AND seedId IN (SELECT DISTINCT seedId FROM TASK WHERE sceneSubtitleDate!='0000-00-00 00:00:00')
-           AND seedId NOT IN (SELECT DISTINCT seedId FROM TASK WHERE sceneSubtitleDate='0000-00-00 00:00:00')"""
-    )
-
-def _pending_mix():
-    return _count(
-        "SELECT COUNT(*) FROM SEED "
-        "WHERE seedTransitionStamp!='0000-00-00 00:00:00' AND seedMixStamp='0000-00-00 00:00:00'"
-    )
-
-def _pending_final():
-    return _count(
-        "SELECT COUNT(*) FROM SEED "
-        "WHERE seedMixStamp!='0000-00-00 00:00:00' AND seedRenderStamp='0000-00-00 00:00:00'"
-    )
+def _feed_due() -> bool:
+    """True when some FEED subscription is due for a poll."""
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        due  = any_feed_due(conn)
+        conn.close()
+        return due
+    except sqlite3.Error:
+        return False
+
+
+def print_status():
+    """Print the pending-work snapshot (pipeline.py --status)."""
+    _migrate_db()
+    snap = _pending_snapshot()
+    width = max(len(s) for s in STAGES)
+    for stage in STAGES:
+        print(f"  {stage:<{width}}  {snap[stage]:>6}")
+    print(f"  {'total':<{width}}  {sum(snap.values()):>6}")
+    conn = sqlite3.connect(DB_PATH)
+    adm  = admission_state(conn, BASE_DIR, fresh=True)
+    conn.close()
+    print(f"  admission: {'open' if adm['admit'] else 'paused — ' + adm['reason']} "
+          f"({adm['inflight']} seeds in flight, {adm['scratch_bytes'] / 1024**3:.1f} GB scratch)")
 
-def _pending_upload():
-    return _count(
-        "SELECT COUNT(*) FROM SEED "
-        "WHERE seedRenderStamp!='0000-00-00 00:00:00' AND seedUploadStamp='0000-00-00 00:00:00'"
-    )
 
-def _pending_clean():
-    return _count("SELECT COUNT(*) FROM SEED WHERE seedUploadStamp!='0000-00-00 00:00:00'")
+# ── Lockfile ──────────────────────────────────────────────────────────────────
+# pipeline.lock keeps cron from stacking runs.  Named workers (--worker) each
+# get their own lock file and coordinate with everyone else through leases.
+def _use_worker_lock(name: str):
+    global LOCK_FILE
+    LOCK_FILE = os.path.join(BASE_DIR, f"pipeline-{name}.lock")
 
 
-# ── Lockfile ──────────────────────────────────────────────────────────────────
 def _acquire_lock() -> bool:
     if os.path.exists(LOCK_FILE):
         try:
@@ -185,8 +211,7 @@ def _release_lock():
 def _print_output_files():
     conn = sqlite3.connect(DB_PATH)
     rows = conn.execute(
-        "SELECT seedId, seedTitle FROM SEED "
-        "WHERE seedUploadStamp='0000-00-00 00:00:00' AND seedRenderStamp!='0000-00-00 00:00:00'"
+        f"SELECT seedId, seedTitle FROM SEED WHERE seedState = {SEED_UPLOAD}"
     ).fetchall()
     conn.close()
     if not rows:
@@ -200,53 +225,228 @@ def _print_output_files():
 
 
 # ── Main orchestrator ─────────────────────────────────────────────────────────
-def run_pipeline(skip_upload: bool = False):
+def _runnable(snap: dict, skip_upload: bool = False, feed: bool = True) -> list[str]:
+    """Stages in *snap* that have work this pass is allowed to start."""
+    stages = [s for s in STAGES if snap[s] and not (skip_upload and s == "upload")
+              and (feed or s != "feed")]
+    if "feed" in stages:
+        admit, why = may_admit(DB_PATH, BASE_DIR)
+        if not admit:
+            log.info(f"[pipeline] feed: {snap['feed']} pending — paused, {why}")
+            stages.remove("feed")
+    # A due subscription is work too, even with no RSS rows waiting
+    if feed and "feed" not in stages and _feed_due():
+        log.info("[pipeline] feed: subscriptions due — polling")
+        stages.insert(0, "feed")
+    return stages
+
+
+def _run_once(skip_upload: bool = False, pipelined: bool = False) -> bool:
+    """One pass over every stage with pending work; return True if any ran."""
+    if pipelined:
+        run_scheduler = _resolve("modules.scheduler:run_scheduler")
+        work_done = run_scheduler(skip_upload=skip_upload) > 0
+        if work_done and skip_upload:
+            _print_output_files()
+        return work_done
+
+    snap = _pending_snapshot()
+    runnable = _runnable(snap, skip_upload)
+    work_done = False
+    for name in STAGES:
+        if name not in runnable:
+            log.debug(f"[pipeline] {name}: nothing to run")
+            continue
+        log.info(f"[pipeline] {name}: {snap[name]} pending — running")
+        work_done = True
+        from modules.config import peak_memory, reset_peak_memory
+        reset_peak_memory()
+        try:
+            _resolve(MODULES[name])()
+        except Exception as e:
+            log.error(f"[pipeline] {name} failed: {e}", exc_info=True)
+        peak = peak_memory()
+        log.info(f"[pipeline] {name}: peak RSS {peak['rss_mb']} MB"
+                 + (f", CUDA {peak['cuda_mb']} MB" if "cuda_mb" in peak else ""))
+        # This step may have produced work for the next one
+        snap = _pending_snapshot()
+        runnable = _runnable(snap, skip_upload, feed=False)
+
+    if work_done and skip_upload:
+        _print_output_files()
+    elif not work_done:
+        log.debug("[pipeline] Nothing to do.")
+    return work_done
+
+
+def run_pipeline(skip_upload: bool = False, pipelined: bool = False):
     """State-aware pipeline: only loads and runs modules with pending work.
 
     Cron can fire every minute — if nothing is pending the process exits
-    in milliseconds without loading any AI model.
+    in milliseconds without loading any AI model.  With *pipelined* the
+    stages run concurrently through modules.scheduler instead of in order.
     """
     if not _acquire_lock():
         sys.exit(0)
 
     try:
         _migrate_db()
+        if not _runnable(_pending_snapshot(), skip_upload):
+            log.debug("[pipeline] Nothing to do.")
+            return
+        from modules.lease import start_heartbeat, stop_heartbeat
+        start_heartbeat()
+        try:
+            _run_once(skip_upload, pipelined)
+        finally:
+            stop_heartbeat()
+    finally:
+        _release_lock()
 
-        steps = [
-            (_pending_feed,       "feed",       run_feed,       True),
-            (_pending_image,      "image",      run_image,      True),
-            (_pending_voice,      "voice",      run_voice,      True),
-            (_pending_clip,       "clip",       run_clip,       True),
-            (_pending_subtitle,   "subtitle",   run_subtitle,   True),
-            (_pending_transition, "transition", run_transition, True),
-            (_pending_mix,        "mix",        run_mix,        True),
-            (_pending_final,      "final",      run_final,      True),
-            (_pending_upload,     "upload",     run_upload,     not skip_upload),
-            (_pending_clean,      "clean",      run_clean,      True),
-        ]
-
-        work_done = False
-        for pending_fn, name, run_fn, enabled in steps:
-            if not enabled:
-                continue
-            n = pending_fn()
-            if n == 0:
-                log.debug(f"[pipeline] {name}: nothing pending")
-                continue
-            log.info(f"[pipeline] {name}: {n} pending — running")
-            work_done = True
-            try:
-                run_fn()
-            except Exception as e:
-                log.error(f"[pipeline] {name} failed: {e}", exc_info=True)
 
-        if work_done and skip_upload:
-            _print_output_files()
-        elif not work_done:
-            log.debug("[pipeline] Nothing to do.")
+# ── Resident daemon ───────────────────────────────────────────────────────────
+def run_daemon(skip_upload: bool = False, pipelined: bool = False, serve: bool = True):
+    """Stay resident, keep models warm between passes, and serve cli.py.
+
+    The daemon holds pipeline.lock for its whole life, so cron ticks exit
+    immediately while it runs.  It wakes every DAEMON_POLL_SEC, or at once
+    when cli.py sends "run"; models idle past their *_IDLE_TIMEOUT are
+    released after each pass.  Named workers run with *serve* off: only the
+    primary daemon owns pipeline.sock.
+    """
+    if not _acquire_lock():
+        sys.exit(0)
+
+    from modules.config  import DAEMON_POLL_SEC, loaded_models, mark_resident, release_idle_models
+    from modules.control import ControlServer
+    from modules.lease   import start_heartbeat, stop_heartbeat
+
+    mark_resident()
+    wake  = threading.Event()
+    stop  = threading.Event()
+    state = {"busy": False, "passes": 0, "last_pass": None, "skip_upload": skip_upload}
+
+    def _status(_req):
+        return {"ok": True, "pid": os.getpid(), "busy": state["busy"],
+                "passes": state["passes"], "last_pass": state["last_pass"],
+                "models": loaded_models(), "pending": _pending_snapshot()}
+
+    def _run(req):
+        if req.get("output") in ("api", "file"):
+            state["skip_upload"] = req["output"] == "file"
+        wake.set()
+        return {"ok": True, "pid": os.getpid(), "busy": state["busy"]}
+
+    def _stop(_req):
+        stop.set(); wake.set()
+        return {"ok": True, "pid": os.getpid()}
+
+    server = None
+    if serve:
+        server = ControlServer(BASE_DIR, {"ping": lambda _r: {"ok": True, "pid": os.getpid()},
+                                          "status": _status, "run": _run, "stop": _stop})
+        server.start()
+    signal.signal(signal.SIGTERM, lambda *_: _stop(None))
+    log.info(f"[daemon] Started (PID {os.getpid()}, poll {DAEMON_POLL_SEC:.0f}s)")
 
+    try:
+        _migrate_db()
+        start_heartbeat()
+        while not stop.is_set():
+            forced = wake.is_set()
+            wake.clear()
+            if forced or _runnable(_pending_snapshot(), state["skip_upload"]):
+                state["busy"] = True
+                try:
+                    _run_once(state["skip_upload"], pipelined)
+                except Exception as e:
+                    log.error(f"[daemon] Pass failed: {e}", exc_info=True)
+                finally:
+                    state["busy"] = False
+                    state["passes"] += 1
+                    state["last_pass"] = time.strftime("%Y-%m-%d %H:%M:%S")
+            release_idle_models()
+            wake.wait(DAEMON_POLL_SEC)
     finally:
+        if server:
+            server.close()
+        stop_heartbeat()
+        release_idle_models(force=True)
         _release_lock()
+        log.info("[daemon] Stopped")
+
+
+# ── Startup benchmark ─────────────────────────────────────────────────────────
+_TICK_PROBE = """
+import json, sys, time
+before = set(sys.modules)
+t0 = time.perf_counter()
+import pipeline
+t1 = time.perf_counter()
+pipeline._migrate_db()
+pipeline._runnable(pipeline._pending_snapshot())
+t2 = time.perf_counter()
+loaded = {m.split(".")[0] for m in set(sys.modules) - before}
+extra  = sorted(loaded - set(sys.stdlib_module_names) - {"pipeline", "modules"})
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "tick_ms": (t2 - t1) * 1000, "extra": extra}))
+"""
+
+
+def _importtime(module: str) -> tuple[float, list]:
+    """Cold import of *module* in a fresh interpreter: (cumulative ms, heaviest children)."""
+    import subprocess
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=_SCRIPT_DIR, capture_output=True, text=True)
+    if proc.returncode:
+        raise ImportError(proc.stderr.strip().splitlines()[-1])
+    rows = []
+    for line in proc.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line and "self [us]" not in line:
+            _, cum, name = line.split("|")
+            rows.append((int(cum), len(name) - len(name.lstrip()) - 1, name.strip()))
+    idx = max(i for i, r in enumerate(rows) if r[2] == module and r[1] == 0)
+    children = []
+    for cum, depth, name in reversed(rows[:idx]):
+        if depth == 0:
+            break
+        if depth == 2:
+            children.append((cum / 1000, name))
+    return rows[idx][0] / 1000, sorted(children, reverse=True)[:3]
+
+
+def run_startup_bench(rounds: int = 5):
+    """Time the idle cron tick and the cold import of every stage module."""
+    import json
+    import subprocess
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+    bare = (time.perf_counter() - t0) / rounds * 1000
+
+    ticks = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", _TICK_PROBE], cwd=_SCRIPT_DIR,
+                             capture_output=True, text=True, check=True).stdout
+        ticks.append(((time.perf_counter() - t0) * 1000, json.loads(out.strip().splitlines()[-1])))
+    wall, probe = min(ticks, key=lambda t: t[0])
+
+    print("Idle tick (best of %d)" % rounds)
+    print(f"  interpreter start      {bare:7.1f} ms")
+    print(f"  import pipeline        {probe['import_ms']:7.1f} ms")
+    print(f"  migrate + snapshot     {probe['tick_ms']:7.1f} ms")
+    print(f"  whole process          {wall:7.1f} ms")
+    print(f"  non-stdlib imports     {', '.join(probe['extra']) or 'none'}")
+
+    print("\nCold import per stage module")
+    for spec in [*MODULES.values(), "modules.scheduler:run_scheduler"]:
+        module = spec.partition(":")[0]
+        try:
+            ms, heavy = _importtime(module)
+        except Exception as e:
+            print(f"  {module:<20} failed: {e}")
+            continue
+        print(f"  {module:<20} {ms:8.1f} ms   " + ", ".join(f"{n} {c:.0f}ms" for c, n in heavy))
 
 
 # ── Entry point ───────────────────────────────────────────────────────────────
@@ -269,9 +469,88 @@ if __name__ == "__main__":
             "file = stop after final render, save .mp4 for manual upload"
         ),
     )
+    parser.add_argument(
+        "--pipelined", "-p",
+        action="store_true",
+        help="stream seeds through per-resource worker pools (GPU / CPU / network)\n"
+             "instead of running the modules one after another",
+    )
+    parser.add_argument(
+        "--daemon", "-d",
+        action="store_true",
+        help="stay resident: keep models loaded between passes and accept\n"
+             "run / stop / status requests from cli.py",
+    )
+    parser.add_argument(
+        "--worker", "-w",
+        metavar="NAME",
+        help="run as an additional named worker: uses its own lock file and\n"
+             "claims work through row leases, so several workers can share one DB",
+    )
+    parser.add_argument(
+        "--no-llm-cache",
+        action="store_true",
+        help="bypass the on-disk LLM response cache for this run",
+    )
+    parser.add_argument(
+        "--startup-bench",
+        action="store_true",
+        help="time the idle cron tick and each stage module's cold import",
+    )
+    parser.add_argument(
+        "--tune-llm",
+        action="store_true",
+        help="benchmark llama.cpp thread / batch / memory settings on this machine\n"
+             "and save the fastest as the profile the LLM is loaded with",
+    )
+    parser.add_argument(
+        "--flux-bench",
+        nargs="?", const=2, type=int, metavar="IMAGES",
+        help="render IMAGES sample scenes (default 2) with the configured Flux\n"
+             "device profile and report seconds per image and peak RSS",
+    )
+    parser.add_argument(
+        "--status",
+        action="store_true",
+        help="print the pending-work count of every stage and exit",
+    )
     args = parser.parse_args()
-
-    if args.module:
-        MODULES[args.module]()
+    if args.flux_bench is not None and args.flux_bench < 1:
+        parser.error("--flux-bench: IMAGES must be at least 1")
+    if args.worker:
+        os.environ["WORKER_ID"] = args.worker   # read by modules.config on first import
+        _use_worker_lock(args.worker)
+    if args.no_llm_cache:
+        os.environ["LLM_CACHE"] = "off"         # likewise
+
+    if args.startup_bench:
+        run_startup_bench()
+    elif args.status:
+        print_status()
+    elif args.flux_bench is not None:
+        if not _acquire_lock():
+            sys.exit(0)
+        try:
+            _resolve("modules.image:bench_flux")(args.flux_bench)
+        finally:
+            _release_lock()
+    elif args.tune_llm:
+        if not _acquire_lock():   # a running pipeline would skew the timings
+            sys.exit(0)
+        try:
+            _resolve("modules.tune:tune_llm")()
+        finally:
+            _release_lock()
+    elif args.module:
+        _migrate_db()
+        from modules.lease import start_heartbeat, stop_heartbeat
+        start_heartbeat()
+        try:
+            _resolve(MODULES[args.module])()
+        finally:
+            stop_heartbeat()
+    elif args.daemon:
+        run_daemon(skip_upload=(args.output == "file"), pipelined=args.pipelined,
+                   serve=not args.worker)
     else:
-        run_pipeline(skip_upload=(args.output == "file"))
+        run_pipeline(skip_upload=(args.output == "file"), pipelined=args.pipelined)